@@ -124,7 +124,7 @@ def load_data_for_ai():
     Restituisce un DataFrame Pandas.
     """
     db_path = os.path.join(os.path.dirname(__file__), '../db/clash.db')
-    connection, cursor, load_tags = open_connection(db_path)
+    connection, cursor, load_tags = open_connection(db_path, profile="analysis")
     tags = load_tags()
     arenas = get_arenas(cursor)
     
@@ -140,10 +140,10 @@ def load_data_for_ai():
         # Load battles (Only Ladder for consistency)
         query = """
             SELECT b.battle_id, b.battle_type, b.game_mode, b.timestamp, b.win, b.level_diff, b.matchup_win_rate, b.trophy_change, b.opponent_tag, b.player_crowns, b.opponent_crowns, b.player_deck_id, d.archetype_hash, b.matchup_no_lvl, b.elixir_leaked_player, b.opponent_deck_id, od.archetype_hash,
-            (SELECT MAX(card_level) FROM deck_cards WHERE deck_hash = b.player_deck_id AND card_name IN (SELECT card_name FROM cards WHERE type = 'Tower'))
+            (SELECT MAX(card_level) FROM deck_cards WHERE deck_id = b.player_deck_id AND card_name IN (SELECT card_name FROM cards WHERE type = 'Tower'))
             FROM battles b
-            LEFT JOIN decks d ON b.player_deck_id = d.deck_hash
-            LEFT JOIN decks od ON b.opponent_deck_id = od.deck_hash
+            LEFT JOIN decks d ON b.player_deck_id = d.deck_id
+            LEFT JOIN decks od ON b.opponent_deck_id = od.deck_id
             WHERE b.player_tag = ? AND  b.game_mode = 'Ladder'
             ORDER BY b.timestamp ASC;
         """
@@ -166,7 +166,7 @@ def load_data_for_ai():
         career_matchup_sum = 0.0
         career_matchup_count = 0
         cumulative_matchup_error = 0.0
-        player_deck_history = {} # deck_hash -> list of (timestamp, win, elixir_leaked)
+        player_deck_history = {} # deck_id -> list of (timestamp, win, elixir_leaked)
         
         for i in range(len(battles) - 1):
             curr = battles[i]
@@ -1,33 +1,200 @@
 import requests
-import time
+import threading
 import logging
+import time
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from contextlib import contextmanager
+from urllib.parse import urlparse
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from bs4 import BeautifulSoup
+from utils.rate_limiter import RateLimiter
+from parsers import make_soup, soup_backend
+import archive
+import metrics
 
-HEADERS = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"}
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
+    "Accept-Encoding": "gzip, deflate",
+}
 BASE_URL = "https://royaleapi.com"
+MATCHUP_URL = "https://deckai.app/api/main/get-matchup"
 
-def fetch_page(path: str) -> BeautifulSoup | None:
+# Budget globale di richieste al secondo per host, condiviso da tutti i worker.
+# È il ritmo di partenza: il limiter lo adatta (AIMD) tra MIN e MAX in base a
+# latenza e risposte 429 (vedi utils/rate_limiter.py).
+REQUESTS_PER_SECOND = {"royaleapi.com": 2.0, "deckai.app": 2.0}
+MIN_REQUESTS_PER_SECOND = {"royaleapi.com": 0.5, "deckai.app": 0.5}
+MAX_REQUESTS_PER_SECOND = {"royaleapi.com": 8.0, "deckai.app": 8.0}
+# Latenza media oltre la quale il server è considerato sotto carico e il ritmo viene ridotto
+TARGET_LATENCY = {"royaleapi.com": 2.0, "deckai.app": 3.0}
+# Numero massimo di richieste contemporanee verso lo stesso host
+MAX_CONCURRENT_PER_HOST = 4
+
+# Timeout (connessione, lettura) in secondi
+TIMEOUT = (5, 30)
+# Tentativi con attesa esponenziale (backoff * 2^n). Gli errori di rete sono
+# ritentati dalla sessione; 429 e 5xx sono gestiti da _request, così ogni nuovo
+# tentativo passa dal limiter e un Retry-After rallenta tutti i thread.
+MAX_RETRIES = 4
+BACKOFF_FACTOR = 1.0
+RETRY_STATUS_CODES = (500, 502, 503, 504)
+
+_limiters = {}
+_host_slots = {}
+_registry_lock = threading.Lock()
+
+_sessions = threading.local()
+
+def _build_session() -> requests.Session:
+    """Crea una sessione con keep-alive, pool di connessioni e retry sugli errori di rete."""
+    # Nessun retry sugli status: urllib3 ripeterebbe 429 e 5xx (anche dormendo
+    # il Retry-After) senza passare dal limiter, e _request non li vedrebbe mai.
+    retry = Retry(
+        total=MAX_RETRIES,
+        backoff_factor=BACKOFF_FACTOR,
+        status_forcelist=(),
+        allowed_methods=frozenset({"GET", "POST"}),  # la POST di deckai è idempotente
+        respect_retry_after_header=False,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=2, pool_maxsize=MAX_CONCURRENT_PER_HOST, max_retries=retry)
+    session = requests.Session()
+    session.headers.update(HEADERS)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+def _get_session(host: str) -> requests.Session:
+    """Restituisce la sessione del thread corrente per l'host indicato."""
+    if not hasattr(_sessions, "by_host"):
+        _sessions.by_host = {}
+    session = _sessions.by_host.get(host)
+    if session is None:
+        session = _build_session()
+        _sessions.by_host[host] = session
+    return session
+
+def _host_of(url: str) -> str:
+    host = urlparse(url).hostname or ""
+    return host.removeprefix("www.")
+
+def _get_limiter(host: str) -> RateLimiter | None:
+    with _registry_lock:
+        rate = REQUESTS_PER_SECOND.get(host)
+        if not rate:
+            return None
+        if host not in _limiters:
+            _limiters[host] = RateLimiter(
+                rate,
+                min_rate=min(rate, MIN_REQUESTS_PER_SECOND.get(host, rate)),
+                max_rate=max(rate, MAX_REQUESTS_PER_SECOND.get(host, rate)),
+                target_latency=TARGET_LATENCY.get(host),
+            )
+        return _limiters[host]
+
+def _get_host_slots(host: str) -> threading.BoundedSemaphore:
+    with _registry_lock:
+        if host not in _host_slots:
+            _host_slots[host] = threading.BoundedSemaphore(MAX_CONCURRENT_PER_HOST)
+        return _host_slots[host]
+
+@contextmanager
+def _throttled(url: str):
+    """Attende il proprio turno nel budget dell'host e occupa uno slot di concorrenza."""
+    host = _host_of(url)
+    with _get_host_slots(host):
+        limiter = _get_limiter(host)
+        if limiter:
+            limiter.acquire()
+        yield limiter
+
+def _retry_after_seconds(response: requests.Response) -> float | None:
+    """Legge l'header Retry-After (secondi o data HTTP)."""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+def _request(method: str, url: str, **kwargs) -> requests.Response:
+    """
+    Esegue una richiesta rispettando il limiter dell'host. La latenza di ogni
+    risposta alimenta l'AIMD; un 429 (o un 5xx con Retry-After) rallenta il
+    limiter e lo sospende per il Retry-After, gli altri 5xx attendono il backoff.
+    La richiesta viene ripetuta fino a MAX_RETRIES volte, ogni volta dal limiter.
+    """
+    host = _host_of(url)
+    for attempt in range(MAX_RETRIES + 1):
+        with _throttled(url) as limiter:
+            start = time.perf_counter()
+            with metrics.timer("http_request_seconds", host=host):
+                response = _get_session(host).request(method, url, timeout=TIMEOUT, **kwargs)
+            latency = time.perf_counter() - start
+        _record_response(host, response)
+
+        status = response.status_code
+        if status != 429 and status not in RETRY_STATUS_CODES:
+            if limiter:
+                limiter.on_success(latency)
+                metrics.set_gauge("rate_limit_rps", limiter.rate, host=host)
+            return response
+
+        retry_after = _retry_after_seconds(response)
+        if limiter and (status == 429 or retry_after is not None):
+            limiter.on_throttle(retry_after)
+            metrics.set_gauge("rate_limit_rps", limiter.rate, host=host)
+            logging.warning(f"{status} da {host}: ritmo ridotto a {limiter.rate:.2f} req/s (Retry-After: {retry_after}).")
+        elif attempt < MAX_RETRIES:
+            time.sleep(retry_after if retry_after is not None else BACKOFF_FACTOR * 2 ** attempt)
+    return response
+
+def _record_response(host: str, response: requests.Response):
+    metrics.inc("http_requests_total", host=host, status=response.status_code)
+    metrics.inc("http_response_bytes_total", len(response.content), host=host)
+
+def fetch_html(path: str) -> str | None:
     """
     Esegue una richiesta GET a un dato percorso su royaleapi.com,
-    gestisce un rate limit e restituisce un oggetto BeautifulSoup.
+    gestisce un rate limit e restituisce l'HTML della pagina.
     """
     url = f"{BASE_URL}{path}"
-    time.sleep(0.5)  # Rate limit fondamentale per non sovraccaricare il server
+    host = _host_of(url)
 
     try:
-        response = requests.get(url, headers=HEADERS)
+        response = _request("GET", url)  # Rate limit fondamentale per non sovraccaricare il server
         response.raise_for_status()  # Lancia un'eccezione per status code non 2xx
-        return BeautifulSoup(response.text, "html.parser")
     except requests.RequestException as e:
+        metrics.inc("http_errors_total", host=host)
         logging.error(f"Errore durante la richiesta a {url}: {e}")
         return None
 
+    if archive.should_archive(path):
+        # Copia compressa della pagina battaglie, per poterla rielaborare con reparse.py
+        archive.archive_page(path, response.text)
+    return response.text
+
+def fetch_page(path: str) -> BeautifulSoup | None:
+    """Come fetch_html, ma restituisce un oggetto BeautifulSoup."""
+    html = fetch_html(path)
+    if html is None:
+        return None
+    with metrics.timer("parse_seconds", function="make_soup", backend=soup_backend()):
+        return make_soup(html)
+
 def fetch_matchup(player_deck: list, opponent_deck: list, force_equal_levels: bool = False) -> dict | None:
     """
     Esegue una richiesta POST a deckai.app per ottenere il win rate di un matchup.
     Se force_equal_levels è True, imposta tutti i livelli a 11 per un confronto ad armi pari.
     """
-    url = "https://deckai.app/api/main/get-matchup"
+    url = MATCHUP_URL
     
     p_deck = [{"name": c["name"], "level": 11 if force_equal_levels else c["level"]} for c in player_deck]
     o_deck = [{"name": c["name"], "level": 11 if force_equal_levels else c["level"]} for c in opponent_deck]
@@ -38,12 +205,14 @@ def fetch_matchup(player_deck: list, opponent_deck: list, force_equal_levels: bo
         o_deck
     ]
 
+    host = _host_of(url)
     try:
-        response = requests.post(url, json=payload, headers=HEADERS)
+        response = _request("POST", url, json=payload)
 
         response.raise_for_status()
         return response.json()  # Restituisce {"winRate": 0.535, "probabilities": null, ...}
     except requests.RequestException as e:
+        metrics.inc("http_errors_total", host=host)
         logging.error(f"Errore durante la richiesta di matchup a {url}: {e}")
         logging.error(f"Payload inviato: {payload}")
         return None
\ No newline at end of file
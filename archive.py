@@ -0,0 +1,172 @@
+"""
+Archivio compresso delle pagine HTML scaricate.
+
+Ogni pagina viene compressa (zstd se disponibile, altrimenti zlib) e accodata
+a un file segmento; un indice SQLite associa l'hash SHA256 del contenuto alla
+sua posizione nei segmenti e ogni percorso richiesto agli hash scaricati.
+Contenuti identici vengono salvati una sola volta. reparse.py rilegge
+l'archivio per rigenerare i dati senza riscaricare le pagine: per questo
+vengono archiviate solo le pagine battaglie (ARCHIVED_PATHS), le uniche che
+reparse.py sa rielaborare.
+"""
+import os
+import re
+import hashlib
+import sqlite3
+import threading
+import zlib
+from datetime import datetime
+
+try:
+    import zstandard
+    HAS_ZSTD = True
+except ImportError:
+    HAS_ZSTD = False
+
+ARCHIVE_DIR = "./db/archive"
+# L'archivio è opzionale: va attivato con configure_archive()
+ARCHIVE_ENABLED = False
+# Dimensione oltre la quale si apre un nuovo segmento
+SEGMENT_MAX_BYTES = 256 * 1024 * 1024
+ZSTD_LEVEL = 10
+ZLIB_LEVEL = 6
+# Pagine da archiviare: prima pagina, scroll e history delle battaglie (/player/{tag}/battles...)
+ARCHIVED_PATHS = re.compile(r"^/player/([^/?]+)/battles")
+
+CODEC = "zstd" if HAS_ZSTD else "zlib"
+
+_lock = threading.Lock()
+_index = None
+_segment = None  # (numero, file aperto in append)
+_compressor = None
+
+def configure_archive(enabled: bool = True, directory: str | None = None):
+    """Attiva/disattiva l'archivio e ne imposta la cartella."""
+    global ARCHIVE_ENABLED, ARCHIVE_DIR
+    with _lock:
+        if directory is not None and directory != ARCHIVE_DIR:
+            _close()
+            ARCHIVE_DIR = directory
+        ARCHIVE_ENABLED = enabled
+
+def _get_index() -> sqlite3.Connection:
+    global _index
+    if _index is None:
+        os.makedirs(ARCHIVE_DIR, exist_ok=True)
+        _index = sqlite3.connect(os.path.join(ARCHIVE_DIR, "index.db"), check_same_thread=False)
+        _index.executescript("""
+            CREATE TABLE IF NOT EXISTS blobs (
+                content_hash TEXT PRIMARY KEY,  -- SHA256 dell'HTML non compresso
+                codec TEXT NOT NULL,            -- 'zstd' o 'zlib'
+                segment INTEGER NOT NULL,
+                offset INTEGER NOT NULL,
+                length INTEGER NOT NULL         -- byte compressi nel segmento
+            );
+            CREATE TABLE IF NOT EXISTS pages (
+                path TEXT NOT NULL,             -- es: /player/ABC123/battles
+                content_hash TEXT NOT NULL,
+                fetched_at DATETIME NOT NULL,
+                PRIMARY KEY (path, content_hash)
+            );
+            CREATE INDEX IF NOT EXISTS idx_pages_fetched_at ON pages(fetched_at);
+        """)
+    return _index
+
+def _segment_path(number: int) -> str:
+    return os.path.join(ARCHIVE_DIR, f"segment_{number:05d}.seg")
+
+def _get_segment(index: sqlite3.Connection):
+    """Restituisce il segmento corrente, aprendone uno nuovo se pieno."""
+    global _segment
+    if _segment is None:
+        number = index.execute("SELECT COALESCE(MAX(segment), 1) FROM blobs").fetchone()[0]
+        _segment = (number, open(_segment_path(number), "ab"))
+
+    number, handle = _segment
+    if handle.tell() >= SEGMENT_MAX_BYTES:
+        handle.close()
+        number += 1
+        _segment = (number, open(_segment_path(number), "ab"))
+    return _segment
+
+def _compress(data: bytes) -> bytes:
+    global _compressor
+    if CODEC == "zstd":
+        if _compressor is None:
+            _compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL)
+        return _compressor.compress(data)
+    return zlib.compress(data, ZLIB_LEVEL)
+
+def _decompress(codec: str, data: bytes) -> bytes:
+    if codec == "zstd":
+        if not HAS_ZSTD:
+            raise RuntimeError("Pagina archiviata con zstd: installare il pacchetto 'zstandard' per leggerla.")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return zlib.decompress(data)
+
+def should_archive(path: str) -> bool:
+    """True se l'archivio è attivo e la pagina può essere rielaborata da reparse.py."""
+    return ARCHIVE_ENABLED and ARCHIVED_PATHS.match(path) is not None
+
+def archive_page(path: str, html: str):
+    """Salva una pagina nell'archivio (il contenuto viene scritto solo se nuovo)."""
+    data = html.encode("utf-8")
+    content_hash = hashlib.sha256(data).hexdigest()
+    current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+    with _lock:
+        index = _get_index()
+        known = index.execute("SELECT 1 FROM blobs WHERE content_hash = ?", (content_hash,)).fetchone()
+        if not known:
+            compressed = _compress(data)
+            number, handle = _get_segment(index)
+            offset = handle.tell()
+            handle.write(compressed)
+            # I byte devono essere su disco prima che l'indice li referenzi
+            handle.flush()
+            index.execute("INSERT INTO blobs (content_hash, codec, segment, offset, length) VALUES (?, ?, ?, ?, ?)",
+                          (content_hash, CODEC, number, offset, len(compressed)))
+        index.execute("INSERT OR REPLACE INTO pages (path, content_hash, fetched_at) VALUES (?, ?, ?)",
+                      (path, content_hash, current_time))
+        index.commit()
+
+def iter_pages(path_like: str = "%", since: str | None = None):
+    """
+    Scorre le pagine archiviate in ordine di download come (percorso, data, html).
+    I segmenti vengono letti in sequenza, senza riaprire il file per ogni pagina.
+    """
+    with _lock:
+        rows = _get_index().execute("""
+            SELECT p.path, p.fetched_at, b.codec, b.segment, b.offset, b.length
+            FROM pages p JOIN blobs b ON b.content_hash = p.content_hash
+            WHERE p.path LIKE ? AND p.fetched_at >= ?
+            ORDER BY p.fetched_at
+        """, (path_like, since or "")).fetchall()
+        if _segment is not None:
+            _segment[1].flush()
+
+    handles = {}
+    try:
+        for path, fetched_at, codec, segment, offset, length in rows:
+            if segment not in handles:
+                handles[segment] = open(_segment_path(segment), "rb")
+            handle = handles[segment]
+            handle.seek(offset)
+            yield path, fetched_at, _decompress(codec, handle.read(length)).decode("utf-8")
+    finally:
+        for handle in handles.values():
+            handle.close()
+
+def _close():
+    global _index, _segment
+    if _segment is not None:
+        _segment[1].close()
+        _segment = None
+    if _index is not None:
+        _index.close()
+        _index = None
+
+def close_archive():
+    """Chiude il segmento corrente e l'indice."""
+    with _lock:
+        _close()
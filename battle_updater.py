@@ -1,78 +1,172 @@
 import logging
-from api_client import fetch_page, fetch_matchup
-from parsers import parse_battle_data, parse_oldest_timestamp_from_page, parse_deck_from_battle, parse_all_deck_stats_from_page
-from db_manager import get_last_battle_timestamp, insert_battle_and_decks, update_player_deck_stats
-
-def _collect_battles_from_page(soup, tag, last_db_ts, conn, cursor):
-    """Funzione helper per processare le battaglie di una singola pagina."""
-    battles = soup.select("div.battle")
-    if not battles:
-        return True, None # stop = True, oldest_ts = None
-
-    stop = False
-    for div in battles:
-        battle = parse_battle_data(div, tag)
-
-        if last_db_ts and battle["timestamp"] <= last_db_ts:
-            stop = True
-            break
-
-        player_deck_cards = parse_deck_from_battle(div, is_opponent=False)
-        opponent_deck_cards = parse_deck_from_battle(div, is_opponent=True) if battle["opponent_tag"] else None
-
-        
-        matchup_win_rate = None
-        matchup_no_lvl = None
-        
-        if player_deck_cards and opponent_deck_cards:
-            # Assicurati che entrambi i mazzi abbiano 9 carte (8 + torre)
-            if len(player_deck_cards) == 9 and len(opponent_deck_cards) == 9:
-                matchup_data = fetch_matchup(player_deck_cards, opponent_deck_cards)
-                if matchup_data:
-                    matchup_win_rate = matchup_data.get("winRate")
-                
-                matchup_no_lvl_data = fetch_matchup(player_deck_cards, opponent_deck_cards, force_equal_levels=True)
-                if matchup_no_lvl_data:
-                    matchup_no_lvl = matchup_no_lvl_data.get("winRate")
-
-        insert_battle_and_decks(cursor, battle, player_deck_cards, opponent_deck_cards, matchup_win_rate, matchup_no_lvl)
+from collections import Counter
+from datetime import datetime, timedelta
+from api_client import fetch_page, fetch_html
+from parsers import get_battle_parser, parse_all_deck_stats_from_page
+from db_manager import (get_last_battle_timestamp, insert_battles_and_decks, update_player_deck_stats,
+                        save_crawl_state, get_pending_crawls, publish_new_decks, get_player_decks_by_archetype,
+                        get_deck_stats_state, count_battles_since, mark_deck_stats_updated, record_crawl_failure)
+import metrics
+
+# Fasi di crawl salvate in crawl_state
+SCROLL = "scroll"
+HISTORY = "history"
+
+# La pagina /decks (statistiche degli ultimi 30 giorni) viene riscaricata solo
+# dopo almeno questo numero di battaglie nuove...
+DECK_STATS_MIN_NEW_BATTLES = 10
+# ...oppure se l'ultimo aggiornamento è più vecchio di così (ore)
+DECK_STATS_TTL_HOURS = 24
+
+# Pagine fallite di fila dopo cui un checkpoint viene abbandonato (vedi fail_crawl)
+MAX_CRAWL_ATTEMPTS = 3
+
+# Un crawl scorre le battaglie di un giocatore dalla più recente verso le più vecchie,
+# prima con le pagine 'scroll' e poi con quelle 'history', fino a stop_ts (l'ultima
+# battaglia già nel DB quando il crawl è iniziato). È un dizionario che avanza di una
+# pagina alla volta con advance_crawl, così può essere guidato sia in sequenza
+# (fetch_all_battles) sia dalla pipeline a più processi (pipeline.py).
+
+def new_crawl(tag: str, phase: str = SCROLL, cursor_ts: int | None = None, stop_ts: int | None = None, resumed: bool = False) -> dict:
+    return {
+        "tag": tag, "phase": phase, "cursor": cursor_ts, "stop_ts": stop_ts, "resumed": resumed,
+        "done": False, "completed": False, "abandoned": False, "stopped_in_scroll": False,
+        "pages": 0, "scroll_pages": 0,
+    }
+
+def crawl_path(crawl: dict) -> str:
+    """Percorso della prossima pagina da scaricare per il crawl."""
+    tag, cursor_ts = crawl["tag"], crawl["cursor"]
+    if crawl["phase"] == SCROLL:
+        if cursor_ts is None:
+            return f"/player/{tag}/battles"
+        return f"/player/{tag}/battles/scroll/{cursor_ts}/type/all"
+    return f"/player/{tag}/battles/history?before={cursor_ts * 1000}&&"
+
+def parse_crawl_page(html: str, tag: str, stop_ts: int | None) -> tuple[list, int | None, bool]:
+    """Parsing di una pagina battaglie in record semplici (eseguibile anche in un altro processo)."""
+    parser = get_battle_parser()
+    return parser.parse_battles_page(parser.load_document(html), tag, stop_ts=stop_ts)
+
+def _start_history(crawl: dict, conn, cursor):
+    """
+    Chiude lo scroll e fa partire la history dal punto più vecchio raggiunto,
+    nella stessa transazione per non perdere il passaggio in caso di arresto.
+    """
+    tag, cursor_ts, stop_ts = crawl["tag"], crawl["cursor"], crawl["stop_ts"]
+    save_crawl_state(cursor, tag, SCROLL, cursor_ts, stop_ts, completed=True)
+    save_crawl_state(cursor, tag, HISTORY, cursor_ts, stop_ts)
+    conn.commit()
+    crawl["phase"] = HISTORY
+
+def advance_crawl(crawl: dict, page: tuple | None, conn, cursor):
+    """
+    Scrive una pagina del crawl e lo porta alla pagina o fase successiva.
+    page è il risultato di parse_crawl_page, o None se il download è fallito.
+    Battaglie e checkpoint della pagina vengono salvati nella stessa transazione.
+    """
+    tag, phase = crawl["tag"], crawl["phase"]
+    crawl["pages"] += 1
+    if phase == SCROLL:
+        crawl["scroll_pages"] += 1
+
+    records, oldest_ts, stop = page if page is not None else ([], None, False)
+    if oldest_ts is None:
+        if phase == SCROLL and crawl["cursor"] is not None:
+            # Scroll finito (pagina vuota o non scaricabile): la history prosegue da qui
+            _start_history(crawl, conn, cursor)
+        elif phase == HISTORY and page is not None:
+            # Nessuna battaglia più vecchia: la cronologia è completa
+            save_crawl_state(cursor, tag, HISTORY, crawl["cursor"], crawl["stop_ts"], completed=True)
+            conn.commit()
+            crawl["done"] = crawl["completed"] = True
+        else:
+            fail_crawl(crawl, conn, cursor)
+        return
 
+    # I matchup vengono calcolati in seguito da matchup_worker, senza bloccare l'inserimento.
+    insert_battles_and_decks(cursor, records)
+    save_crawl_state(cursor, tag, phase, oldest_ts, crawl["stop_ts"], completed=stop)
+    with metrics.timer("db_commit_seconds"):
+        conn.commit()
+    publish_new_decks()
+    metrics.inc("battle_pages_total", phase=phase)
+
+    crawl["cursor"] = oldest_ts
+    if stop:
+        crawl["done"] = crawl["completed"] = True
+        crawl["stopped_in_scroll"] = phase == SCROLL
+
+def fail_crawl(crawl: dict, conn, cursor):
+    """
+    Pagina non scaricata o non leggibile: il checkpoint resta aperto e il crawl
+    riprenderà da qui al prossimo giro. Dopo MAX_CRAWL_ATTEMPTS fallimenti di fila
+    il checkpoint viene abbandonato, così le battaglie nuove non restano bloccate.
+    """
+    crawl["done"] = True
+    if crawl["cursor"] is None:
+        # Prima pagina di un crawl nuovo: non c'è ancora un checkpoint
+        return
+    tag, phase = crawl["tag"], crawl["phase"]
+    attempts = record_crawl_failure(cursor, tag, phase, MAX_CRAWL_ATTEMPTS)
     conn.commit()
-    oldest_ts = parse_oldest_timestamp_from_page(soup)
-    return stop, oldest_ts
-
-def _collect_scroll(tag, last_db_ts, conn, cursor):
-    """Scorre le pagine di battaglie 'scroll' e le inserisce nel DB."""
-    path = f"/player/{tag}/battles"
-    while path:
-        soup = fetch_page(path)
-        if not soup: 
-            break
-
-        stop, oldest_ts = _collect_battles_from_page(soup, tag, last_db_ts, conn, cursor)
-        if stop or not oldest_ts:
-            break
-        
-        path = f"/player/{tag}/battles/scroll/{oldest_ts}/type/all"
-
-def _collect_history(tag, last_db_ts, start_ts, conn, cursor):
-    """Scorre le pagine di battaglie 'history' (più vecchie) e le inserisce nel DB."""
-    before_ms = start_ts * 1000
-    while True:
-        path = f"/player/{tag}/battles/history?before={before_ms}&&"
-        soup = fetch_page(path)
-        if not soup: 
-            break
-
-        stop, oldest_ts = _collect_battles_from_page(soup, tag, last_db_ts, conn, cursor)
-        if stop or not oldest_ts:
-            break
-        
-        before_ms = oldest_ts * 1000
-
-def _update_all_deck_stats_for_player(tag: str, conn, cursor):
+    if attempts >= MAX_CRAWL_ATTEMPTS:
+        logging.warning(f"Crawl {phase} di {tag} abbandonato al timestamp {crawl['cursor']} dopo {attempts} tentativi falliti.")
+        metrics.inc("crawl_abandoned_total", phase=phase)
+        crawl["completed"] = crawl["abandoned"] = True
+
+def next_crawl(cursor, tag: str, previous: dict | None = None, resume: bool = True) -> dict | None:
+    """
+    Prossimo crawl da eseguire per un giocatore: prima i crawl interrotti
+    (crawl_state), fino al limite fissato quando erano iniziati, così da non
+    lasciare buchi; poi un nuovo crawl fino all'ultima battaglia salvata.
+    """
+    if previous is not None and not previous["completed"]:
+        if previous["resumed"]:
+            # Un nuovo crawl sovrascriverebbe il checkpoint: si riprova al prossimo giro
+            logging.warning(f"Crawl di {tag} ancora incompleto, nuove battaglie rimandate al prossimo giro.")
+        return None
+
+    if resume:
+        pending = get_pending_crawls(cursor, tag)
+        if pending:
+            phase, cursor_ts, stop_ts = pending[0]
+            logging.info(f"Ripresa del crawl {phase} di {tag} dal timestamp {cursor_ts}.")
+            return new_crawl(tag, phase, cursor_ts, stop_ts, resumed=True)
+
+    if previous is None or previous["resumed"]:
+        return new_crawl(tag, stop_ts=get_last_battle_timestamp(cursor, tag))
+    return None
+
+def crawl_stats(crawl: dict) -> Counter:
+    """Pagine scaricate e risparmiate rispetto al vecchio schema (prima pagina doppia, history sempre da capo)."""
+    stats = Counter(pages=crawl["pages"])
+    if crawl["abandoned"]:
+        stats["abandoned"] += 1
+    if crawl["resumed"]:
+        stats["resumed"] += 1
+    elif crawl["scroll_pages"] and crawl["cursor"] is not None:
+        # La prima pagina non viene riscaricata dallo scroll; lo scroll arrivato alle
+        # battaglie salvate evita la history, che avrebbe ripercorso lo stesso intervallo
+        # (circa una pagina per pagina di scroll), altrimenti la history evita solo
+        # le pagine già coperte dallo scroll
+        stats["saved_first_page"] += 1
+        scroll_pages = crawl["scroll_pages"]
+        stats["saved_history"] += scroll_pages if crawl["stopped_in_scroll"] else scroll_pages - 1
+    return stats
+
+def _run_crawl(crawl: dict, conn, cursor):
+    """Esegue un crawl in sequenza nel thread corrente."""
+    while not crawl["done"]:
+        html = fetch_html(crawl_path(crawl))
+        page = parse_crawl_page(html, crawl["tag"], crawl["stop_ts"]) if html is not None else None
+        advance_crawl(crawl, page, conn, cursor)
+
+def _update_all_deck_stats_for_player(tag: str, conn, cursor) -> bool:
     """
     Recupera le statistiche (confidence) per tutti i mazzi usati da un giocatore.
+    Restituisce False se la pagina /decks non è stata scaricata o non contiene statistiche:
+    in quel caso il TTL non viene aggiornato e si riprova al prossimo giro.
     """
     logging.info(f"Inizio aggiornamento statistiche mazzi per il giocatore {tag}")
     
@@ -80,50 +174,70 @@ def _update_all_deck_stats_for_player(tag: str, conn, cursor):
     decks_page_soup = fetch_page(f"/player/{tag}/decks")
     if not decks_page_soup:
         logging.warning(f"Impossibile recuperare la pagina delle statistiche dei mazzi per {tag}.")
-        return
+        return False
 
     # 2. Esegui il parsing di TUTTI i mazzi e le loro statistiche dalla pagina,
     #    mappandoli tramite il loro archetype_hash.
     stats_by_archetype = parse_all_deck_stats_from_page(decks_page_soup)
+
+    # 3. Per ogni mazzo del giocatore (indice player_decks per archetipo), controlla
+    #    se esiste una corrispondenza nelle statistiche appena scaricate.
     if not stats_by_archetype:
-        logging.info(f"Nessuna statistica di mazzo trovata sulla pagina per {tag}.")
-        return
+        logging.warning(f"Nessuna statistica di mazzo trovata sulla pagina per {tag}.")
+        return False
 
-    # 3. Per ogni mazzo nel nostro DB, controlla se esiste una corrispondenza
-    #    di archetipo nelle statistiche appena scaricate.
-    cursor.execute("SELECT deck_hash, archetype_hash FROM decks WHERE deck_hash IN (SELECT DISTINCT player_deck_id FROM battles WHERE player_tag = ?)", (tag,))
-    player_decks = cursor.fetchall()
-    
-    for deck_hash, archetype_hash in player_decks:
-        if archetype_hash in stats_by_archetype:
-            stats = stats_by_archetype[archetype_hash]
-            update_player_deck_stats(cursor, tag, deck_hash, stats)
-            
-    conn.commit()
+    player_decks = get_player_decks_by_archetype(cursor, tag)
+    for archetype_hash, stats in stats_by_archetype.items():
+        for deck_id in player_decks.get(archetype_hash, ()):
+            update_player_deck_stats(cursor, tag, deck_id, stats)
 
-def fetch_all_battles(tag: str, conn, cursor):
+    # Solo dopo una lettura riuscita il prossimo aggiornamento segue il TTL
+    mark_deck_stats_updated(cursor, tag)
+    conn.commit()
+    return True
+
+def _deck_stats_due(cursor, tag: str) -> bool:
+    """True se sono passate DECK_STATS_TTL_HOURS ore o DECK_STATS_MIN_NEW_BATTLES battaglie dall'ultimo aggiornamento."""
+    updated, last_ts = get_deck_stats_state(cursor, tag)
+    if not updated:
+        return True
+    if datetime.now() - datetime.strptime(updated, '%Y-%m-%d %H:%M:%S') >= timedelta(hours=DECK_STATS_TTL_HOURS):
+        return True
+    return count_battles_since(cursor, tag, last_ts) >= DECK_STATS_MIN_NEW_BATTLES
+
+def refresh_deck_stats_if_due(tag: str, conn, cursor) -> bool:
+    """Aggiorna le statistiche dei mazzi del giocatore solo se scadute. Restituisce True se aggiornate con successo."""
+    if not _deck_stats_due(cursor, tag):
+        metrics.inc("deck_stats_refresh_total", result="skipped")
+        return False
+    if not _update_all_deck_stats_for_player(tag, conn, cursor):
+        metrics.inc("deck_stats_refresh_total", result="failed")
+        return False
+    metrics.inc("deck_stats_refresh_total", result="refreshed")
+    return True
+
+def fetch_all_battles(tag: str, conn, cursor, resume: bool = True) -> Counter:
     """
     Orchestra il recupero di tutta la cronologia battaglie di un giocatore,
-    partendo da dove si era interrotto.
+    partendo da dove si era interrotto, con il minimo di richieste:
+    - con resume, i crawl interrotti (crawl_state) vengono completati per primi;
+    - la prima pagina viene scaricata una sola volta ed è la prima pagina dello scroll;
+    - la history parte da dove si è fermato lo scroll, e solo se lo scroll
+      non ha già raggiunto l'ultima battaglia salvata.
+    Restituisce i contatori delle pagine scaricate e risparmiate.
     """
     logging.info(f"Inizio recupero battaglie per {tag}")
+    stats = Counter()
 
-    last_db_ts = get_last_battle_timestamp(cursor, tag)
-
-    # Controlla la prima pagina per ottenere il timestamp di partenza per la cronologia
-    initial_soup = fetch_page(f"/player/{tag}/battles")
-    if not initial_soup:
-        logging.warning(f"Impossibile recuperare la pagina iniziale delle battaglie per {tag}.")
-        return
-
-    start_history_ts = parse_oldest_timestamp_from_page(initial_soup)
-
-    _collect_scroll(tag, last_db_ts, conn, cursor)
-
-    if start_history_ts:
-        _collect_history(tag, last_db_ts, start_history_ts, conn, cursor)
+    crawl = next_crawl(cursor, tag, resume=resume)
+    while crawl is not None:
+        _run_crawl(crawl, conn, cursor)
+        stats.update(crawl_stats(crawl))
+        crawl = next_crawl(cursor, tag, crawl, resume=resume)
     
-    # Dopo aver recuperato tutte le nuove battaglie, aggiorniamo le statistiche dei mazzi
-    _update_all_deck_stats_for_player(tag, conn, cursor)
+    # Dopo aver recuperato le nuove battaglie, aggiorniamo le statistiche dei mazzi se scadute
+    refresh_deck_stats_if_due(tag, conn, cursor)
 
-    logging.info(f"Recupero battaglie per {tag} completato.")
\ No newline at end of file
+    metrics.observe("pages_per_player", stats["pages"], buckets=metrics.COUNT_BUCKETS)
+    logging.info(f"Recupero battaglie per {tag} completato ({stats['pages']} pagine battaglie scaricate).")
+    return stats
@@ -0,0 +1,163 @@
+"""
+Benchmark offline dell'ingest contro il server locale di mock_server.py.
+
+Avvia il mock in un processo separato (così non consuma CPU del processo
+misurato), punta api_client su di esso e aggiorna un insieme di giocatori
+su un DB nuovo con lo stesso percorso del ciclo normale (scrape_engine.sweep:
+update_player_profile + fetch_all_battles) e, se richiesto, il calcolo dei
+matchup. Il primo giro scarica tutta la cronologia, i successivi misurano
+l'aggiornamento incrementale.
+
+Per ogni giro riporta battaglie/s, richieste per battaglia e la ripartizione
+del tempo CPU del processo tra parsing, scritture SQLite, client HTTP e il
+resto (dal tempo CPU dei thread registrato da metrics.timer).
+
+Uso: python bench/ingest_benchmark.py [giocatori] [latenza_secondi] [cartella_archivio]
+"""
+import io
+import os
+import sys
+import json
+import time
+import random
+import sqlite3
+import logging
+import tempfile
+import multiprocessing
+from contextlib import redirect_stdout
+from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import api_client
+import metrics
+import mock_server
+from scrape_engine import sweep, MAX_CONCURRENT_TAGS
+from matchup_worker import drain_pending_matchups
+from db.migrate import migrate_db
+from db_manager import warm_deck_cache
+from card_registry import load_card_registry
+from utils.connection import new_connection, close_connection
+
+PLAYERS = 20
+LATENCY = 0.05
+# Battaglie nella cronologia di ogni giocatore simulato
+HISTORY_BATTLES = 200
+# Il primo giro scarica tutta la cronologia, gli altri sono incrementali
+ROUNDS = 2
+CONCURRENCY = MAX_CONCURRENT_TAGS
+DRAIN_MATCHUPS = True
+RESULTS_DIR = "./bench/results"
+
+def _start_server(latency: float, archive_dir: str | None):
+    """Avvia mock_server in un processo separato e restituisce (processo, porta)."""
+    ready = multiprocessing.Queue()
+    process = multiprocessing.Process(target=mock_server.serve, args=(0, latency, ready, archive_dir, HISTORY_BATTLES), daemon=True)
+    process.start()
+    return process, ready.get(timeout=30)
+
+def _sum(values: dict, prefix: str, field: str | None = None) -> float:
+    return sum((v[field] if field else v) for k, v in values.items() if k == prefix or k.startswith(prefix + "["))
+
+def _cpu(counters: dict, stage: str) -> float:
+    """Tempo CPU dei thread speso nelle sezioni misurate con metrics.timer(stage)."""
+    return sum(v for k, v in counters.items() if k.startswith("cpu_seconds_total") and f"[stage={stage}]" in k)
+
+def _run_round(db_path: str, tags: list) -> dict:
+    """Esegue un giro di aggiornamento e ne restituisce le misure."""
+    before = metrics.snapshot()
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+
+    with redirect_stdout(io.StringIO()):  # barra di avanzamento di scrape_engine
+        stats = sweep(tags, db_path, CONCURRENCY)
+    if DRAIN_MATCHUPS:
+        conn, cursor = new_connection(db_path)
+        try:
+            drain_pending_matchups(conn, cursor)
+        finally:
+            close_connection(conn)
+
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+    summary = metrics.sweep_summary(before)
+    counters, histograms = summary["counters"], summary["histograms"]
+
+    battles = _sum(counters, "battles_written_total")
+    requests = _sum(counters, "http_requests_total")
+    parse = _cpu(counters, "parse_seconds")
+    db = _cpu(counters, "db_write_seconds") + _cpu(counters, "db_commit_seconds")
+    http = _cpu(counters, "http_request_seconds")
+    return {
+        "wall_seconds": round(wall, 3),
+        "cpu_seconds": round(cpu, 3),
+        "battles": int(battles),
+        "battle_pages": stats["pages"],
+        "requests": int(requests),
+        "battles_per_second": round(battles / wall, 1) if wall else None,
+        "requests_per_battle": round(requests / battles, 3) if battles else None,
+        "http_wait_seconds": round(_sum(histograms, "http_request_seconds", "sum"), 3),
+        "cpu_split": {
+            "parse": round(parse / cpu, 3) if cpu else None,
+            "sqlite": round(db / cpu, 3) if cpu else None,
+            "http": round(http / cpu, 3) if cpu else None,
+            "other": round(max(0.0, cpu - parse - db - http) / cpu, 3) if cpu else None,
+        },
+        "requests_by_kind": {k.removeprefix("http_requests_total"): v for k, v in counters.items() if k.startswith("http_requests_total")},
+        "deck_cache": {k.removeprefix("deck_cache_total"): v for k, v in counters.items() if k.startswith("deck_cache_total")},
+    }
+
+def run_benchmark(players: int = PLAYERS, latency: float = LATENCY, archive_dir: str | None = None) -> dict:
+    """Esegue il benchmark completo e restituisce i risultati di ogni giro."""
+    server, port = _start_server(latency, archive_dir)
+    api_client.BASE_URL = f"http://127.0.0.1:{port}"
+    # Host diverso per i matchup, così hanno un limite di concorrenza separato come deckai.app
+    api_client.MATCHUP_URL = f"http://localhost:{port}/api/main/get-matchup"
+
+    rng = random.Random(0)
+    tags = ["".join(rng.choice(mock_server.TAG_CHARS) for _ in range(9)) for _ in range(players)]
+
+    with tempfile.TemporaryDirectory() as folder:
+        db_path = os.path.join(folder, "bench.db")
+        migrate_db(db_path)
+        conn = sqlite3.connect(db_path)
+        conn.executemany("INSERT INTO players (player_tag) VALUES (?)", [(tag,) for tag in tags])
+        conn.commit()
+        load_card_registry(conn.cursor())
+        warm_deck_cache(conn.cursor())
+        conn.close()
+
+        results = {
+            "started_at": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            "players": players, "latency": latency, "history_battles": HISTORY_BATTLES,
+            "concurrency": CONCURRENCY, "source": archive_dir or "synthetic",
+            "rounds": [_run_round(db_path, tags) for _ in range(ROUNDS)],
+        }
+
+    server.terminate()
+    return results
+
+def _print_results(results: dict):
+    print(f"\nIngest benchmark: {results['players']} giocatori, latenza {results['latency']}s, "
+          f"concorrenza {results['concurrency']}, pagine {results['source']}")
+    for i, r in enumerate(results["rounds"]):
+        label = "completo" if i == 0 else "incrementale"
+        split = r["cpu_split"]
+        print(f"Giro {i + 1} ({label}): {r['battles']} battaglie in {r['wall_seconds']}s = {r['battles_per_second']} battaglie/s, "
+              f"{r['requests']} richieste ({r['requests_per_battle']} per battaglia)")
+        print(f"    CPU {r['cpu_seconds']}s: parsing {split['parse']:.0%}, SQLite {split['sqlite']:.0%}, "
+              f"HTTP {split['http']:.0%}, altro {split['other']:.0%}"
+              f" | attesa HTTP nei thread {r['http_wait_seconds']}s")
+
+def main(players: int = PLAYERS, latency: float = LATENCY, archive_dir: str | None = None):
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+    results = run_benchmark(players, latency, archive_dir)
+    _print_results(results)
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, f"ingest_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Risultati salvati in {path}")
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    main(int(args[0]) if args else PLAYERS, float(args[1]) if len(args) > 1 else LATENCY, args[2] if len(args) > 2 else None)
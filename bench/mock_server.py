@@ -0,0 +1,221 @@
+"""
+Server locale che imita royaleapi.com e deckai.app per i benchmark.
+
+Serve le pagine /player/{tag}, /cards, /decks, /battles (prima pagina, scroll
+e history) e la POST get-matchup con una latenza configurabile. Le pagine
+vengono prese dall'archivio (archive.py) se presenti per quel percorso,
+altrimenti sono generate in modo deterministico per ogni tag, con la stessa
+struttura HTML letta dai parser.
+
+Uso: python bench/mock_server.py [porta]
+"""
+import os
+import re
+import sys
+import json
+import time
+import random
+import hashlib
+import threading
+from collections import Counter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import archive
+
+# Latenza aggiunta a ogni risposta (secondi) e variazione casuale massima
+LATENCY = 0.05
+JITTER = 0.02
+# Battaglie nella cronologia di ogni giocatore e battaglie per pagina
+HISTORY_BATTLES = 200
+PAGE_SIZE = 25
+# Mazzi diversi usati da ogni giocatore (gli avversari usano mazzi casuali)
+DECKS_PER_PLAYER = 3
+# Timestamp della battaglia più recente e intervallo tra due battaglie (secondi)
+LATEST_TS = 1765577323
+BATTLE_INTERVAL = 600
+
+CARDS = [
+    "Hog Rider", "Musketeer", "Ice Spirit", "Skeletons", "Fireball", "The Log", "Cannon", "Ice Golem",
+    "Knight", "Archers", "Valkyrie", "Zap", "Goblin Barrel", "Princess", "Goblin Gang", "Inferno Tower",
+    "Rocket", "Miner", "Poison", "Mega Knight", "Bats", "Arrows", "Baby Dragon", "Electro Wizard",
+    "Tornado", "Executioner", "Royal Giant", "Lightning", "Balloon", "Giant Skeleton",
+]
+TOWERS = ["Tower Princess", "Cannoneer", "Dagger Duchess"]
+TAG_CHARS = "0289PYLQGRJCUV"
+
+_SCROLL = re.compile(r"^/player/([^/]+)/battles/scroll/(\d+)/type/all$")
+_HISTORY = re.compile(r"^/player/([^/]+)/battles/history\?before=(\d+)")
+_PLAYER = re.compile(r"^/player/([^/?]+)(/cards|/decks|/battles)?$")
+
+def _rng(*parts) -> random.Random:
+    return random.Random(hashlib.sha256(":".join(map(str, parts)).encode()).hexdigest())
+
+def _tag(rng: random.Random) -> str:
+    return "".join(rng.choice(TAG_CHARS) for _ in range(9))
+
+def _deck(rng: random.Random) -> list:
+    """Mazzo casuale: 8 carte (nome, livello, evoluzione) e una torre."""
+    names = rng.sample(CARDS, 8)
+    return [(name, rng.randint(11, 15), i == 0 and rng.random() < 0.5) for i, name in enumerate(names)] + \
+           [(rng.choice(TOWERS), rng.randint(11, 15), None)]
+
+def _deck_html(deck: list) -> str:
+    parts = []
+    for name, level, evo in deck:
+        key = name.lower().replace(" ", "-")
+        if evo is None:
+            parts.append(f'<div class="deck_tower_card__container"><img class="deck_card" alt="{name}" data-card-key="{key}"/>'
+                         f'<div class="level"><div>Tower</div><div>Lvl {level}</div></div></div>')
+        else:
+            parts.append(f'<div class="deck_card__four_wide"><img class="deck_card" alt="{name}" data-card-key="{key}{"-ev1" if evo else ""}"/>'
+                         f'<div class="card-level">Lvl {level}</div></div>')
+    return "".join(parts)
+
+def _player_decks(tag: str) -> list:
+    rng = _rng(tag, "decks")
+    return [_deck(rng) for _ in range(DECKS_PER_PLAYER)]
+
+def _battle_html(tag: str, ts: int) -> str:
+    rng = _rng(tag, ts)
+    win = rng.random() < 0.5
+    player_deck = rng.choice(_player_decks(tag))
+    return f'''<div class="battle" id="battle_{tag}_{ts}.0" data-timestamp="{ts}.0" data-battle-type="PvP">
+<div class="game_mode_header">Ladder</div><div class="win_loss"><div class="label">{"Victory" if win else "Defeat"}</div></div>
+<div class="result_header">{1 if win else 0} - {0 if win else rng.randint(1, 3)}</div>
+<div class="trophy_container"><div class="ui basic label">{"+30" if win else "-29"}<img/></div></div>
+<div class="segments"><div class="team-segment"><a class="player_name_header" href="/player/{tag}">me</a>{_deck_html(player_deck)}</div>
+<div class="team-segment"><a class="player_name_header" href="/player/{_tag(rng)}/battles">op</a>{_deck_html(_deck(rng))}</div></div>
+<div class="battle_stats"><div class="stats"><div class="item"><div class="name">Elixir Leaked</div><div class="value">{rng.randint(0, 8) / 4}</div></div>
+<div class="item"><div class="name">Elixir Leaked</div><div class="value">{rng.randint(0, 8) / 4}</div></div></div></div>
+<div class="battle_level_diff">Δ Lvl: {rng.randint(-4, 4) / 4}</div>
+</div>'''
+
+def _page(body: str) -> str:
+    return f"<html><head><title>RoyaleAPI</title></head><body><nav><div class='menu'>menu</div></nav>{body}<footer>footer</footer></body></html>"
+
+def battles_page(tag: str, before: int | None = None) -> str:
+    """PAGE_SIZE battaglie del giocatore più vecchie di `before` (None = le più recenti)."""
+    timestamps = [LATEST_TS - i * BATTLE_INTERVAL for i in range(HISTORY_BATTLES)]
+    if before is not None:
+        timestamps = [ts for ts in timestamps if ts < before]
+    return _page("".join(_battle_html(tag, ts) for ts in timestamps[:PAGE_SIZE]))
+
+def profile_page(tag: str) -> str:
+    rng = _rng(tag, "profile")
+    trophies = rng.randint(4000, 9000)
+    wins = rng.randint(500, 5000)
+    losses = rng.randint(500, 5000)
+    towers = "".join(f'<div class="player_card"><img class="mini_card" alt="{name}"/><div class="level">{rng.randint(11, 15)}</div></div>'
+                     for name in TOWERS)
+    heroes = '<div class="player_card not_found"><img class="mini_card" alt="Hero Knight"/></div>'
+    evolutions = "".join(f'<div class="player_card{"" if rng.random() < 0.5 else " not_found"}"><img class="mini_card" alt="{name}"/></div>'
+                         for name in CARDS[:6])
+    return _page(f'''<div class="p_head_item"><h1>Player {tag}</h1></div>
+<div class="league_info_container"><div class="item_icon trophy"></div><div class="item">{trophies} / {trophies + 200} PB</div><div class="item">Arena {trophies // 500}</div></div>
+<div class="player_aux_info"><div class="ui header item">Clan {tag[:3]}</div></div>
+<table><tbody>
+<tr><td>Account Age</td><td>3y 12w 2d</td></tr><tr><td>Games per Day</td><td>{rng.randint(1, 40) / 2}</td></tr><tr><td>Total</td><td>40w 3d 5h</td></tr>
+<tr><td><h5 class="ui header">Wins</h5></td><td class="right aligned">{wins:,}</td></tr>
+<tr><td><h5 class="ui header">Losses</h5></td><td class="right aligned">{losses:,}</td></tr>
+<tr><td><h5 class="ui header">Three Crown Wins</h5></td><td class="right aligned">{wins // 4:,}</td></tr>
+<tr><td><h5 class="ui header">Total Games</h5></td><td class="right aligned">{wins + losses:,}</td></tr>
+</tbody></table>
+<div class="player_profile__tower_card_collection">{towers}{heroes}</div>
+<div class="player_profile__evo_card_collection">{evolutions}</div>''')
+
+def cards_page(tag: str) -> str:
+    rng = _rng(tag, "cards")
+    cards = "".join(f'<a class="player_card_link player_card_item"><img class="deck_card" alt="{name}"/>'
+                    f'<div class="player_cards__card_level">Lvl {rng.randint(9, 15)}</div></a>' for name in CARDS)
+    return _page(cards)
+
+def decks_page(tag: str) -> str:
+    rng = _rng(tag, "deck_stats")
+    segments = []
+    for deck in _player_decks(tag):
+        battles = rng.randint(5, 60)
+        segments.append(f'''<div class="deck_segment">{_deck_html(deck)}
+<table><tr><td>Player</td><td>{battles}</td><td>{rng.randint(30, 70)}%</td></tr></table></div>''')
+    return _page("".join(segments))
+
+def render(path: str) -> str | None:
+    """HTML di un percorso royaleapi (dall'archivio se presente, altrimenti generato)."""
+    if archive.ARCHIVE_ENABLED:
+        for _, _, html in archive.iter_pages(path):
+            return html
+
+    match = _SCROLL.match(path)
+    if match:
+        return battles_page(match.group(1), int(match.group(2)))
+    match = _HISTORY.match(path)
+    if match:
+        return battles_page(match.group(1), int(match.group(2)) // 1000)
+    match = _PLAYER.match(path)
+    if not match:
+        return None
+    tag, page = match.groups()
+    return {None: profile_page, "/cards": cards_page, "/decks": decks_page, "/battles": battles_page}[page](tag)
+
+def request_kind(path: str) -> str:
+    """Tipo di pagina richiesta: profile, cards, decks, battles, scroll o history."""
+    if _SCROLL.match(path):
+        return "scroll"
+    if _HISTORY.match(path):
+        return "history"
+    match = _PLAYER.match(path)
+    return (match.group(2) or "/profile")[1:] if match else "other"
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    requests_served = Counter()
+    _lock = threading.Lock()
+
+    def _count(self, kind: str):
+        with self._lock:
+            self.requests_served[kind] += 1
+
+    def _send(self, status: int, body: bytes, content_type: str):
+        time.sleep(max(0.0, LATENCY + random.uniform(-JITTER, JITTER)))
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        html = render(self.path)
+        self._count(request_kind(self.path))
+        if html is None:
+            self._send(404, b"not found", "text/plain")
+        else:
+            self._send(200, html.encode("utf-8"), "text/html; charset=utf-8")
+
+    def do_POST(self):
+        payload = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self._count("matchup")
+        win_rate = _rng(payload).uniform(0.3, 0.7)
+        self._send(200, json.dumps({"winRate": round(win_rate, 4), "probabilities": None}).encode(), "application/json")
+
+    def log_message(self, *args):
+        pass
+
+def serve(port: int, latency: float = LATENCY, ready=None, archive_dir: str | None = None, history_battles: int = HISTORY_BATTLES):
+    """
+    Punto di ingresso per un processo separato: imposta latenza, cronologia e archivio
+    e serve fino alla terminazione. Se `ready` è una coda, vi mette la porta effettiva.
+    """
+    global LATENCY, HISTORY_BATTLES
+    LATENCY, HISTORY_BATTLES = latency, history_battles
+    if archive_dir:
+        archive.configure_archive(True, archive_dir)
+    server = ThreadingHTTPServer(("127.0.0.1", port), MockHandler)
+    server.daemon_threads = True
+    if ready is not None:
+        ready.put(server.server_address[1])
+    server.serve_forever()
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8765
+    print(f"Mock server su http://127.0.0.1:{port}")
+    serve(port, LATENCY)
@@ -0,0 +1,54 @@
+"""
+Registro delle carte caricato una sola volta dalla tabella cards.
+
+Ogni nome di carta riceve un id intero piccolo e la sua chiave canonica
+(nome minuscolo con trattini, come nei data-card-key di royaleapi) viene
+calcolata una volta sola. Le carte non ancora presenti in cards (nuove
+uscite) ricevono un id al primo utilizzo. Gli id valgono solo per il
+processo corrente e non vanno salvati nel DB.
+"""
+import threading
+
+_lock = threading.Lock()
+_ids = {}   # nome carta -> id
+_keys = {}  # nome carta -> chiave canonica
+
+def _register(name: str) -> int:
+    with _lock:
+        if name not in _ids:
+            _keys[name] = name.lower().replace(' ', '-')
+            _ids[name] = len(_ids) + 1
+        return _ids[name]
+
+def load_card_registry(cursor) -> int:
+    """Registra tutte le carte della tabella cards. Restituisce il numero di carte note."""
+    cursor.execute("SELECT card_name FROM cards ORDER BY card_name")
+    for (name,) in cursor.fetchall():
+        _register(name)
+    return len(_ids)
+
+def card_id(name: str) -> int:
+    card = _ids.get(name)
+    return card if card is not None else _register(name)
+
+def card_key(name: str) -> str:
+    """Chiave canonica della carta (es. 'Hog Rider' -> 'hog-rider')."""
+    key = _keys.get(name)
+    if key is None:
+        _register(name)
+        key = _keys[name]
+    return key
+
+def deck_identity(cards: list) -> tuple:
+    """Identità di un mazzo con i livelli: tupla ordinata di (id carta, livello, evoluzione, eroe)."""
+    return tuple(sorted(
+        ((card_id(c['name']), c.get('level', ''), c.get('has_evolution', 0), c.get('has_hero', 0)) for c in cards),
+        key=lambda card: card[0]
+    ))
+
+def archetype_identity(cards: list) -> tuple:
+    """Identità di un mazzo senza livelli: tupla ordinata di (id carta, evoluzione, eroe)."""
+    return tuple(sorted(
+        ((card_id(c['name']), c.get('has_evolution', 0), c.get('has_hero', 0)) for c in cards),
+        key=lambda card: card[0]
+    ))
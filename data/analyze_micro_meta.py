@@ -81,7 +81,7 @@ def analyze_micro_meta(players_sessions, output_dir=None, bucket_size=150):
     for i in range(0, len(all_deck_ids_list), CHUNK_SIZE):
         chunk = all_deck_ids_list[i:i+CHUNK_SIZE]
         placeholders = ','.join(['?'] * len(chunk))
-        query = f"SELECT deck_hash, card_name FROM deck_cards WHERE deck_hash IN ({placeholders})"
+        query = f"SELECT deck_id, card_name FROM deck_cards WHERE deck_id IN ({placeholders})"
         cursor.execute(query, chunk)
         for dh, cn in cursor.fetchall():
             if dh not in deck_cards_map: deck_cards_map[dh] = []
@@ -133,7 +133,7 @@ def analyze_arena_gatekeeping(players_sessions, output_dir=None):
     for i in range(0, len(all_ids_list), CHUNK_SIZE):
         chunk = all_ids_list[i:i+CHUNK_SIZE]
         placeholders = ','.join(['?'] * len(chunk))
-        q = f"SELECT deck_hash, card_name FROM deck_cards WHERE deck_hash IN ({placeholders})"
+        q = f"SELECT deck_id, card_name FROM deck_cards WHERE deck_id IN ({placeholders})"
         cursor.execute(q, chunk)
         for dh, cn in cursor.fetchall():
             if dh not in deck_cards_map: deck_cards_map[dh] = []
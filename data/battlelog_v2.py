@@ -501,7 +501,7 @@ def load_battles(cursor, tag):
     query = """
             SELECT b.battle_id, b.battle_type, b.game_mode, b.timestamp, b.win, b.level_diff, b.matchup_win_rate, b.trophy_change, b.opponent_tag, b.player_crowns, b.opponent_crowns, b.player_deck_id, d.archetype_hash, b.matchup_no_lvl, b.elixir_leaked_player, b.elixir_leaked_opponent, b.opponent_deck_id
             FROM battles b
-            LEFT JOIN decks d ON b.player_deck_id = d.deck_hash
+            LEFT JOIN decks d ON b.player_deck_id = d.deck_id
             WHERE b.player_tag = ?
             ORDER BY b.timestamp ASC;
         """
@@ -539,7 +539,7 @@ def format_duration(seconds):
 
 
 def get_players_sessions(mode_filter='all', exclude_unreliable=False):
-    connection, cursor, load_tags = open_connection("db/clash.db")
+    connection, cursor, load_tags = open_connection("db/clash.db", profile="analysis")
     tags = load_tags()
 
     players_sessions = []
@@ -14,30 +14,30 @@ from api_client import fetch_matchup
 
 DB_PATH = os.path.join(os.path.dirname(__file__), '../db/clash.db')
 
-def get_deck_cards_batch(cursor, deck_hashes):
-    """Recupera le carte per un set di deck hashes."""
-    if not deck_hashes:
+def get_deck_cards_batch(cursor, deck_ids):
+    """Recupera le carte per un set di deck_id."""
+    if not deck_ids:
         return {}
     
-    placeholders = ','.join(['?'] * len(deck_hashes))
-    query = f"SELECT deck_hash, card_name, card_level FROM deck_cards WHERE deck_hash IN ({placeholders})"
+    placeholders = ','.join(['?'] * len(deck_ids))
+    query = f"SELECT deck_id, card_name, card_level FROM deck_cards WHERE deck_id IN ({placeholders})"
     
-    cursor.execute(query, list(deck_hashes))
+    cursor.execute(query, list(deck_ids))
     rows = cursor.fetchall()
     
     decks = {}
-    for d_hash, name, level in rows:
-        if d_hash not in decks:
-            decks[d_hash] = []
-        decks[d_hash].append({"name": name, "level": level})
+    for d_id, name, level in rows:
+        if d_id not in decks:
+            decks[d_id] = []
+        decks[d_id].append({"name": name, "level": level})
     return decks
 
-def get_deck_archetypes_batch(cursor, deck_hashes):
-    """Recupera l'archetype_hash per un set di deck hashes."""
-    if not deck_hashes: return {}
-    placeholders = ','.join(['?'] * len(deck_hashes))
-    query = f"SELECT deck_hash, archetype_hash FROM decks WHERE deck_hash IN ({placeholders})"
-    cursor.execute(query, list(deck_hashes))
+def get_deck_archetypes_batch(cursor, deck_ids):
+    """Recupera l'archetype_hash per un set di deck_id."""
+    if not deck_ids: return {}
+    placeholders = ','.join(['?'] * len(deck_ids))
+    query = f"SELECT deck_id, archetype_hash FROM decks WHERE deck_id IN ({placeholders})"
+    cursor.execute(query, list(deck_ids))
     return {row[0]: row[1] for row in cursor.fetchall()}
 
 COUNTRY_TZ_MAP = {
@@ -10,22 +10,22 @@ from api_client import fetch_matchup
 
 # --- Helper functions ---
 
-def get_deck_cards_batch(cursor, deck_hashes):
-    """Recupera le carte per un set di deck hashes."""
-    if not deck_hashes:
+def get_deck_cards_batch(cursor, deck_ids):
+    """Recupera le carte per un set di deck_id."""
+    if not deck_ids:
         return {}
     
-    placeholders = ','.join(['?'] * len(deck_hashes))
-    query = f"SELECT deck_hash, card_name, card_level FROM deck_cards WHERE deck_hash IN ({placeholders})"
+    placeholders = ','.join(['?'] * len(deck_ids))
+    query = f"SELECT deck_id, card_name, card_level FROM deck_cards WHERE deck_id IN ({placeholders})"
     
-    cursor.execute(query, list(deck_hashes))
+    cursor.execute(query, list(deck_ids))
     rows = cursor.fetchall()
     
     decks = {}
-    for d_hash, name, level in rows:
-        if d_hash not in decks:
-            decks[d_hash] = []
-        decks[d_hash].append({"name": name, "level": level})
+    for d_id, name, level in rows:
+        if d_id not in decks:
+            decks[d_id] = []
+        decks[d_id].append({"name": name, "level": level})
     return decks
 
 def _calculate_avg_level(deck_cards):
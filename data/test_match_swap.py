@@ -8,7 +8,7 @@ from scipy.stats import ttest_rel
 
 # Add parent directory to path to import utils
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from api_client import fetch_matchup
+from matchup_cache import get_matchup_for_decks
 from data.test_deck_analysis import get_deck_cards_batch, get_local_hour
 from battlelog_v2 import get_players_sessions # To run standalone
 
@@ -143,13 +143,16 @@ def analyze_match_swap(players_sessions, cursor, output_dir=None, game_mode='Lad
             opp_B_cards = deck_cards_cache.get(best_candidate['o_deck'])
             
             if deck_A_cards and opp_B_cards:
-                mu_data = fetch_matchup(deck_A_cards, opp_B_cards, force_equal_levels=True)
-                if mu_data and 'winRate' in mu_data:
-                    hypo_mu = mu_data['winRate'] * 100
+                win_rate = get_matchup_for_decks(cursor, neg_match['p_deck'], best_candidate['o_deck'], force_equal_levels=True)
+                if win_rate is not None:
+                    hypo_mu = win_rate * 100
                     results.append((neg_match['mu_nolvl'], hypo_mu))
                     tests_done += 1
                     print(f"Test {tests_done}/{MAX_TESTS} completato.", end='\r')
 
+    # Salva i matchup appena calcolati nella cache persistente
+    cursor.connection.commit()
+
     # 3. Report
     with open(output_file, "w", encoding="utf-8") as f:
         f.write(f"ANALISI MATCH SWAP (PSEUDO A/B TESTING) - {game_mode.upper()}\n")
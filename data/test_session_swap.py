@@ -9,7 +9,7 @@ from scipy.stats import ttest_rel
 
 # Add parent directory to path to import utils
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from api_client import fetch_matchup
+from matchup_cache import get_matchup_for_decks
 from data.test_deck_analysis import get_deck_cards_batch, get_local_hour
 
 DB_PATH = os.path.join(os.path.dirname(__file__), '../db/clash.db')
@@ -130,10 +130,10 @@ def analyze_session_swap(players_sessions, cursor, output_dir=None, game_mode='L
             for opp_id in sess_B['opp_deck_ids']:
                 opp_cards = deck_cards_cache.get(opp_id)
                 if opp_cards:
-                    # API Call
-                    mu_data = fetch_matchup(deck_A_cards, opp_cards, force_equal_levels=True)
-                    if mu_data and 'winRate' in mu_data:
-                        hypo_mus.append(mu_data['winRate'] * 100)
+                    # API Call (o cache, se la coppia di archetipi è già stata valutata)
+                    win_rate = get_matchup_for_decks(cursor, sess_A['deck_id'], opp_id, force_equal_levels=True)
+                    if win_rate is not None:
+                        hypo_mus.append(win_rate * 100)
             
             if hypo_mus:
                 avg_hypo = statistics.mean(hypo_mus)
@@ -141,6 +141,9 @@ def analyze_session_swap(players_sessions, cursor, output_dir=None, game_mode='L
                 tests_done += 1
                 print(f"Test {tests_done}/{MAX_TESTS} completato.", end='\r')
 
+    # Salva i matchup appena calcolati nella cache persistente
+    cursor.connection.commit()
+
     # 3. Report
     with open(output_file, "w", encoding="utf-8") as f:
         f.write(f"ANALISI SESSION SWAP ({game_mode.upper()}) - A/B TESTING RETROATTIVO\n")
@@ -329,9 +332,9 @@ def analyze_session_swap_conditional(players_sessions, cursor, output_dir=None,
                         for opp_id in sB['opp_deck_ids']:
                             opp_cards = deck_cards_cache.get(opp_id)
                             if opp_cards:
-                                mu_data = fetch_matchup(deck_A_cards, opp_cards, force_equal_levels=True)
-                                if mu_data and 'winRate' in mu_data:
-                                    hypo_mus.append(mu_data['winRate'] * 100)
+                                win_rate = get_matchup_for_decks(cursor, sA['deck_id'], opp_id, force_equal_levels=True)
+                                if win_rate is not None:
+                                    hypo_mus.append(win_rate * 100)
                         
                         if hypo_mus:
                             avg_hypo = statistics.mean(hypo_mus)
@@ -341,6 +344,9 @@ def analyze_session_swap_conditional(players_sessions, cursor, output_dir=None,
                             print(f"[{label}] Test {tests_done}/{MAX_TESTS_PER_CATEGORY}", end='\r')
                             break # Move to next sA to avoid reusing same A too much
 
+    # Salva i matchup appena calcolati nella cache persistente
+    cursor.connection.commit()
+
     # Report
     with open(output_file, "w", encoding="utf-8") as f:
         f.write(f"ANALISI SESSION SWAP CONDIZIONALE ({game_mode.upper()})\n")
@@ -10,18 +10,18 @@ try:
     from test_deck_analysis import get_deck_cards_batch
 except ImportError:
     # Fallback if running standalone or path issues
-    def get_deck_cards_batch(cursor, deck_hashes):
-        if not deck_hashes:
+    def get_deck_cards_batch(cursor, deck_ids):
+        if not deck_ids:
             return {}
-        placeholders = ','.join(['?'] * len(deck_hashes))
-        query = f"SELECT deck_hash, card_name, card_level FROM deck_cards WHERE deck_hash IN ({placeholders})"
-        cursor.execute(query, list(deck_hashes))
+        placeholders = ','.join(['?'] * len(deck_ids))
+        query = f"SELECT deck_id, card_name, card_level FROM deck_cards WHERE deck_id IN ({placeholders})"
+        cursor.execute(query, list(deck_ids))
         rows = cursor.fetchall()
         decks = {}
-        for d_hash, name, level in rows:
-            if d_hash not in decks:
-                decks[d_hash] = []
-            decks[d_hash].append({"name": name, "level": level})
+        for d_id, name, level in rows:
+            if d_id not in decks:
+                decks[d_id] = []
+            decks[d_id].append({"name": name, "level": level})
         return decks
 
 DB_PATH = os.path.join(os.path.dirname(__file__), '../db/clash.db')
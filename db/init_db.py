@@ -1,14 +1,15 @@
 import sqlite3
+import sys
+import os
 
-def init():
-    # database creation
-    connection = sqlite3.connect('./db/clash.db')
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from migrate import migrate_db
 
-    # scheme creation
-    schema = sql_read("./db/schema.sql")
-    connection.executescript(schema)
+def init():
+    # database creation + schema migrations (schema_version keeps track of what is applied)
+    migrate_db('./db/clash.db')
 
-    connection.commit()
+    connection = sqlite3.connect('./db/clash.db')
 
     # card insert
     cards = sql_read("./db/cards.sql")
@@ -0,0 +1,140 @@
+"""
+Sistema di migrazioni dello schema.
+
+Le migrazioni sono i file numerati in db/migrations (NNNN_nome.sql oppure
+NNNN_nome.py con una funzione upgrade(connection)) e vengono applicate in
+ordine, ognuna nella propria transazione. La tabella schema_version registra
+quelle già eseguite, quindi il comando può essere lanciato sul DB in uso:
+con il journal WAL i lettori non si fermano e chi scrive attende solo il
+tempo della singola migrazione (busy_timeout).
+
+Fanno eccezione le migrazioni marcate "RICHIEDE FERMO" (es. 0005, che
+ricostruisce battles): tengono il lock di scrittura per tutta la copia
+delle tabelle e vanno applicate con scraper e worker fermi.
+
+Uso (dalla root del progetto): python db/migrate.py [percorso_db]
+"""
+import os
+import re
+import sys
+import sqlite3
+import logging
+import importlib.util
+from datetime import datetime
+
+DB_PATH = "./db/clash.db"
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+
+_MIGRATION_FILE = re.compile(r"^(\d{4})_(\w+)\.(sql|py)$")
+# Marcatore delle migrazioni che ricostruiscono tabelle e bloccano le scritture a lungo
+_DOWNTIME_MARKER = "RICHIEDE FERMO"
+
+def discover_migrations() -> list:
+    """Restituisce le migrazioni disponibili come lista ordinata di (versione, nome, percorso)."""
+    migrations = []
+    for filename in os.listdir(MIGRATIONS_DIR):
+        match = _MIGRATION_FILE.match(filename)
+        if match:
+            migrations.append((int(match.group(1)), match.group(2), os.path.join(MIGRATIONS_DIR, filename)))
+    migrations.sort()
+
+    versions = [m[0] for m in migrations]
+    if len(versions) != len(set(versions)):
+        raise ValueError(f"Numeri di migrazione duplicati in {MIGRATIONS_DIR}")
+    return migrations
+
+def current_version(connection) -> int:
+    connection.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at DATETIME
+        )
+    """)
+    row = connection.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    return row[0] or 0
+
+def _has_battles(connection) -> bool:
+    """True se il DB contiene già la tabella battles con almeno una riga."""
+    if not connection.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'battles'").fetchone():
+        return False
+    return connection.execute("SELECT 1 FROM battles LIMIT 1").fetchone() is not None
+
+def _requires_downtime(path: str) -> bool:
+    if not path.endswith(".sql"):
+        return False
+    with open(path, encoding="utf-8") as f:
+        return _DOWNTIME_MARKER in f.read()
+
+def _apply(connection, version: int, name: str, path: str):
+    applied_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    if path.endswith(".sql"):
+        with open(path, encoding="utf-8") as f:
+            script = f.read()
+        # executescript non partecipa alle transazioni del modulo: BEGIN/COMMIT espliciti
+        connection.executescript(
+            f"BEGIN IMMEDIATE;\n{script}\n;"
+            f"INSERT INTO schema_version (version, name, applied_at) VALUES ({version}, '{name}', '{applied_at}');\n"
+            "COMMIT;"
+        )
+        return
+
+    spec = importlib.util.spec_from_file_location(f"migration_{version:04d}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        module.upgrade(connection)
+        connection.execute("INSERT INTO schema_version (version, name, applied_at) VALUES (?, ?, ?)", (version, name, applied_at))
+        connection.execute("COMMIT")
+    except Exception:
+        connection.execute("ROLLBACK")
+        raise
+
+def migrate(connection, target: int | None = None) -> list:
+    """
+    Applica in ordine le migrazioni non ancora eseguite (fino a `target`, se indicato).
+    Restituisce la lista delle versioni applicate.
+    """
+    isolation_level = connection.isolation_level
+    connection.isolation_level = None  # transazioni gestite a mano
+    try:
+        version = current_version(connection)
+        has_battles = _has_battles(connection)
+        applied = []
+        for number, name, path in discover_migrations():
+            if number <= version or (target is not None and number > target):
+                continue
+            logging.info(f"Applicazione migrazione {number:04d}_{name}...")
+            # Su un DB senza battaglie non c'è nulla da copiare. La versione non basta:
+            # il DB storico non ha schema_version e parte dalla versione 0
+            if has_battles and _requires_downtime(path):
+                logging.warning(f"La migrazione {number:04d}_{name} ricostruisce tabelle e blocca le scritture "
+                                f"fino al termine: scraper e worker devono essere fermi.")
+            try:
+                _apply(connection, number, name, path)
+            except Exception:
+                if connection.in_transaction:
+                    connection.execute("ROLLBACK")
+                raise
+            applied.append(number)
+        return applied
+    finally:
+        connection.isolation_level = isolation_level
+
+def migrate_db(db_path: str = DB_PATH, target: int | None = None) -> list:
+    """Apre il DB indicato (creandolo se non esiste) e lo porta all'ultima versione."""
+    connection = sqlite3.connect(db_path, timeout=60)
+    try:
+        connection.execute("PRAGMA busy_timeout = 60000")
+        applied = migrate(connection, target)
+        if applied:
+            logging.info(f"Schema aggiornato alla versione {applied[-1]} ({len(applied)} migrazioni applicate).")
+        return applied
+    finally:
+        connection.close()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    migrate_db(*sys.argv[1:2])
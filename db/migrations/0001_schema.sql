@@ -1,3 +1,7 @@
+-- Migrazione 0001: schema di base.
+-- Le migrazioni già applicate non vanno modificate: ogni cambiamento
+-- allo schema va aggiunto come nuova migrazione numerata (vedi db/migrate.py).
+
 -- ================================
 -- TABELLA ARENE
 -- ================================
@@ -9,7 +13,7 @@ CREATE TABLE IF NOT EXISTS arenas (
 -- ================================
 -- TABELLA GIOCATORI
 -- ================================
-CREATE TABLE players (
+CREATE TABLE IF NOT EXISTS players (
     player_tag TEXT PRIMARY KEY,
 
     player_name TEXT,
@@ -127,7 +131,7 @@ END;
 -- ================================
 -- LIVELLI CARTE DEL GIOCATORE
 -- ================================
-CREATE TABLE player_card (
+CREATE TABLE IF NOT EXISTS player_card (
     player_tag     INTEGER NOT NULL,
     card_name       TEXT NOT NULL,
 
@@ -146,7 +150,7 @@ CREATE TABLE player_card (
 );
 
 
-CREATE TRIGGER trg_player_card_check_evolution_insert
+CREATE TRIGGER IF NOT EXISTS trg_player_card_check_evolution_insert
 BEFORE INSERT ON player_card
 FOR EACH ROW
 BEGIN
@@ -163,7 +167,7 @@ BEGIN
         END;
 END;
 
-CREATE TRIGGER trg_player_card_check_hero_insert
+CREATE TRIGGER IF NOT EXISTS trg_player_card_check_hero_insert
 BEFORE INSERT ON player_card
 FOR EACH ROW
 BEGIN
@@ -180,7 +184,7 @@ BEGIN
         END;
 END;
 
-CREATE TRIGGER trg_player_card_check_evolution_update
+CREATE TRIGGER IF NOT EXISTS trg_player_card_check_evolution_update
 BEFORE UPDATE OF has_evolution ON player_card
 FOR EACH ROW
 BEGIN
@@ -197,7 +201,7 @@ BEGIN
         END;
 END;
 
-CREATE TRIGGER trg_player_card_check_hero_update
+CREATE TRIGGER IF NOT EXISTS trg_player_card_check_hero_update
 BEFORE UPDATE OF has_hero ON player_card
 FOR EACH ROW
 BEGIN
@@ -244,7 +248,7 @@ CREATE TABLE IF NOT EXISTS battles (
 CREATE TABLE IF NOT EXISTS decks (
     deck_hash TEXT PRIMARY KEY, -- Hash SHA256 della composizione del mazzo
     archetype_hash TEXT,        -- Hash SHA256 della composizione del mazzo (senza livelli)
-    avg_elixir REAL,
+    avg_elixir REAL
 );
 
 -- ================================
@@ -278,16 +282,16 @@ CREATE TABLE IF NOT EXISTS player_deck_stats (
     FOREIGN KEY (deck_hash) REFERENCES decks(deck_hash) ON DELETE CASCADE
 );
 
+-- ================================
+-- CACHE DEI MATCHUP (deckai.app)
+-- ================================
+CREATE TABLE IF NOT EXISTS matchup_cache (
+    player_key TEXT NOT NULL,       -- deck_hash (con livelli) o archetype_hash (livelli uguali)
+    opponent_key TEXT NOT NULL,
+    equal_levels INTEGER NOT NULL,  -- 1 se calcolato con force_equal_levels
+    win_rate REAL,
+    fetched_at DATETIME,
+    PRIMARY KEY (player_key, opponent_key, equal_levels)
+);
 
-
--- -- ================================
--- -- INDICI (per ricerche più veloci)
--- -- ================================
--- CREATE INDEX IF NOT EXISTS idx_matches_timestamp
---     ON matches(timestamp);
-
--- CREATE INDEX IF NOT EXISTS idx_matches_streak
---     ON matches(streak_before);
-
--- CREATE INDEX IF NOT EXISTS idx_player_cards_player
---     ON player_card(player_tag);
+-- Gli indici sono definiti in 0002_indexes.sql
@@ -0,0 +1,36 @@
+-- ================================
+-- INDICI (per ricerche più veloci)
+-- ================================
+
+-- Battaglie di un giocatore in ordine di tempo:
+-- get_last_battle_timestamp (MAX(timestamp)), load_battles (ORDER BY timestamp)
+CREATE INDEX IF NOT EXISTS idx_battles_player_ts
+    ON battles(player_tag, timestamp);
+
+-- Stesse letture filtrate per modalità (es. solo 'Ladder' in ai/data_loader)
+CREATE INDEX IF NOT EXISTS idx_battles_player_mode_ts
+    ON battles(player_tag, game_mode, timestamp);
+
+-- Mazzi usati da un giocatore (DISTINCT player_deck_id), coperto senza leggere la tabella
+CREATE INDEX IF NOT EXISTS idx_battles_player_deck
+    ON battles(player_tag, player_deck_id);
+
+-- Battaglie contro un dato mazzo avversario
+CREATE INDEX IF NOT EXISTS idx_battles_opponent_deck
+    ON battles(opponent_deck_id);
+
+-- Aggiornamento dei matchup per coppia di mazzi (matchup_worker)
+CREATE INDEX IF NOT EXISTS idx_battles_deck_pair
+    ON battles(player_deck_id, opponent_deck_id);
+
+-- Coda dei matchup da calcolare: contiene solo le battaglie ancora senza matchup
+CREATE INDEX IF NOT EXISTS idx_battles_pending_matchup
+    ON battles(player_deck_id, opponent_deck_id)
+    WHERE matchup_win_rate IS NULL OR matchup_no_lvl IS NULL;
+
+-- Mazzi con lo stesso archetipo (statistiche mazzi, matchup senza livelli)
+CREATE INDEX IF NOT EXISTS idx_decks_archetype
+    ON decks(archetype_hash);
+
+-- deck_cards (deck_hash, card_name), player_card (player_tag, card_name)
+-- e matchup_cache sono già coperti dalle rispettive PRIMARY KEY.
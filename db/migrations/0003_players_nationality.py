@@ -0,0 +1,7 @@
+# Aggiunge players.nationality, letta da ai/data_loader e battlelog_v2.load_player_details
+# ma assente dallo schema di base (i DB esistenti possono già averla).
+
+def upgrade(connection):
+    columns = {row[1] for row in connection.execute("PRAGMA table_info(players)")}
+    if "nationality" not in columns:
+        connection.execute("ALTER TABLE players ADD COLUMN nationality TEXT")
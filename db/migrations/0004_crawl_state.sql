@@ -0,0 +1,17 @@
+-- ================================
+-- STATO DEI CRAWL (checkpoint per riprendere le scansioni interrotte)
+-- ================================
+
+-- Una riga per fase (scroll/history) di ogni giocatore. Il checkpoint viene
+-- aggiornato nella stessa transazione della pagina di battaglie appena salvata.
+CREATE TABLE IF NOT EXISTS crawl_state (
+    player_tag TEXT NOT NULL,
+    phase TEXT NOT NULL,                    -- 'scroll' o 'history'
+    cursor INTEGER,                         -- timestamp della battaglia più vecchia già salvata
+    direction TEXT NOT NULL DEFAULT 'older',-- verso di scansione (dalle più recenti alle più vecchie)
+    stop_ts INTEGER,                        -- limite inferiore: ultima battaglia nel DB all'inizio del crawl (NULL = tutta la cronologia)
+    completed INTEGER NOT NULL DEFAULT 0,
+    updated_at DATETIME,
+    PRIMARY KEY (player_tag, phase),
+    FOREIGN KEY (player_tag) REFERENCES players(player_tag)
+);
@@ -0,0 +1,102 @@
+-- ================================
+-- CHIAVI INTERE PER I MAZZI
+-- ================================
+-- decks diventa una tabella dimensione con deck_id INTEGER (rowid) come chiave;
+-- deck_hash resta come colonna di ricerca univoca. battles, deck_cards e
+-- player_deck_stats passano da hash SHA256 di 64 caratteri a deck_id.
+-- Le chiavi di matchup_cache restano gli hash (indipendenti dal DB).
+--
+-- RICHIEDE FERMO: le tabelle vengono ricostruite (copia, drop, rename e
+-- ricreazione degli indici) in un'unica transazione BEGIN IMMEDIATE, che tiene
+-- il lock di scrittura per tutta la copia di battles. Su un DB grande vanno
+-- fermati main.py e i worker prima di applicarla; i lettori WAL non si fermano
+-- ma vedono il vecchio schema fino al commit.
+
+CREATE TABLE decks_new (
+    deck_id INTEGER PRIMARY KEY,
+    deck_hash TEXT NOT NULL UNIQUE, -- Hash SHA256 della composizione del mazzo
+    archetype_hash TEXT,            -- Hash SHA256 della composizione del mazzo (senza livelli)
+    avg_elixir REAL
+);
+INSERT INTO decks_new (deck_hash, archetype_hash, avg_elixir)
+SELECT deck_hash, archetype_hash, avg_elixir FROM decks ORDER BY rowid;
+
+CREATE TABLE deck_cards_new (
+    deck_id INTEGER NOT NULL,
+    card_name TEXT NOT NULL,
+    card_level INTEGER,
+    has_evolution INTEGER,
+    has_hero INTEGER,
+    PRIMARY KEY (deck_id, card_name),
+    FOREIGN KEY (deck_id) REFERENCES decks(deck_id) ON DELETE CASCADE
+) WITHOUT ROWID;
+INSERT INTO deck_cards_new (deck_id, card_name, card_level, has_evolution, has_hero)
+SELECT d.deck_id, dc.card_name, dc.card_level, dc.has_evolution, dc.has_hero
+FROM deck_cards dc JOIN decks_new d ON d.deck_hash = dc.deck_hash;
+
+CREATE TABLE player_deck_stats_new (
+    player_tag TEXT NOT NULL,
+    deck_id INTEGER NOT NULL,
+
+    battles_last_30d INTEGER,
+    wins_last_30d INTEGER,
+    confidence REAL, -- Es. win_rate (wins / battles)
+
+    last_updated DATETIME,
+
+    PRIMARY KEY (player_tag, deck_id),
+    FOREIGN KEY (player_tag) REFERENCES players(player_tag) ON DELETE CASCADE,
+    FOREIGN KEY (deck_id) REFERENCES decks(deck_id) ON DELETE CASCADE
+);
+INSERT INTO player_deck_stats_new (player_tag, deck_id, battles_last_30d, wins_last_30d, confidence, last_updated)
+SELECT s.player_tag, d.deck_id, s.battles_last_30d, s.wins_last_30d, s.confidence, s.last_updated
+FROM player_deck_stats s JOIN decks_new d ON d.deck_hash = s.deck_hash;
+
+CREATE TABLE battles_new (
+    battle_id TEXT PRIMARY KEY,          -- es: 1765577323.0
+    battle_type TEXT,                    -- PvP, Challenge, ecc
+    game_mode TEXT,                      -- Ladder
+    timestamp INTEGER,                   -- unix timestamp
+    player_tag TEXT,
+    player_deck_id INTEGER,              -- FK to decks.deck_id
+    opponent_tag TEXT,
+    opponent_deck_id INTEGER,            -- FK to decks.deck_id
+    player_crowns INTEGER,
+    opponent_crowns INTEGER,
+    win INTEGER,                          -- 1 win, 0 loss
+    trophy_change INTEGER,
+    elixir_leaked_player REAL,
+    elixir_leaked_opponent REAL,
+    level_diff REAL,
+    matchup_win_rate REAL,
+    matchup_no_lvl REAL
+);
+INSERT INTO battles_new
+SELECT b.battle_id, b.battle_type, b.game_mode, b.timestamp, b.player_tag, pd.deck_id,
+       b.opponent_tag, od.deck_id, b.player_crowns, b.opponent_crowns, b.win,
+       b.trophy_change, b.elixir_leaked_player, b.elixir_leaked_opponent, b.level_diff,
+       b.matchup_win_rate, b.matchup_no_lvl
+FROM battles b
+LEFT JOIN decks_new pd ON pd.deck_hash = b.player_deck_id
+LEFT JOIN decks_new od ON od.deck_hash = b.opponent_deck_id;
+
+DROP TABLE battles;
+DROP TABLE player_deck_stats;
+DROP TABLE deck_cards;
+DROP TABLE decks;
+
+ALTER TABLE decks_new RENAME TO decks;
+ALTER TABLE deck_cards_new RENAME TO deck_cards;
+ALTER TABLE player_deck_stats_new RENAME TO player_deck_stats;
+ALTER TABLE battles_new RENAME TO battles;
+
+-- Indici di 0002_indexes.sql, eliminati insieme alle vecchie tabelle
+CREATE INDEX idx_battles_player_ts ON battles(player_tag, timestamp);
+CREATE INDEX idx_battles_player_mode_ts ON battles(player_tag, game_mode, timestamp);
+CREATE INDEX idx_battles_player_deck ON battles(player_tag, player_deck_id);
+CREATE INDEX idx_battles_opponent_deck ON battles(opponent_deck_id);
+CREATE INDEX idx_battles_deck_pair ON battles(player_deck_id, opponent_deck_id);
+CREATE INDEX idx_battles_pending_matchup
+    ON battles(player_deck_id, opponent_deck_id)
+    WHERE matchup_win_rate IS NULL OR matchup_no_lvl IS NULL;
+CREATE INDEX idx_decks_archetype ON decks(archetype_hash);
@@ -0,0 +1,10 @@
+-- ================================
+-- DIGEST DEI PROFILI (rilevamento dei profili invariati)
+-- ================================
+
+-- Impronta dei dati di progressione letti dalla pagina del profilo e della
+-- collezione di carte: se il profilo non cambia, la pagina /cards e le
+-- scritture su player_card vengono saltate (vedi player_updater.py).
+ALTER TABLE players ADD COLUMN profile_digest TEXT;
+ALTER TABLE players ADD COLUMN cards_digest TEXT;
+ALTER TABLE players ADD COLUMN cards_updated DATETIME;  -- ultimo download della pagina /cards
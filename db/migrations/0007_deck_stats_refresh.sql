@@ -0,0 +1,22 @@
+-- ================================
+-- AGGIORNAMENTO PROGRAMMATO DELLE STATISTICHE DEI MAZZI
+-- ================================
+
+-- La pagina /decks viene riscaricata solo dopo un certo numero di battaglie
+-- nuove o dopo un certo tempo (vedi battle_updater.refresh_deck_stats_if_due).
+ALTER TABLE players ADD COLUMN deck_stats_updated DATETIME;
+ALTER TABLE players ADD COLUMN deck_stats_ts INTEGER;  -- ultima battaglia nel DB al momento dell'aggiornamento
+
+-- Mazzi usati da ogni giocatore, per archetipo: sostituisce la ricerca
+-- DISTINCT su battles ad ogni aggiornamento delle statistiche.
+CREATE TABLE IF NOT EXISTS player_decks (
+    player_tag TEXT NOT NULL,
+    archetype_hash TEXT NOT NULL,
+    deck_id INTEGER NOT NULL,
+    PRIMARY KEY (player_tag, archetype_hash, deck_id)
+) WITHOUT ROWID;
+
+INSERT OR IGNORE INTO player_decks (player_tag, archetype_hash, deck_id)
+SELECT DISTINCT b.player_tag, d.archetype_hash, d.deck_id
+FROM battles b JOIN decks d ON d.deck_id = b.player_deck_id
+WHERE d.archetype_hash IS NOT NULL;
@@ -0,0 +1,25 @@
+-- ================================
+-- SCOPERTA DI NUOVI GIOCATORI (frontiera dagli avversari)
+-- ================================
+
+-- Ogni tag avversario mai visto e non ancora tracciato. La tabella fa anche da
+-- insieme dei tag già visti: un tag ammesso o scartato non rientra in frontiera.
+CREATE TABLE IF NOT EXISTS discovery_frontier (
+    player_tag TEXT PRIMARY KEY,
+    first_seen DATETIME,
+    last_seen DATETIME,
+    times_seen INTEGER NOT NULL DEFAULT 0, -- battaglie contro giocatori tracciati
+    est_trophies INTEGER,                  -- trofei dei giocatori tracciati che lo hanno incontrato (matchmaking)
+    est_arena TEXT,
+    status TEXT NOT NULL DEFAULT 'pending',-- 'pending', 'admitted' o 'rejected'
+    admitted_at DATETIME
+);
+
+CREATE INDEX IF NOT EXISTS idx_frontier_status_seen ON discovery_frontier(status, times_seen);
+
+-- Ultimo rowid di battles già letto per alimentare la frontiera
+CREATE TABLE IF NOT EXISTS discovery_state (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    last_battle_rowid INTEGER NOT NULL DEFAULT 0
+);
+INSERT OR IGNORE INTO discovery_state (id, last_battle_rowid) VALUES (1, 0);
@@ -0,0 +1,28 @@
+-- ================================
+-- LEASE PER PIÙ WORKER (vedi leases.py e worker.py)
+-- ================================
+
+-- Una riga per risorsa assegnata: il tag di un giocatore o un lavoro unico
+-- ('job:matchups', 'job:discovery'). Un lease scaduto può essere preso da
+-- un altro worker: il lavoro di un worker caduto viene così recuperato.
+CREATE TABLE IF NOT EXISTS leases (
+    resource TEXT PRIMARY KEY,
+    worker_id TEXT NOT NULL,
+    leased_until DATETIME NOT NULL,
+    claimed_at DATETIME
+);
+
+CREATE INDEX IF NOT EXISTS idx_leases_worker ON leases(worker_id);
+
+-- Avanzamento dichiarato da ogni worker
+CREATE TABLE IF NOT EXISTS workers (
+    worker_id TEXT PRIMARY KEY,             -- es: host-pid
+    host TEXT,
+    pid INTEGER,
+    started_at DATETIME,
+    last_heartbeat DATETIME,
+    status TEXT,                            -- 'running', 'idle' o 'stopped'
+    players_done INTEGER NOT NULL DEFAULT 0,
+    battle_pages INTEGER NOT NULL DEFAULT 0,
+    errors INTEGER NOT NULL DEFAULT 0
+);
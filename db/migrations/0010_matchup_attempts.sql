@@ -0,0 +1,18 @@
+-- ================================
+-- TENTATIVI DI CALCOLO DEI MATCHUP (vedi matchup_worker.py)
+-- ================================
+
+-- Una riga per coppia di mazzi che matchup_worker non è riuscito a risolvere.
+-- Le coppie non valutabili (mazzi incompleti) e quelle fallite troppe volte
+-- vengono escluse dalle coppie in attesa; le altre vengono ritentate solo
+-- dopo next_try (attesa esponenziale). La riga viene rimossa quando la coppia
+-- viene risolta.
+CREATE TABLE IF NOT EXISTS matchup_attempts (
+    player_deck_id INTEGER NOT NULL,
+    opponent_deck_id INTEGER NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_tried DATETIME,
+    next_try DATETIME,
+    unevaluable INTEGER NOT NULL DEFAULT 0,  -- 1 = mazzo incompleto o sconosciuto, non valutabile da deckai.app
+    PRIMARY KEY (player_deck_id, opponent_deck_id)
+) WITHOUT ROWID;
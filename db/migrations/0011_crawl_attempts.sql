@@ -0,0 +1,9 @@
+-- ================================
+-- TENTATIVI DEI CRAWL INTERROTTI (vedi battle_updater.fail_crawl)
+-- ================================
+
+-- Pagine fallite di fila sul checkpoint: un crawl ripreso la cui pagina non si
+-- scarica bloccherebbe per sempre le battaglie nuove del giocatore. Dopo
+-- MAX_CRAWL_ATTEMPTS fallimenti il checkpoint viene chiuso e al giro
+-- successivo riparte un crawl nuovo. Ogni pagina salvata azzera il contatore.
+ALTER TABLE crawl_state ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0;
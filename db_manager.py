@@ -1,43 +1,67 @@
 import hashlib
 import logging
+import threading
+from collections import OrderedDict
 from datetime import datetime
+from card_registry import card_key, deck_identity, archetype_identity
+import metrics
 
+# Numero massimo di mazzi tenuti nella cache in memoria (vedi _insert_deck)
+DECK_CACHE_SIZE = 200_000
+# Numero massimo di archetype_hash memorizzati (vedi get_archetype_hash)
+ARCHETYPE_CACHE_SIZE = 100_000
+
+PLAYER_STAT_COLUMNS = ['player_name', 'clan_name', 'trophies', 'arena', 'rank', 'ranked_trophies', 'wins', 'losses', 'three_crown_wins', 'total_games', 'account_age_seconds', 'time_spent_seconds', 'games_per_day']
+
+@metrics.timed("db_write_seconds", function="update_player_stats")
 def update_player_stats(cursor, tag: str, player_data: tuple):
-    """Aggiorna le statistiche base di un giocatore nel database."""
-    columns = ['player_name', 'clan_name', 'trophies', 'arena', 'rank', 'ranked_trophies', 'wins', 'losses', 'three_crown_wins', 'total_games', 'account_age_seconds', 'time_spent_seconds', 'games_per_day']
-    
-    for i, col_name in enumerate(columns):
-        cursor.execute(f"UPDATE players SET {col_name} = ? WHERE player_tag = ?", (player_data[i], tag))
+    """Aggiorna le statistiche base di un giocatore nel database con un unico upsert."""
+    current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    columns = PLAYER_STAT_COLUMNS + ['last_updated']
+    placeholders = ', '.join(['?'] * (len(columns) + 1))
+    assignments = ', '.join(f"{col} = excluded.{col}" for col in columns)
+
+    cursor.execute(
+        f"INSERT INTO players (player_tag, {', '.join(columns)}) VALUES ({placeholders}) "
+        f"ON CONFLICT(player_tag) DO UPDATE SET {assignments}",
+        (tag, *player_data, current_time)
+    )
+
+def get_profile_digests(cursor, tag: str) -> tuple | None:
+    """Restituisce (profile_digest, cards_digest, cards_updated) salvati per il giocatore."""
+    cursor.execute("SELECT profile_digest, cards_digest, cards_updated FROM players WHERE player_tag = ?", (tag,))
+    return cursor.fetchone()
 
+@metrics.timed("db_write_seconds", function="save_profile_digests")
+def save_profile_digests(cursor, tag: str, profile_digest: str, cards_digest: str):
+    """Salva le impronte di profilo e carte dopo un aggiornamento completo."""
     current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    cursor.execute("UPDATE players SET last_updated = ? WHERE player_tag = ?", (current_time, tag))
+    cursor.execute("UPDATE players SET profile_digest = ?, cards_digest = ?, cards_updated = ? WHERE player_tag = ?",
+                   (profile_digest, cards_digest, current_time, tag))
 
+@metrics.timed("db_write_seconds", function="update_player_towers")
 def update_player_towers(cursor, tag: str, towers: list):
     """Aggiorna le torri di un giocatore nel database."""
-    for tower in towers:
-        cursor.execute("INSERT OR REPLACE INTO player_card(player_tag, card_name, level, found, has_evolution, has_hero) VALUES(?, ?, ?, ?, 0, 0)", 
-                       (tag, tower["name"], tower["level"], 1 if tower["level"] > 0 else 0))
+    cursor.executemany("INSERT OR REPLACE INTO player_card(player_tag, card_name, level, found, has_evolution, has_hero) VALUES(?, ?, ?, ?, 0, 0)",
+                       [(tag, tower["name"], tower["level"], 1 if tower["level"] > 0 else 0) for tower in towers])
 
+@metrics.timed("db_write_seconds", function="update_player_heroes")
 def update_player_heroes(cursor, tag: str, heroes: list):
     """Aggiorna gli eroi di un giocatore nel database."""
-    for hero in heroes:
-        is_found = 1 if hero["found"] else 0
-        cursor.execute("INSERT INTO player_card(player_tag, card_name, has_hero) VALUES(?, ?, ?) ON CONFLICT(player_tag, card_name) DO UPDATE SET has_hero=excluded.has_hero",
-                       (tag, hero["name"], is_found))
+    cursor.executemany("INSERT INTO player_card(player_tag, card_name, has_hero) VALUES(?, ?, ?) ON CONFLICT(player_tag, card_name) DO UPDATE SET has_hero=excluded.has_hero",
+                       [(tag, hero["name"], 1 if hero["found"] else 0) for hero in heroes])
 
+@metrics.timed("db_write_seconds", function="update_player_evolutions")
 def update_player_evolutions(cursor, tag: str, evolutions: list):
     """Aggiorna le evoluzioni di un giocatore nel database."""
-    for evolution in evolutions:
-        is_found = 1 if evolution["found"] else 0
-        cursor.execute("INSERT INTO player_card(player_tag, card_name, has_evolution) VALUES(?, ?, ?) ON CONFLICT(player_tag, card_name) DO UPDATE SET has_evolution=excluded.has_evolution",
-                       (tag, evolution["name"], is_found))
+    cursor.executemany("INSERT INTO player_card(player_tag, card_name, has_evolution) VALUES(?, ?, ?) ON CONFLICT(player_tag, card_name) DO UPDATE SET has_evolution=excluded.has_evolution",
+                       [(tag, evolution["name"], 1 if evolution["found"] else 0) for evolution in evolutions])
 
+@metrics.timed("db_write_seconds", function="update_player_cards")
 def update_player_cards(cursor, tag: str, cards: list):
     """Aggiorna le carte di un giocatore nel database."""
-    for card in cards:
-        is_found = 1 if card["level"] and card["level"] > 0 else 0
-        cursor.execute("INSERT INTO player_card(player_tag, card_name, level, found) VALUES(?, ?, ?, ?) ON CONFLICT(player_tag, card_name) DO UPDATE SET level=excluded.level, found=excluded.found",
-                       (tag, card["name"], card["level"], is_found))
+    cursor.executemany("INSERT INTO player_card(player_tag, card_name, level, found) VALUES(?, ?, ?, ?) ON CONFLICT(player_tag, card_name) DO UPDATE SET level=excluded.level, found=excluded.found",
+                       [(tag, card["name"], card["level"], 1 if card["level"] and card["level"] > 0 else 0) for card in cards])
 
 def get_last_battle_timestamp(cursor, player_tag: str) -> int | None:
     """Recupera il timestamp dell'ultima battaglia registrata per un giocatore."""
@@ -45,42 +69,83 @@ def get_last_battle_timestamp(cursor, player_tag: str) -> int | None:
     row = cursor.fetchone()
     return row[0] if row and row[0] else None
 
-def get_player_deck_hashes(cursor, player_tag: str) -> list:
-    """Recupera tutti gli hash dei mazzi unici usati da un giocatore."""
-    cursor.execute("SELECT DISTINCT player_deck_id FROM battles WHERE player_tag = ? AND player_deck_id IS NOT NULL", (player_tag,))
-    rows = cursor.fetchall()
-    return [row[0] for row in rows]
-
-def get_card_keys_for_deck(cursor, deck_hash: str) -> list:
-    """Recupera i nomi delle carte (con suffisso -ev1/-hero) per un dato deck_hash."""
-    cursor.execute("SELECT card_name, has_evolution, has_hero FROM deck_cards WHERE deck_hash = ?", (deck_hash,))
-    rows = cursor.fetchall()
-    card_keys = []
-    for name, has_evo, has_hero in rows:
-        key = name.lower().replace(' ', '-')
-        if has_evo:
-            key += '-ev1'
-        # Nota: l'HTML non sembra usare un suffisso per gli eroi nel deck identifier,
-        # ma lo aggiungiamo per coerenza se dovesse servire.
-        # if has_hero:
-        #     key += '-hero'
-        card_keys.append(key)
-    return sorted(card_keys)
-
-def update_player_deck_stats(cursor, player_tag: str, deck_hash: str, stats: dict):
+@metrics.timed("db_write_seconds", function="save_crawl_state")
+def save_crawl_state(cursor, player_tag: str, phase: str, cursor_ts: int | None, stop_ts: int | None, completed: bool = False):
+    """Salva il checkpoint di una fase di crawl (il commit è del chiamante)."""
+    current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    cursor.execute("""
+        INSERT INTO crawl_state (player_tag, phase, cursor, direction, stop_ts, completed, updated_at) VALUES (?, ?, ?, 'older', ?, ?, ?)
+        ON CONFLICT(player_tag, phase) DO UPDATE SET cursor=excluded.cursor, stop_ts=excluded.stop_ts, completed=excluded.completed,
+            updated_at=excluded.updated_at, attempts=0
+    """, (player_tag, phase, cursor_ts, stop_ts, 1 if completed else 0, current_time))
+
+@metrics.timed("db_write_seconds", function="record_crawl_failure")
+def record_crawl_failure(cursor, player_tag: str, phase: str, max_attempts: int) -> int:
+    """
+    Conta una pagina fallita sul checkpoint aperto di una fase; raggiunti
+    max_attempts il checkpoint viene chiuso (il commit è del chiamante).
+    Restituisce i tentativi falliti finora (0 se non c'è un checkpoint aperto).
+    """
+    current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    cursor.execute("""
+        UPDATE crawl_state SET attempts = attempts + 1, completed = attempts + 1 >= ?, updated_at = ?
+        WHERE player_tag = ? AND phase = ? AND completed = 0
+    """, (max_attempts, current_time, player_tag, phase))
+    if not cursor.rowcount:
+        return 0
+    cursor.execute("SELECT attempts FROM crawl_state WHERE player_tag = ? AND phase = ?", (player_tag, phase))
+    return cursor.fetchone()[0]
+
+def get_pending_crawls(cursor, player_tag: str) -> list:
+    """Restituisce i crawl interrotti di un giocatore come (fase, cursore, stop_ts), scroll prima di history."""
+    cursor.execute(
+        "SELECT phase, cursor, stop_ts FROM crawl_state WHERE player_tag = ? AND completed = 0 ORDER BY phase = 'history'",
+        (player_tag,)
+    )
+    return cursor.fetchall()
+
+def get_player_decks_by_archetype(cursor, player_tag: str) -> dict:
+    """Restituisce {archetype_hash: [deck_id, ...]} dei mazzi usati da un giocatore (tabella player_decks)."""
+    cursor.execute("SELECT archetype_hash, deck_id FROM player_decks WHERE player_tag = ?", (player_tag,))
+    decks = {}
+    for archetype_hash, deck_id in cursor.fetchall():
+        decks.setdefault(archetype_hash, []).append(deck_id)
+    return decks
+
+def get_deck_stats_state(cursor, player_tag: str) -> tuple:
+    """Restituisce (deck_stats_updated, deck_stats_ts) dell'ultimo aggiornamento delle statistiche dei mazzi."""
+    cursor.execute("SELECT deck_stats_updated, deck_stats_ts FROM players WHERE player_tag = ?", (player_tag,))
+    return cursor.fetchone() or (None, None)
+
+def count_battles_since(cursor, player_tag: str, timestamp: int | None) -> int:
+    """Conta le battaglie del giocatore più recenti del timestamp indicato."""
+    cursor.execute("SELECT COUNT(*) FROM battles WHERE player_tag = ? AND timestamp > ?", (player_tag, timestamp or 0))
+    return cursor.fetchone()[0]
+
+@metrics.timed("db_write_seconds", function="mark_deck_stats_updated")
+def mark_deck_stats_updated(cursor, player_tag: str):
+    """Registra l'aggiornamento delle statistiche dei mazzi e l'ultima battaglia presente in quel momento."""
+    current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    cursor.execute(
+        "UPDATE players SET deck_stats_updated = ?, deck_stats_ts = (SELECT MAX(timestamp) FROM battles WHERE player_tag = ?) WHERE player_tag = ?",
+        (current_time, player_tag, player_tag)
+    )
+
+@metrics.timed("db_write_seconds", function="update_player_deck_stats")
+def update_player_deck_stats(cursor, player_tag: str, deck_id: int, stats: dict):
     """Inserisce o aggiorna le statistiche di un mazzo per un giocatore."""
     confidence = stats['wins'] / stats['battles'] if stats['battles'] > 0 else 0
     current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
     cursor.execute("""
-        INSERT INTO player_deck_stats (player_tag, deck_hash, battles_last_30d, wins_last_30d, confidence, last_updated) VALUES (?, ?, ?, ?, ?, ?)
-        ON CONFLICT(player_tag, deck_hash) DO UPDATE SET battles_last_30d=excluded.battles_last_30d, wins_last_30d=excluded.wins_last_30d, confidence=excluded.confidence, last_updated=excluded.last_updated
-    """, (player_tag, deck_hash, stats['battles'], stats['wins'], confidence, current_time))
+        INSERT INTO player_deck_stats (player_tag, deck_id, battles_last_30d, wins_last_30d, confidence, last_updated) VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT(player_tag, deck_id) DO UPDATE SET battles_last_30d=excluded.battles_last_30d, wins_last_30d=excluded.wins_last_30d, confidence=excluded.confidence, last_updated=excluded.last_updated
+    """, (player_tag, deck_id, stats['battles'], stats['wins'], confidence, current_time))
 
 def _generate_deck_hashes(cards: list) -> tuple[str, str]:
     """Genera due hash SHA256 per un mazzo: uno con livelli (deck_hash) e uno senza (archetype_hash)."""
     # Normalizza i nomi delle carte PRIMA di ordinarli per garantire consistenza.
-    # La chiave di ordinamento è la forma normalizzata del nome.
-    sorted_cards = sorted(cards, key=lambda c: c['name'].lower().replace(' ', '-'))
+    # La chiave di ordinamento è la forma normalizzata del nome (precalcolata nel registro carte).
+    sorted_cards = sorted(cards, key=lambda c: card_key(c['name']))
     
     # Hash con i livelli (per unicità della battaglia)
     level_dependent_string = ",".join([
@@ -91,49 +156,180 @@ def _generate_deck_hashes(cards: list) -> tuple[str, str]:
 
     # Hash senza i livelli (per l'archetipo)
     level_independent_string = ",".join([
-        f"{c['name'].lower().replace(' ', '-')}:{c.get('has_evolution', 0)}:{c.get('has_hero', 0)}"
+        f"{card_key(c['name'])}:{c.get('has_evolution', 0)}:{c.get('has_hero', 0)}"
         for c in sorted_cards
     ])
     archetype_hash = hashlib.sha256(level_independent_string.encode()).hexdigest()
 
     return deck_hash, archetype_hash
 
-def _insert_deck(cursor, cards: list) -> str | None:
-    """Inserisce un mazzo e le sue carte nel DB, se non presenti, e restituisce il deck_hash (con livelli)."""
+_archetype_hashes = {}
+
+def get_archetype_hash(cards: list) -> str:
+    """archetype_hash di un mazzo, calcolato una sola volta per archetipo."""
+    identity = archetype_identity(cards)
+    archetype_hash = _archetype_hashes.get(identity)
+    if archetype_hash is None:
+        archetype_hash = _generate_deck_hashes(cards)[1]
+        if len(_archetype_hashes) >= ARCHETYPE_CACHE_SIZE:
+            _archetype_hashes.clear()
+        _archetype_hashes[identity] = archetype_hash
+    return archetype_hash
+
+# Cache dei mazzi già salvati: identità del mazzo (card_registry.deck_identity) -> (deck_id, deck_hash, archetype_hash).
+# Contiene solo mazzi confermati da un commit; quelli inseriti dalla transazione in corso
+# restano nei pending del thread (una connessione per thread) finché non vengono pubblicati.
+_deck_cache = OrderedDict()
+_deck_cache_lock = threading.Lock()
+_pending_decks = threading.local()
+
+def _deck_cache_get(key: tuple):
+    with _deck_cache_lock:
+        entry = _deck_cache.get(key)
+        if entry is not None:
+            _deck_cache.move_to_end(key)
+        return entry
+
+def _deck_cache_put(entries: dict):
+    with _deck_cache_lock:
+        _deck_cache.update(entries)
+        for key in entries:
+            _deck_cache.move_to_end(key)
+        while len(_deck_cache) > DECK_CACHE_SIZE:
+            _deck_cache.popitem(last=False)
+
+def _get_pending() -> dict:
+    if not hasattr(_pending_decks, "decks"):
+        _pending_decks.decks = {}
+    return _pending_decks.decks
+
+def publish_new_decks():
+    """Da chiamare dopo il commit: i mazzi inseriti dal thread entrano nella cache condivisa."""
+    pending = _get_pending()
+    if pending:
+        _deck_cache_put(pending)
+        pending.clear()
+
+def discard_new_decks():
+    """Da chiamare dopo un rollback: i mazzi inseriti dal thread non esistono più."""
+    _get_pending().clear()
+
+def warm_deck_cache(cursor, limit: int = DECK_CACHE_SIZE) -> int:
+    """Carica in cache i mazzi salvati più di recente. Restituisce il numero di mazzi caricati."""
+    cursor.execute("""
+        SELECT d.deck_id, d.deck_hash, d.archetype_hash, dc.card_name, dc.card_level, dc.has_evolution, dc.has_hero
+        FROM (SELECT deck_id, deck_hash, archetype_hash FROM decks ORDER BY deck_id DESC LIMIT ?) d
+        JOIN deck_cards dc ON dc.deck_id = d.deck_id
+        ORDER BY d.deck_id
+    """, (limit,))
+
+    decks = {}
+    for deck_id, deck_hash, archetype_hash, name, level, has_evo, has_hero in cursor.fetchall():
+        decks.setdefault((deck_id, deck_hash, archetype_hash), []).append(
+            {"name": name, "level": level, "has_evolution": has_evo, "has_hero": has_hero}
+        )
+    _deck_cache_put({deck_identity(cards): entry for entry, cards in decks.items()})
+    return len(decks)
+
+def _insert_deck(cursor, cards: list) -> tuple | None:
+    """
+    Inserisce un mazzo e le sue carte nel DB, se non presenti, e restituisce
+    (deck_id, deck_hash, archetype_hash). I mazzi già noti costano una ricerca
+    in memoria, senza SQL né calcolo degli hash.
+    """
     if not cards:
         return None
+
+    key = deck_identity(cards)
+    pending = _get_pending()
+    entry = _deck_cache_get(key) or pending.get(key)
+    if entry is not None:
+        metrics.inc("deck_cache_total", result="hit")
+        return entry
     
     deck_hash, archetype_hash = _generate_deck_hashes(cards)
     cursor.execute("INSERT OR IGNORE INTO decks (deck_hash, archetype_hash) VALUES (?, ?)", (deck_hash, archetype_hash))
+    if cursor.rowcount == 0:
+        # Mazzo già presente (e confermato: quelli di questa transazione sono nei pending)
+        cursor.execute("SELECT deck_id FROM decks WHERE deck_hash = ?", (deck_hash,))
+        entry = (cursor.fetchone()[0], deck_hash, archetype_hash)
+        _deck_cache_put({key: entry})
+        metrics.inc("deck_cache_total", result="db")
+        return entry
+
+    deck_id = cursor.lastrowid
+    cursor.executemany("""
+        INSERT OR IGNORE INTO deck_cards 
+        (deck_id, card_name, card_level, has_evolution, has_hero) 
+        VALUES (?, ?, ?, ?, ?)
+    """, [(deck_id, card['name'], card['level'], card['has_evolution'], card['has_hero']) for card in cards])
+    entry = pending[key] = (deck_id, deck_hash, archetype_hash)
+    metrics.inc("deck_cache_total", result="new")
     
-    for card in cards:
-        cursor.execute("""
-            INSERT OR IGNORE INTO deck_cards 
-            (deck_hash, card_name, card_level, has_evolution, has_hero) 
-            VALUES (?, ?, ?, ?, ?)
-        """, (deck_hash, card['name'], card['level'], card['has_evolution'], card['has_hero']))
-    
-    return deck_hash
+    return entry
+
+_INSERT_BATTLE_SQL = """
+    INSERT OR IGNORE INTO battles (
+        battle_id, battle_type, game_mode, timestamp, player_tag, player_deck_id,
+        opponent_tag, opponent_deck_id, player_crowns, opponent_crowns, win,
+        trophy_change, elixir_leaked_player, elixir_leaked_opponent, level_diff,
+        matchup_win_rate, matchup_no_lvl
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
 
-def insert_battle_and_decks(cursor, battle_data: dict, player_deck: list, opponent_deck: list | None, matchup_win_rate: float | None, matchup_no_lvl: float | None):
+# Usata da reparse.py: riscrive i campi estratti dalla pagina. I matchup già calcolati
+# restano solo se i mazzi non sono cambiati, altrimenti tornano NULL per matchup_worker.
+_UPSERT_BATTLE_SQL = _INSERT_BATTLE_SQL.replace("INSERT OR IGNORE", "INSERT") + """
+    ON CONFLICT(battle_id) DO UPDATE SET
+        battle_type=excluded.battle_type, game_mode=excluded.game_mode, timestamp=excluded.timestamp,
+        player_tag=excluded.player_tag, player_deck_id=excluded.player_deck_id,
+        opponent_tag=excluded.opponent_tag, opponent_deck_id=excluded.opponent_deck_id,
+        player_crowns=excluded.player_crowns, opponent_crowns=excluded.opponent_crowns, win=excluded.win,
+        trophy_change=excluded.trophy_change, elixir_leaked_player=excluded.elixir_leaked_player,
+        elixir_leaked_opponent=excluded.elixir_leaked_opponent, level_diff=excluded.level_diff,
+        matchup_win_rate=CASE WHEN battles.player_deck_id IS excluded.player_deck_id
+                               AND battles.opponent_deck_id IS excluded.opponent_deck_id
+                              THEN battles.matchup_win_rate END,
+        matchup_no_lvl=CASE WHEN battles.player_deck_id IS excluded.player_deck_id
+                             AND battles.opponent_deck_id IS excluded.opponent_deck_id
+                            THEN battles.matchup_no_lvl END
+"""
+
+_INSERT_PLAYER_DECK_SQL = "INSERT OR IGNORE INTO player_decks (player_tag, archetype_hash, deck_id) VALUES (?, ?, ?)"
+
+def _battle_row(cursor, battle_data: dict, player_deck: list, opponent_deck: list | None) -> tuple[tuple, tuple | None]:
     """
-    Inserisce i mazzi e la battaglia nel database.
+    Inserisce i mazzi della battaglia e restituisce la riga da scrivere in battles
+    e quella per player_decks (None se manca il mazzo del giocatore).
     """
-    player_deck_id = _insert_deck(cursor, player_deck)
-    opponent_deck_id = _insert_deck(cursor, opponent_deck) if opponent_deck else None
-    
-    cursor.execute("""
-        INSERT OR IGNORE INTO battles (
-            battle_id, battle_type, game_mode, timestamp, player_tag, player_deck_id,
-            opponent_tag, opponent_deck_id, player_crowns, opponent_crowns, win,
-            trophy_change, elixir_leaked_player, elixir_leaked_opponent, level_diff,
-            matchup_win_rate, matchup_no_lvl
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    """, (
+    player_entry = _insert_deck(cursor, player_deck)
+    opponent_entry = _insert_deck(cursor, opponent_deck) if opponent_deck else None
+    player_deck_id = player_entry[0] if player_entry else None
+    opponent_deck_id = opponent_entry[0] if opponent_entry else None
+
+    row = (
         battle_data["battle_id"], battle_data["battle_type"], battle_data["game_mode"],
         battle_data["timestamp"], battle_data["player_tag"], player_deck_id,
         battle_data["opponent_tag"], opponent_deck_id, battle_data["player_crowns"],
         battle_data["opponent_crowns"], battle_data["win"], battle_data["trophy_change"],
         battle_data["elixir_leaked_player"], battle_data["elixir_leaked_opponent"],
-        battle_data["level_diff"], matchup_win_rate, matchup_no_lvl
-    ))
\ No newline at end of file
+        battle_data["level_diff"], None, None  # matchup calcolati da matchup_worker
+    )
+    player_deck_row = (battle_data["player_tag"], player_entry[2], player_deck_id) if player_entry and player_entry[2] else None
+    return row, player_deck_row
+
+@metrics.timed("db_write_seconds", function="insert_battles_and_decks")
+def insert_battles_and_decks(cursor, records: list, replace: bool = False) -> int:
+    """
+    Inserisce in blocco le battaglie di una pagina, come lista di
+    (battle, mazzo giocatore, mazzo avversario), con matchup da calcolare.
+    Con replace le battaglie già presenti vengono riscritte (vedi reparse.py).
+    Restituisce il numero di battaglie effettivamente inserite o aggiornate.
+    """
+    rows = [_battle_row(cursor, battle, player_deck, opponent_deck) for battle, player_deck, opponent_deck in records]
+    before = cursor.connection.total_changes
+    cursor.executemany(_UPSERT_BATTLE_SQL if replace else _INSERT_BATTLE_SQL, [row for row, _ in rows])
+    written = cursor.connection.total_changes - before
+    cursor.executemany(_INSERT_PLAYER_DECK_SQL, {player_deck_row for _, player_deck_row in rows if player_deck_row})
+    metrics.inc("battles_written_total", written)
+    return written
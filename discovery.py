@@ -0,0 +1,153 @@
+"""
+Scoperta di nuovi giocatori dal grafo degli avversari.
+
+Gli opponent_tag delle battaglie salvate alimentano una frontiera persistente
+(discovery_frontier) che fa anche da insieme dei tag già visti. A ogni giro
+vengono ammessi in players alcuni tag della frontiera, scegliendo prima le
+fasce di trofei/arene meno coperte dai giocatori già tracciati; il ciclo
+normale (scheduler.plan_sweep) li aggiorna per primi perché mai aggiornati.
+
+Uso: python discovery.py [N]   (ammette fino a N giocatori)
+"""
+import re
+import sys
+import heapq
+import logging
+from collections import Counter, defaultdict
+from datetime import datetime
+from utils.connection import open_connection, close_connection
+from db.migrate import migrate_db
+
+DB_PATH = "db/clash.db"
+
+# Giocatori ammessi al massimo per giro
+ADMIT_PER_SWEEP = 10
+# Non si ammettono altri giocatori finché ce ne sono così tanti ancora mai aggiornati
+# (il loro primo crawl scarica tutta la cronologia e pesa sul budget di richieste)
+MAX_NEW_PLAYERS_WAITING = 20
+# Ampiezza delle fasce di trofei usate per misurare la copertura
+TROPHY_BUCKET = 1000
+# Candidati più visti considerati a ogni giro
+CANDIDATE_POOL = 2000
+
+# Caratteri ammessi nei tag di Clash Royale
+TAG_PATTERN = re.compile(r"^[0289PYLQGRJCUV]{3,15}$")
+
+def update_frontier(cursor) -> int:
+    """
+    Aggiunge alla frontiera gli avversari non tracciati delle battaglie inserite
+    dall'ultimo passaggio (per rowid). Restituisce il numero di tag aggiornati.
+    """
+    cursor.execute("SELECT last_battle_rowid FROM discovery_state WHERE id = 1")
+    last_rowid = cursor.fetchone()[0]
+    cursor.execute("SELECT MAX(rowid) FROM battles")
+    max_rowid = cursor.fetchone()[0] or 0
+    if max_rowid <= last_rowid:
+        return 0
+
+    current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    before = cursor.connection.total_changes
+    cursor.execute("""
+        INSERT INTO discovery_frontier (player_tag, first_seen, last_seen, times_seen, est_trophies, est_arena)
+        SELECT b.opponent_tag, ?, ?, COUNT(*), CAST(AVG(p.trophies) AS INTEGER), MAX(p.arena)
+        FROM battles b JOIN players p ON p.player_tag = b.player_tag
+        WHERE b.rowid > ? AND b.rowid <= ?
+          AND b.opponent_tag IS NOT NULL
+          AND b.opponent_tag NOT IN (SELECT player_tag FROM players)
+        GROUP BY b.opponent_tag
+        ON CONFLICT(player_tag) DO UPDATE SET
+            last_seen = excluded.last_seen,
+            times_seen = discovery_frontier.times_seen + excluded.times_seen,
+            est_trophies = COALESCE(excluded.est_trophies, discovery_frontier.est_trophies),
+            est_arena = COALESCE(excluded.est_arena, discovery_frontier.est_arena)
+    """, (current_time, current_time, last_rowid, max_rowid))
+    updated = cursor.connection.total_changes - before
+
+    cursor.execute("UPDATE discovery_state SET last_battle_rowid = ? WHERE id = 1", (max_rowid,))
+    return updated
+
+def _bucket(trophies: int | None, arena: str | None) -> tuple:
+    return (trophies // TROPHY_BUCKET if trophies is not None else None, arena)
+
+def _coverage(cursor) -> Counter:
+    """Giocatori tracciati per fascia di trofei e arena."""
+    cursor.execute("SELECT trophies, arena FROM players")
+    return Counter(_bucket(trophies, arena) for trophies, arena in cursor.fetchall())
+
+def select_candidates(cursor, limit: int) -> list:
+    """
+    Sceglie fino a `limit` tag dalla frontiera: ogni scelta va alla fascia
+    trofei/arena con meno giocatori (tracciati + già scelti), e dentro la
+    fascia al tag incontrato più spesso. I tag non validi vengono scartati.
+    """
+    cursor.execute("""
+        SELECT player_tag, est_trophies, est_arena FROM discovery_frontier
+        WHERE status = 'pending' ORDER BY times_seen DESC LIMIT ?
+    """, (CANDIDATE_POOL,))
+
+    by_bucket = defaultdict(list)
+    rejected = []
+    for tag, trophies, arena in cursor.fetchall():
+        if TAG_PATTERN.match(tag):
+            by_bucket[_bucket(trophies, arena)].append(tag)
+        else:
+            rejected.append((tag,))
+    if rejected:
+        cursor.executemany("UPDATE discovery_frontier SET status = 'rejected' WHERE player_tag = ?", rejected)
+
+    coverage = _coverage(cursor)
+    # (giocatori nella fascia, ordine di arrivo, fascia): i candidati sono già ordinati per times_seen
+    heap = [(coverage[bucket], i, bucket) for i, bucket in enumerate(by_bucket)]
+    heapq.heapify(heap)
+
+    selected = []
+    while heap and len(selected) < limit:
+        count, order, bucket = heapq.heappop(heap)
+        candidates = by_bucket[bucket]
+        selected.append(candidates.pop(0))
+        if candidates:
+            heapq.heappush(heap, (count + 1, order, bucket))
+    return selected
+
+def admit_players(cursor, budget: int = ADMIT_PER_SWEEP) -> list:
+    """Ammette in players i migliori candidati della frontiera, entro il budget. Restituisce i tag ammessi."""
+    cursor.execute("SELECT COUNT(*) FROM players WHERE last_updated IS NULL")
+    waiting = cursor.fetchone()[0]
+    limit = min(budget, MAX_NEW_PLAYERS_WAITING - waiting)
+    if limit <= 0:
+        return []
+
+    tags = select_candidates(cursor, limit)
+    current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    cursor.executemany("INSERT OR IGNORE INTO players (player_tag) VALUES (?)", [(tag,) for tag in tags])
+    cursor.executemany("UPDATE discovery_frontier SET status = 'admitted', admitted_at = ? WHERE player_tag = ?",
+                       [(current_time, tag) for tag in tags])
+    return tags
+
+def discover_players(conn, cursor, budget: int = ADMIT_PER_SWEEP) -> list:
+    """Aggiorna la frontiera e ammette nuovi giocatori in un'unica transazione."""
+    seen = update_frontier(cursor)
+    admitted = admit_players(cursor, budget)
+    conn.commit()
+
+    cursor.execute("SELECT COUNT(*) FROM discovery_frontier WHERE status = 'pending'")
+    logging.info(f"Discovery: {seen} avversari aggiornati in frontiera, {len(admitted)} nuovi giocatori ammessi "
+                 f"({cursor.fetchone()[0]} in attesa).")
+    return admitted
+
+def main(budget: int = ADMIT_PER_SWEEP):
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    migrate_db(DB_PATH)
+    conn, cursor, _ = open_connection(DB_PATH, profile="ingest")
+    if not conn:
+        logging.critical("Impossibile connettersi al database. Uscita.")
+        return
+
+    try:
+        discover_players(conn, cursor, budget)
+    finally:
+        close_connection(conn)
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:2]))
@@ -0,0 +1,99 @@
+"""
+Assegnazione dei giocatori a più worker tramite lease nel DB.
+
+Ogni worker (worker.py) prende in esclusiva un blocco di tag con una
+transazione BEGIN IMMEDIATE, così due worker non ricevono mai lo stesso tag.
+I lease scadono dopo LEASE_SECONDS se non rinnovati: i tag di un worker
+caduto tornano disponibili agli altri. Le scadenze usano l'orologio locale,
+quindi gli host che condividono il DB devono avere l'ora sincronizzata.
+"""
+import os
+import socket
+import logging
+from datetime import datetime, timedelta
+
+# Durata di un lease; il worker lo rinnova finché lavora sulla risorsa
+LEASE_SECONDS = 15 * 60
+
+def _time(offset_seconds: float = 0) -> str:
+    return (datetime.now() + timedelta(seconds=offset_seconds)).strftime('%Y-%m-%d %H:%M:%S')
+
+def new_worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+def register_worker(conn, worker_id: str):
+    """Registra (o riavvia) un worker nella tabella workers."""
+    current_time = _time()
+    conn.execute("""
+        INSERT INTO workers (worker_id, host, pid, started_at, last_heartbeat, status) VALUES (?, ?, ?, ?, ?, 'idle')
+        ON CONFLICT(worker_id) DO UPDATE SET started_at = excluded.started_at, last_heartbeat = excluded.last_heartbeat, status = 'idle'
+    """, (worker_id, socket.gethostname(), os.getpid(), current_time, current_time))
+    conn.commit()
+
+def claim(conn, worker_id: str, resources: list, limit: int, lease_seconds: int = LEASE_SECONDS) -> list:
+    """
+    Prende in lease fino a `limit` risorse libere tra quelle indicate, nell'ordine
+    dato (di priorità). I lease scaduti vengono prima liberati. Restituisce le risorse ottenute.
+    """
+    if conn.in_transaction:
+        conn.commit()
+    cursor = conn.cursor()
+    # Lock di scrittura subito: la lettura dei lease e l'inserimento sono atomici rispetto agli altri worker
+    cursor.execute("BEGIN IMMEDIATE")
+    try:
+        cursor.execute("DELETE FROM leases WHERE leased_until < ?", (_time(),))
+        if cursor.rowcount:
+            logging.warning(f"Recuperati {cursor.rowcount} lease scaduti di worker non più attivi.")
+
+        cursor.execute("SELECT resource FROM leases")
+        held = {row[0] for row in cursor.fetchall()}
+        claimed = [resource for resource in dict.fromkeys(resources) if resource not in held][:limit]
+
+        claimed_at, until = _time(), _time(lease_seconds)
+        cursor.executemany("INSERT INTO leases (resource, worker_id, leased_until, claimed_at) VALUES (?, ?, ?, ?)",
+                           [(resource, worker_id, until, claimed_at) for resource in claimed])
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return claimed
+
+def claim_job(conn, worker_id: str, name: str, lease_seconds: int = LEASE_SECONDS) -> bool:
+    """Prende in lease un lavoro che deve girare su un solo worker alla volta (es. 'matchups')."""
+    return bool(claim(conn, worker_id, [f"job:{name}"], 1, lease_seconds))
+
+def release_job(conn, worker_id: str, name: str):
+    release(conn, worker_id, [f"job:{name}"])
+
+def renew(conn, worker_id: str, lease_seconds: int = LEASE_SECONDS):
+    """Rinnova tutti i lease del worker (heartbeat)."""
+    conn.execute("UPDATE leases SET leased_until = ? WHERE worker_id = ?", (_time(lease_seconds), worker_id))
+    conn.execute("UPDATE workers SET last_heartbeat = ? WHERE worker_id = ?", (_time(), worker_id))
+    conn.commit()
+
+def release(conn, worker_id: str, resources: list | None = None):
+    """Rilascia le risorse indicate (o tutte quelle del worker)."""
+    if resources is None:
+        conn.execute("DELETE FROM leases WHERE worker_id = ?", (worker_id,))
+    else:
+        conn.executemany("DELETE FROM leases WHERE resource = ? AND worker_id = ?",
+                         [(resource, worker_id) for resource in resources])
+    conn.commit()
+
+def report_progress(conn, worker_id: str, status: str, players: int = 0, battle_pages: int = 0, errors: int = 0):
+    """Aggiorna stato e contatori del worker."""
+    conn.execute("""
+        UPDATE workers SET status = ?, last_heartbeat = ?, players_done = players_done + ?,
+                           battle_pages = battle_pages + ?, errors = errors + ?
+        WHERE worker_id = ?
+    """, (status, _time(), players, battle_pages, errors, worker_id))
+    conn.commit()
+
+def worker_status(cursor) -> list:
+    """Restituisce (worker_id, stato, ultimo heartbeat, giocatori, pagine, errori, lease attivi) per ogni worker."""
+    cursor.execute("""
+        SELECT w.worker_id, w.status, w.last_heartbeat, w.players_done, w.battle_pages, w.errors,
+               (SELECT COUNT(*) FROM leases l WHERE l.worker_id = w.worker_id)
+        FROM workers w ORDER BY w.last_heartbeat DESC
+    """)
+    return cursor.fetchall()
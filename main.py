@@ -1,41 +1,74 @@
 import logging
 from utils.connection import open_connection, close_connection
-from player_updater import update_player_profile
-from battle_updater import fetch_all_battles
+from scrape_engine import sweep, MAX_CONCURRENT_TAGS
+from matchup_worker import drain_pending_matchups
+from db.migrate import migrate_db
+from scheduler import plan_sweep, SWEEP_INTERVAL
+from archive import configure_archive
+from db_manager import warm_deck_cache
+from card_registry import load_card_registry
+from discovery import discover_players
+import metrics
 import time
 
 DB_PATH = "db/clash.db"
+# Salva una copia compressa delle pagine battaglie scaricate (vedi archive.py e reparse.py)
+ARCHIVE_PAGES = False
+# Ammette nuovi giocatori dagli avversari incontrati (vedi discovery.py)
+DISCOVER_PLAYERS = True
+
+_deck_cache_warm = False
 
 def main():
     """
     Ciclo principale che inizializza la connessione al DB,
-    carica i tag dei giocatori e avvia il processo di aggiornamento
-    per profili e battaglie.
+    sceglie i giocatori da aggiornare (vedi scheduler.plan_sweep) e avvia
+    il processo di aggiornamento concorrente per profili e battaglie.
     """
     logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-    conn, cursor, load_tags = open_connection(DB_PATH)
+    # Porta lo schema all'ultima versione prima di iniziare (nessuna operazione se già aggiornato)
+    migrate_db(DB_PATH)
+    configure_archive(ARCHIVE_PAGES)
+
+    conn, cursor, _ = open_connection(DB_PATH, profile="ingest")
     if not conn:
         logging.critical("Impossibile connettersi al database. Uscita.")
         return
 
-    tags = load_tags()
-    
+    global _deck_cache_warm
+    if not _deck_cache_warm:
+        # Una sola volta per processo: i mazzi noti non passano più dal DB
+        load_card_registry(cursor)
+        logging.info(f"Cache mazzi caricata: {warm_deck_cache(cursor)} mazzi.")
+        _deck_cache_warm = True
+
+    # Solo i giocatori con battaglie nuove probabili, entro il budget di richieste
+    tags = plan_sweep(cursor)
+    sweep_start = time.time()
+    before = metrics.snapshot()
+
     if not tags:
-        logging.warning("Nessun tag giocatore trovato nel database.")
+        logging.info("Nessun giocatore da aggiornare in questo giro.")
     else:
-        for i, tag in enumerate(tags):
-            progress_percent = (i / len(tags)) * 100
-            active_elements = round(progress_percent / 10)
-            progress_bar = '#' * active_elements + '-' * (10 - active_elements)
-            print(f"{'-'*30} Passaggio {i+1}/{len(tags)} - [{progress_bar}] {tag} {'-'*30}")
+        # I tag vengono aggiornati in parallelo, ognuno con la propria connessione
+        sweep(tags, DB_PATH, MAX_CONCURRENT_TAGS)
+
+        # Calcolo in blocco dei matchup delle battaglie appena inserite
+        drain_pending_matchups(conn, cursor)
 
-            update_player_profile(tag, conn, cursor)
-            fetch_all_battles(tag, conn, cursor)
+    if DISCOVER_PLAYERS:
+        # I nuovi giocatori verranno aggiornati per primi dal prossimo giro
+        discover_players(conn, cursor)
 
     close_connection(conn)
+
+    # Metriche cumulative per Prometheus e riepilogo di questo sweep
+    metrics.write_prometheus()
+    summary_path = metrics.write_sweep_summary(before, {"players": len(tags), "duration_seconds": round(time.time() - sweep_start, 1)})
+    logging.info(f"Metriche dello sweep salvate in {summary_path}")
     logging.info("Processo di fetching completato.")
-    time.sleep(20 * 60)
+    time.sleep(SWEEP_INTERVAL)
 
 
 if __name__ == "__main__":
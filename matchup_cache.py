@@ -0,0 +1,117 @@
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from api_client import fetch_matchup
+import metrics
+
+# Numero massimo di matchup tenuti in memoria (LRU) davanti alla tabella matchup_cache
+LRU_SIZE = 50_000
+
+_lru = OrderedDict()
+_lru_lock = threading.Lock()
+
+def _lru_get(key: tuple):
+    with _lru_lock:
+        if key not in _lru:
+            return None
+        _lru.move_to_end(key)
+        return _lru[key]
+
+def _lru_put(key: tuple, win_rate: float):
+    with _lru_lock:
+        _lru[key] = win_rate
+        _lru.move_to_end(key)
+        if len(_lru) > LRU_SIZE:
+            _lru.popitem(last=False)
+
+def lookup_matchup(cursor, cache_key: tuple) -> float | None:
+    """Cerca un matchup prima nella LRU e poi nella tabella persistente."""
+    win_rate = _lru_get(cache_key)
+    if win_rate is not None:
+        metrics.inc("matchup_cache_total", result="lru")
+        return win_rate
+
+    cursor.execute(
+        "SELECT win_rate FROM matchup_cache WHERE player_key = ? AND opponent_key = ? AND equal_levels = ?",
+        cache_key
+    )
+    row = cursor.fetchone()
+    if row and row[0] is not None:
+        metrics.inc("matchup_cache_total", result="db")
+        _lru_put(cache_key, row[0])
+        return row[0]
+    metrics.inc("matchup_cache_total", result="miss")
+    return None
+
+@metrics.timed("db_write_seconds", function="store_matchup")
+def store_matchup(cursor, cache_key: tuple, win_rate: float):
+    """Salva un matchup nella tabella persistente e nella LRU."""
+    current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    cursor.execute(
+        "INSERT OR REPLACE INTO matchup_cache (player_key, opponent_key, equal_levels, win_rate, fetched_at) VALUES (?, ?, ?, ?, ?)",
+        (*cache_key, win_rate, current_time)
+    )
+    _lru_put(cache_key, win_rate)
+
+def _fetch_and_store(cursor, player_deck: list, opponent_deck: list, cache_key: tuple) -> float | None:
+    """Chiama deckai.app e salva il risultato in cache."""
+    matchup_data = fetch_matchup(player_deck, opponent_deck, force_equal_levels=bool(cache_key[2]))
+    if not matchup_data or matchup_data.get("winRate") is None:
+        return None
+
+    win_rate = matchup_data["winRate"]
+    store_matchup(cursor, cache_key, win_rate)
+    return win_rate
+
+def load_deck_cards(cursor, deck_id: int) -> list:
+    cursor.execute("SELECT card_name, card_level, has_evolution, has_hero FROM deck_cards WHERE deck_id = ?", (deck_id,))
+    return [
+        {"name": name, "level": level, "has_evolution": has_evo, "has_hero": has_hero}
+        for name, level, has_evo, has_hero in cursor.fetchall()
+    ]
+
+def is_complete_deck(cards: list) -> bool:
+    """Solo mazzi completi (8 carte + torre) sono valutabili da deckai.app."""
+    return len(cards) == 9
+
+def get_deck_keys(cursor, deck_ids: list) -> dict:
+    """Mappa deck_id -> (deck_hash, archetype_hash) per i mazzi indicati."""
+    if not deck_ids:
+        return {}
+    placeholders = ','.join(['?'] * len(deck_ids))
+    cursor.execute(f"SELECT deck_id, deck_hash, archetype_hash FROM decks WHERE deck_id IN ({placeholders})", list(deck_ids))
+    return {deck_id: (deck_hash, archetype_hash) for deck_id, deck_hash, archetype_hash in cursor.fetchall()}
+
+def matchup_cache_key(deck_keys: dict, player_deck_id: int, opponent_deck_id: int, force_equal_levels: bool = False) -> tuple | None:
+    """
+    Chiave di cache del matchup tra due mazzi salvati (deck_keys da get_deck_keys).
+    La cache usa gli hash, che non dipendono dal DB: deck_hash con livelli,
+    archetype_hash senza. None se uno dei due mazzi non ha la chiave.
+    """
+    if player_deck_id not in deck_keys or opponent_deck_id not in deck_keys:
+        return None
+    key_index = 1 if force_equal_levels else 0
+    cache_key = (deck_keys[player_deck_id][key_index], deck_keys[opponent_deck_id][key_index], key_index)
+    return None if None in cache_key[:2] else cache_key
+
+def get_matchup_for_decks(cursor, player_deck_id: int, opponent_deck_id: int, force_equal_levels: bool = False) -> float | None:
+    """
+    Restituisce il win rate del matchup tra due mazzi già salvati nel DB usando la
+    cache (LRU + tabella matchup_cache) e chiama deckai.app solo per le coppie mai valutate.
+    Le carte vengono lette solo se il matchup non è in cache.
+    """
+    deck_keys = get_deck_keys(cursor, [player_deck_id, opponent_deck_id])
+    cache_key = matchup_cache_key(deck_keys, player_deck_id, opponent_deck_id, force_equal_levels)
+    if cache_key is None:
+        return None
+
+    win_rate = lookup_matchup(cursor, cache_key)
+    if win_rate is not None:
+        return win_rate
+
+    player_cards = load_deck_cards(cursor, player_deck_id)
+    opponent_cards = load_deck_cards(cursor, opponent_deck_id)
+    if not is_complete_deck(player_cards) or not is_complete_deck(opponent_cards):
+        return None
+
+    return _fetch_and_store(cursor, player_cards, opponent_cards, cache_key)
@@ -0,0 +1,174 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from api_client import fetch_matchup
+from matchup_cache import lookup_matchup, store_matchup, load_deck_cards, get_deck_keys, matchup_cache_key, is_complete_deck
+from utils.connection import open_connection, close_connection
+
+DB_PATH = "db/clash.db"
+
+# Richieste contemporanee verso deckai.app (il limite per host resta quello di api_client)
+MATCHUP_WORKERS = 8
+# Coppie di mazzi risolte e salvate per ogni blocco
+BATCH_SIZE = 200
+# Tentativi falliti dopo i quali una coppia non viene più ritentata
+MAX_ATTEMPTS = 5
+# Attesa prima di ritentare una coppia fallita, raddoppiata a ogni tentativo (minuti)
+RETRY_MINUTES = 30
+
+def get_pending_pairs(cursor) -> list:
+    """
+    Restituisce le coppie (mazzo giocatore, mazzo avversario) distinte che hanno
+    almeno una battaglia senza matchup, con i flag dei valori mancanti. Sono escluse
+    le coppie non valutabili, quelle fallite MAX_ATTEMPTS volte e quelle ancora in attesa
+    di essere ritentate (vedi matchup_attempts).
+    """
+    cursor.execute("""
+        SELECT p.player_deck_id, p.opponent_deck_id, p.needs_lvl, p.needs_no_lvl
+        FROM (
+            SELECT player_deck_id, opponent_deck_id,
+                   MAX(matchup_win_rate IS NULL) AS needs_lvl, MAX(matchup_no_lvl IS NULL) AS needs_no_lvl
+            FROM battles
+            WHERE player_deck_id IS NOT NULL
+              AND opponent_deck_id IS NOT NULL
+              AND (matchup_win_rate IS NULL OR matchup_no_lvl IS NULL)
+            GROUP BY player_deck_id, opponent_deck_id
+        ) p
+        LEFT JOIN matchup_attempts a
+               ON a.player_deck_id = p.player_deck_id AND a.opponent_deck_id = p.opponent_deck_id
+        WHERE a.player_deck_id IS NULL
+           OR (a.unevaluable = 0 AND a.attempts < ? AND a.next_try <= ?)
+    """, (MAX_ATTEMPTS, datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+    return cursor.fetchall()
+
+def _record_attempts(cursor, resolved: list, failed: list, unevaluable: list):
+    """
+    Aggiorna matchup_attempts: le coppie risolte vengono rimosse, quelle non
+    valutabili marcate per sempre, quelle fallite rimandate con attesa esponenziale.
+    """
+    now = datetime.now()
+    current_time = now.strftime('%Y-%m-%d %H:%M:%S')
+    next_try = (now + timedelta(minutes=RETRY_MINUTES)).strftime('%Y-%m-%d %H:%M:%S')
+
+    cursor.executemany("DELETE FROM matchup_attempts WHERE player_deck_id = ? AND opponent_deck_id = ?", resolved)
+    cursor.executemany("""
+        INSERT INTO matchup_attempts (player_deck_id, opponent_deck_id, attempts, last_tried, unevaluable)
+        VALUES (?, ?, 1, ?, 1)
+        ON CONFLICT(player_deck_id, opponent_deck_id) DO UPDATE SET
+            attempts = matchup_attempts.attempts + 1, last_tried = excluded.last_tried, unevaluable = 1
+    """, [(p_id, o_id, current_time) for p_id, o_id in unevaluable])
+    cursor.executemany("""
+        INSERT INTO matchup_attempts (player_deck_id, opponent_deck_id, attempts, last_tried, next_try)
+        VALUES (?, ?, 1, ?, ?)
+        ON CONFLICT(player_deck_id, opponent_deck_id) DO UPDATE SET
+            attempts = matchup_attempts.attempts + 1, last_tried = excluded.last_tried,
+            next_try = datetime(excluded.last_tried, '+' || (? << matchup_attempts.attempts) || ' minutes')
+    """, [(p_id, o_id, current_time, next_try, RETRY_MINUTES) for p_id, o_id in failed])
+    if unevaluable or failed:
+        logging.info(f"Matchup: {len(unevaluable)} coppie non valutabili, {len(failed)} fallite da ritentare.")
+
+def _resolve_batch(cursor, pairs: list, executor) -> int:
+    """
+    Risolve un blocco di coppie: prima dalla cache, poi con chiamate concorrenti
+    a deckai.app (una sola per chiave di cache), e aggiorna le battaglie in blocco.
+    """
+    # Le chiavi di cache sono gli hash dei mazzi: (deck_hash, deck_hash) con livelli,
+    # (archetype_hash, archetype_hash) senza livelli
+    deck_keys = get_deck_keys(cursor, list({deck_id for pair in pairs for deck_id in pair[:2]}))
+
+    results = {}    # cache_key -> win_rate
+    to_fetch = {}   # cache_key -> (deck giocatore, deck avversario)
+    pair_keys = []  # (deck giocatore, deck avversario, chiave con livelli, chiave senza livelli)
+    unevaluable = set()
+
+    for p_id, o_id, needs_lvl, needs_no_lvl in pairs:
+        lvl_key = matchup_cache_key(deck_keys, p_id, o_id) if needs_lvl else None
+        no_lvl_key = matchup_cache_key(deck_keys, p_id, o_id, force_equal_levels=True) if needs_no_lvl else None
+        if (needs_lvl and lvl_key is None) or (needs_no_lvl and no_lvl_key is None):
+            unevaluable.add((p_id, o_id))
+        pair_keys.append((p_id, o_id, lvl_key, no_lvl_key))
+
+        for key in (lvl_key, no_lvl_key):
+            if not key or key in results or key in to_fetch:
+                continue
+            win_rate = lookup_matchup(cursor, key)
+            if win_rate is not None:
+                results[key] = win_rate
+            else:
+                to_fetch[key] = (p_id, o_id)
+
+    cards = {}
+    jobs = {}
+    incomplete_keys = set()
+    for key, (p_id, o_id) in to_fetch.items():
+        for deck_id in (p_id, o_id):
+            if deck_id not in cards:
+                cards[deck_id] = load_deck_cards(cursor, deck_id)
+        if not is_complete_deck(cards[p_id]) or not is_complete_deck(cards[o_id]):
+            incomplete_keys.add(key)
+            continue
+        jobs[key] = executor.submit(fetch_matchup, cards[p_id], cards[o_id], bool(key[2]))
+
+    for key, job in jobs.items():
+        matchup_data = job.result()
+        if matchup_data and matchup_data.get("winRate") is not None:
+            results[key] = matchup_data["winRate"]
+            store_matchup(cursor, key, results[key])
+
+    updates = []
+    resolved, failed = [], []
+    for p_id, o_id, lvl_key, no_lvl_key in pair_keys:
+        win_rate = results.get(lvl_key)
+        no_lvl = results.get(no_lvl_key)
+        if win_rate is not None or no_lvl is not None:
+            updates.append((win_rate, no_lvl, p_id, o_id))
+
+        keys = [key for key in (lvl_key, no_lvl_key) if key]
+        if any(key in incomplete_keys for key in keys):
+            unevaluable.add((p_id, o_id))
+        elif (p_id, o_id) not in unevaluable:
+            (resolved if all(key in results for key in keys) else failed).append((p_id, o_id))
+
+    cursor.executemany("""
+        UPDATE battles
+        SET matchup_win_rate = COALESCE(matchup_win_rate, ?),
+            matchup_no_lvl = COALESCE(matchup_no_lvl, ?)
+        WHERE player_deck_id = ? AND opponent_deck_id = ?
+    """, updates)
+    _record_attempts(cursor, resolved, failed, list(unevaluable))
+    return len(updates)
+
+def drain_pending_matchups(conn, cursor, max_workers: int = MATCHUP_WORKERS) -> int:
+    """
+    Calcola i matchup mancanti di tutte le battaglie già inserite.
+    Le coppie che falliscono restano NULL e vengono ritentate ai giri successivi,
+    con attesa crescente e al massimo MAX_ATTEMPTS volte.
+    """
+    pairs = get_pending_pairs(cursor)
+    if not pairs:
+        return 0
+
+    logging.info(f"Matchup da calcolare: {len(pairs)} coppie di mazzi distinte.")
+    updated = 0
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="matchup") as executor:
+        for i in range(0, len(pairs), BATCH_SIZE):
+            updated += _resolve_batch(cursor, pairs[i:i + BATCH_SIZE], executor)
+            conn.commit()
+            logging.info(f"Matchup: {min(i + BATCH_SIZE, len(pairs))}/{len(pairs)} coppie processate.")
+
+    logging.info(f"Matchup aggiornati per {updated} coppie di mazzi su {len(pairs)}.")
+    return updated
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    conn, cursor, _ = open_connection(DB_PATH, profile="ingest")
+    if not conn:
+        logging.critical("Impossibile connettersi al database. Uscita.")
+        return
+
+    drain_pending_matchups(conn, cursor)
+    close_connection(conn)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+Metriche di processo: contatori e istogrammi in memoria, con export in
+formato textfile di Prometheus (per il textfile collector di node_exporter)
+e un riepilogo JSON per ogni sweep.
+
+Le metriche sono per processo: quelle registrate nei processi di parsing
+della pipeline (pipeline.py) non vengono raccolte.
+"""
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+
+METRICS_DIR = "./db/metrics"
+PROMETHEUS_FILE = "tesi.prom"
+METRIC_PREFIX = "tesi_"
+
+# Limiti superiori (secondi) dei bucket degli istogrammi di durata
+TIME_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Bucket per i conteggi (es. pagine scaricate per giocatore)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+_lock = threading.Lock()
+_counters = {}    # (nome, etichette) -> valore
+_gauges = {}      # (nome, etichette) -> ultimo valore
+_histograms = {}  # (nome, etichette) -> {"buckets": limiti, "counts": [...], "sum": s, "count": n}
+
+def _key(name: str, labels: dict) -> tuple:
+    return name, tuple(sorted(labels.items()))
+
+def inc(name: str, value: float = 1, **labels):
+    """Incrementa un contatore."""
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+def set_gauge(name: str, value: float, **labels):
+    """Imposta il valore corrente di una metrica (es. il ritmo del rate limiter)."""
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+def observe(name: str, value: float, buckets: tuple = TIME_BUCKETS, **labels):
+    """Registra un valore in un istogramma (i bucket sono fissati alla prima osservazione)."""
+    key = _key(name, labels)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = {"buckets": buckets, "counts": [0] * len(buckets), "sum": 0.0, "count": 0}
+            _histograms[key] = histogram
+        for i, bound in enumerate(histogram["buckets"]):
+            if value <= bound:
+                histogram["counts"][i] += 1
+                break
+        histogram["sum"] += value
+        histogram["count"] += 1
+
+@contextmanager
+def timer(name: str, **labels):
+    """
+    Misura la durata del blocco nell'istogramma indicato e somma il tempo CPU
+    del thread nel contatore cpu_seconds_total{stage=name}.
+    """
+    start, cpu_start = time.perf_counter(), time.thread_time()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, **labels)
+        inc("cpu_seconds_total", time.thread_time() - cpu_start, stage=name, **labels)
+
+def timed(name: str, **labels):
+    """
+    Decoratore: misura la durata di ogni chiamata della funzione.
+    Le etichette con valore chiamabile vengono valutate a ogni chiamata
+    (es. il backend di parsing, che può cambiare dopo l'import).
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with timer(name, **{k: v() if callable(v) else v for k, v in labels.items()}):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def snapshot() -> dict:
+    """Copia dello stato attuale, da passare a sweep_summary per ottenere le differenze."""
+    with _lock:
+        return {
+            "counters": dict(_counters),
+            "gauges": dict(_gauges),
+            "histograms": {k: {**h, "counts": list(h["counts"])} for k, h in _histograms.items()},
+        }
+
+def _labels_text(labels: tuple, extra: tuple = ()) -> str:
+    pairs = [f'{k}="{v}"' for k, v in labels + extra]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _label_name(name: str, labels: tuple) -> str:
+    return name + "".join(f"[{k}={v}]" for k, v in labels)
+
+def write_prometheus(path: str | None = None):
+    """Scrive tutte le metriche in formato textfile di Prometheus (sostituzione atomica del file)."""
+    state = snapshot()
+    path = path or os.path.join(METRICS_DIR, PROMETHEUS_FILE)
+    lines = []
+
+    for name in sorted({name for name, _ in state["counters"]}):
+        lines.append(f"# TYPE {METRIC_PREFIX}{name} counter")
+        for (n, labels), value in sorted(state["counters"].items()):
+            if n == name:
+                lines.append(f"{METRIC_PREFIX}{name}{_labels_text(labels)} {value}")
+
+    for name in sorted({name for name, _ in state["gauges"]}):
+        lines.append(f"# TYPE {METRIC_PREFIX}{name} gauge")
+        for (n, labels), value in sorted(state["gauges"].items()):
+            if n == name:
+                lines.append(f"{METRIC_PREFIX}{name}{_labels_text(labels)} {value}")
+
+    for name in sorted({name for name, _ in state["histograms"]}):
+        lines.append(f"# TYPE {METRIC_PREFIX}{name} histogram")
+        for (n, labels), h in sorted(state["histograms"].items()):
+            if n != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(h["buckets"], h["counts"]):
+                cumulative += count
+                lines.append(f"{METRIC_PREFIX}{name}_bucket{_labels_text(labels, (('le', bound),))} {cumulative}")
+            lines.append(f"{METRIC_PREFIX}{name}_bucket{_labels_text(labels, (('le', '+Inf'),))} {h['count']}")
+            lines.append(f"{METRIC_PREFIX}{name}_sum{_labels_text(labels)} {h['sum']}")
+            lines.append(f"{METRIC_PREFIX}{name}_count{_labels_text(labels)} {h['count']}")
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write("\n".join(lines) + "\n")
+    os.replace(tmp_path, path)
+
+def sweep_summary(since: dict | None = None) -> dict:
+    """Riepilogo delle metriche (o della loro variazione da uno snapshot): contatori, valori correnti e durate medie/totali."""
+    state = snapshot()
+    since = since or {"counters": {}, "histograms": {}}
+
+    counters = {}
+    for key, value in state["counters"].items():
+        delta = value - since["counters"].get(key, 0)
+        if delta:
+            counters[_label_name(*key)] = delta
+
+    histograms = {}
+    for key, h in state["histograms"].items():
+        before = since["histograms"].get(key, {"sum": 0.0, "count": 0})
+        count = h["count"] - before["count"]
+        if count:
+            total = h["sum"] - before["sum"]
+            histograms[_label_name(*key)] = {"count": count, "sum": round(total, 6), "avg": round(total / count, 6)}
+
+    gauges = {_label_name(*key): value for key, value in state["gauges"].items()}
+    return {"counters": counters, "gauges": gauges, "histograms": histograms}
+
+def write_sweep_summary(since: dict | None = None, extra: dict | None = None) -> str:
+    """Salva il riepilogo JSON di uno sweep in METRICS_DIR/sweeps e ne restituisce il percorso."""
+    summary = {"finished_at": datetime.now().strftime('%Y-%m-%d %H:%M:%S'), **(extra or {}), **sweep_summary(since)}
+    folder = os.path.join(METRICS_DIR, "sweeps")
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, f"sweep_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    with open(path, "w") as f:
+        json.dump(summary, f, indent=2)
+    return path
@@ -1,7 +1,53 @@
-from bs4 import BeautifulSoup
+import sys
+from bs4 import BeautifulSoup, FeatureNotFound, NavigableString
 from utils.tools import parse_duration_to_seconds
 import logging
+import metrics
+
+try:
+    import lxml  # noqa: F401
+    HAS_LXML = True
+except ImportError:
+    HAS_LXML = False
+
+# Tree builder usato da BeautifulSoup per tutte le pagine lette con make_soup
+# (profilo, carte, mazzi e battaglie con il backend "bs4"): "html.parser" o "lxml"
+HTML_PARSER = "html.parser"
+# Backend per le pagine battaglie: "bs4" o "lxml" (XPath nativo, vedi parsers_lxml).
+# lxml è opzionale (set_parser_backend): diventerà il default solo quando
+# tests/test_parser_parity.py passerà anche su pagine reali dell'archivio.
+BATTLE_PARSER = "bs4"
+
+def set_parser_backend(html_parser: str | None = None, battle_parser: str | None = None):
+    """Seleziona il tree builder di BeautifulSoup e il backend delle pagine battaglie."""
+    global HTML_PARSER, BATTLE_PARSER
+    if (html_parser == "lxml" or battle_parser == "lxml") and not HAS_LXML:
+        raise FeatureNotFound("Il backend 'lxml' richiede il pacchetto lxml.")
+    if html_parser is not None:
+        HTML_PARSER = html_parser
+    if battle_parser is not None:
+        BATTLE_PARSER = battle_parser
+
+def soup_backend() -> str:
+    """Etichetta del backend BeautifulSoup per le metriche, con il tree builder in uso."""
+    return f"bs4-{HTML_PARSER}"
+
+def make_soup(html: str) -> BeautifulSoup:
+    """Costruisce il BeautifulSoup di una pagina con il tree builder configurato."""
+    return BeautifulSoup(html, HTML_PARSER)
+
+def get_battle_parser():
+    """
+    Restituisce il modulo che implementa il parsing delle pagine battaglie
+    (load_document, select_battles, parse_battle_data, parse_deck_from_battle,
+    parse_oldest_timestamp_from_page): parsers_lxml oppure questo modulo.
+    """
+    if BATTLE_PARSER == "lxml":
+        import parsers_lxml
+        return parsers_lxml
+    return sys.modules[__name__]
 
+@metrics.timed("parse_seconds", function="parse_player_data", backend=soup_backend)
 def parse_player_data(soup: BeautifulSoup) -> tuple | None:
     """Estrae le statistiche principali del giocatore dalla pagina del profilo."""
     try:
@@ -130,6 +176,7 @@ def parse_player_data(soup: BeautifulSoup) -> tuple | None:
         print(f"Errore durante il parsing dei dati del giocatore: {e}")
         return None
 
+@metrics.timed("parse_seconds", function="parse_player_cards", backend=soup_backend)
 def parse_player_cards(soup: BeautifulSoup) -> list:
     """Estrae i dati delle carte dalla pagina delle carte di un giocatore."""
     player_cards = []
@@ -152,6 +199,7 @@ def parse_player_cards(soup: BeautifulSoup) -> list:
         })
     return player_cards
 
+@metrics.timed("parse_seconds", function="parse_towers_and_heroes", backend=soup_backend)
 def parse_towers_and_heroes(soup: BeautifulSoup) -> tuple[list, list]:
     """Estrae i dati di torri ed eroi dalla pagina del profilo."""
     towers = []
@@ -175,6 +223,7 @@ def parse_towers_and_heroes(soup: BeautifulSoup) -> tuple[list, list]:
 
     return towers, heroes
 
+@metrics.timed("parse_seconds", function="parse_evolutions", backend=soup_backend)
 def parse_evolutions(soup: BeautifulSoup) -> list:
     """Estrae i dati delle evoluzioni sbloccate dalla pagina del profilo."""
     evolutions = []
@@ -191,6 +240,13 @@ def parse_evolutions(soup: BeautifulSoup) -> list:
 
     return evolutions
 
+@metrics.timed("parse_seconds", function="load_document", backend=soup_backend)
+def load_document(html: str) -> BeautifulSoup:
+    return make_soup(html)
+
+def select_battles(soup: BeautifulSoup) -> list:
+    return soup.select("div.battle")
+
 def parse_oldest_timestamp_from_page(soup: BeautifulSoup) -> int | None:
     """Estrae il timestamp della battaglia più vecchia presente nella pagina."""
     battles = soup.select("div.battle")
@@ -198,8 +254,11 @@ def parse_oldest_timestamp_from_page(soup: BeautifulSoup) -> int | None:
         return None
     return int(float(battles[-1]["data-timestamp"]))
 
-def parse_battle_data(div: BeautifulSoup, player_tag: str) -> dict:
-    """Estrae i dati di una singola battaglia da un div."""
+def parse_battle_data(div: BeautifulSoup, player_tag: str, segments: list | None = None) -> dict:
+    """
+    Estrae i dati di una singola battaglia da un div.
+    `segments` (i .team-segment del div) può essere passato per evitare di cercarli di nuovo.
+    """
     battle_id = div["id"].replace("battle_", "")
     timestamp = int(float(div["data-timestamp"]))
     battle_type = div.get("data-battle-type")
@@ -220,7 +279,9 @@ def parse_battle_data(div: BeautifulSoup, player_tag: str) -> dict:
     trophy_change = None
     labels = div.select(".trophy_container .ui.basic.label")
     if labels:
-        tc_text = labels[0].contents[0].strip().replace("+", "")
+        # Solo il testo prima del primo elemento figlio o commento (come .text di lxml)
+        first = labels[0].contents[0] if labels[0].contents else None
+        tc_text = first.strip().replace("+", "") if type(first) is NavigableString else ""
         try:
             trophy_change = int(tc_text)
         except ValueError:
@@ -232,7 +293,7 @@ def parse_battle_data(div: BeautifulSoup, player_tag: str) -> dict:
     if win == 0 and trophy_change is not None and trophy_change > 0:
         trophy_change = 0
 
-    opponent_link = div.select_one(".team-segment:last-child a.player_name_header")
+    opponent_link = _find_opponent_link(div, segments)
     opponent_tag = None
     if opponent_link and '/player/' in opponent_link.get("href", ""):
         opponent_tag = opponent_link["href"].split("/player/")[-1].split('/')[0]
@@ -269,13 +330,28 @@ def parse_battle_data(div: BeautifulSoup, player_tag: str) -> dict:
         "elixir_leaked_opponent": elixir_leaked_opponent, "level_diff": level_diff
     }
 
-def parse_deck_from_battle(div: BeautifulSoup, is_opponent: bool = False) -> list | None:
+def _find_opponent_link(div: BeautifulSoup, segments: list | None):
+    """Equivalente di div.select_one(".team-segment:last-child a.player_name_header")."""
+    if segments is None:
+        return div.select_one(".team-segment:last-child a.player_name_header")
+    for segment in segments:
+        if segment.find_next_sibling() is None:
+            link = segment.select_one("a.player_name_header")
+            if link:
+                return link
+    return None
+
+def parse_deck_from_battle(div: BeautifulSoup, is_opponent: bool = False, segments: list | None = None) -> list | None:
     """Estrae le carte di un mazzo da un div di battaglia."""
-    segments = div.select(".team-segment")
+    if segments is None:
+        segments = div.select(".team-segment")
     if not segments:
         return None
     
-    segment = segments[-1] if is_opponent else segments[0]
+    return _parse_deck_segment(segments[-1] if is_opponent else segments[0])
+
+def _parse_deck_segment(segment: BeautifulSoup) -> list | None:
+    """Estrae le carte (8 + torre) da un singolo .team-segment."""
     parsed_cards = []
 
     # Parsing delle 8 carte del mazzo
@@ -317,6 +393,35 @@ def parse_deck_from_battle(div: BeautifulSoup, is_opponent: bool = False) -> lis
 
     return parsed_cards if parsed_cards else None
 
+@metrics.timed("parse_seconds", function="parse_battles_page", backend=soup_backend)
+def parse_battles_page(soup: BeautifulSoup, player_tag: str, stop_ts: int | None = None) -> tuple[list, int | None, bool]:
+    """
+    Estrae in un solo passaggio le battaglie di una pagina: per ogni div.battle
+    i .team-segment vengono cercati una volta sola e riusati per avversario e mazzi.
+    Si ferma alla prima battaglia con timestamp <= stop_ts (già presente nel DB).
+
+    Returns:
+        (lista di (battle, mazzo giocatore, mazzo avversario), timestamp più vecchio della pagina, stop)
+    """
+    battles = select_battles(soup)
+    if not battles:
+        return [], None, False
+
+    oldest_ts = int(float(battles[-1]["data-timestamp"]))
+    records = []
+    for div in battles:
+        if stop_ts and int(float(div["data-timestamp"])) <= stop_ts:
+            return records, oldest_ts, True
+
+        segments = div.select(".team-segment")
+        battle = parse_battle_data(div, player_tag, segments)
+        player_deck = _parse_deck_segment(segments[0]) if segments else None
+        opponent_deck = _parse_deck_segment(segments[-1]) if segments and battle["opponent_tag"] else None
+        records.append((battle, player_deck, opponent_deck))
+
+    return records, oldest_ts, False
+
+@metrics.timed("parse_seconds", function="parse_all_deck_stats_from_page", backend=soup_backend)
 def parse_all_deck_stats_from_page(soup: BeautifulSoup) -> dict[str, dict]:
     """
     Estrae le statistiche per tutti i mazzi presenti nella pagina /decks di un giocatore.
@@ -328,7 +433,7 @@ def parse_all_deck_stats_from_page(soup: BeautifulSoup) -> dict[str, dict]:
         Un dizionario dove la chiave è l'archetype_hash del mazzo e il valore
         è un dizionario con le sue statistiche (battles, wins).
     """
-    from db_manager import _generate_deck_hashes # Importazione locale per evitare dipendenza circolare
+    from db_manager import get_archetype_hash # Importazione locale per evitare dipendenza circolare
     
     all_deck_stats = {}
     deck_segments = soup.select("div.deck_segment")
@@ -349,7 +454,7 @@ def parse_all_deck_stats_from_page(soup: BeautifulSoup) -> dict[str, dict]:
             if not cards_for_hash:
                 continue
 
-            _, archetype_hash = _generate_deck_hashes(cards_for_hash)
+            archetype_hash = get_archetype_hash(cards_for_hash)
 
             # 2. Estrai le statistiche di gioco
             player_stats_row = segment.find('td', string='Player')
@@ -0,0 +1,207 @@
+"""
+Backend lxml per il parsing delle pagine battaglie.
+
+Replica parse_battle_data, parse_deck_from_battle, parse_battles_page e
+parse_oldest_timestamp_from_page di parsers.py lavorando direttamente
+sull'albero lxml con XPath, senza passare da BeautifulSoup e dai selettori
+CSS di soupsieve. I dizionari restituiti sono identici.
+"""
+import lxml.html
+from lxml import etree
+import metrics
+
+def _cls(name: str) -> str:
+    """Predicato XPath equivalente al selettore CSS `.name`."""
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+def _text(el, strip: bool = True) -> str:
+    """Equivalente di Tag.get_text(strip=...) di BeautifulSoup."""
+    if strip:
+        return "".join(t.strip() for t in el.itertext() if t.strip())
+    return "".join(el.itertext())
+
+def _first(el, xpath: str):
+    found = el.xpath(xpath)
+    return found[0] if found else None
+
+_BATTLES = f"//div[{_cls('battle')}]"
+_GAME_MODE = f".//*[{_cls('game_mode_header')}]"
+_RIBBON = f".//*[{_cls('win_loss')}]//*[{_cls('label')}]"
+_RESULT = f".//*[{_cls('result_header')}]"
+_TROPHY_LABELS = f".//*[{_cls('trophy_container')}]//*[{_cls('ui')} and {_cls('basic')} and {_cls('label')}]"
+_OPPONENT_LINK = f".//*[{_cls('team-segment')}][not(following-sibling::*)]//a[{_cls('player_name_header')}]"
+_SEGMENT_LINK = f".//a[{_cls('player_name_header')}]"
+_STAT_ITEMS = f".//*[{_cls('battle_stats')}]//*[{_cls('stats')}]//*[{_cls('item')}]"
+_STAT_NAME = f".//*[{_cls('name')}]"
+_STAT_VALUE = f".//*[{_cls('value')}]"
+_LEVEL_DIFF = f".//*[{_cls('battle_level_diff')}]"
+_SEGMENTS = f".//*[{_cls('team-segment')}]"
+_DECK_CARDS = f".//*[{_cls('deck_card__four_wide')}]"
+_CARD_IMG = f".//img[{_cls('deck_card')}]"
+_CARD_LEVEL = f".//*[{_cls('card-level')}]"
+_TOWER = f".//*[{_cls('deck_tower_card__container')}]"
+_TOWER_LEVEL_DIVS = f".//*[{_cls('level')}]//div"
+
+@metrics.timed("parse_seconds", function="load_document", backend="lxml")
+def load_document(html: str):
+    """Costruisce l'albero lxml della pagina."""
+    return lxml.html.document_fromstring(html)
+
+def select_battles(doc) -> list:
+    return doc.xpath(_BATTLES)
+
+def parse_oldest_timestamp_from_page(doc) -> int | None:
+    """Estrae il timestamp della battaglia più vecchia presente nella pagina."""
+    battles = select_battles(doc)
+    if not battles:
+        return None
+    return int(float(battles[-1].get("data-timestamp")))
+
+def _find_opponent_link(div, segments: list | None):
+    """Equivalente del selettore ".team-segment:last-child a.player_name_header"."""
+    if segments is None:
+        return _first(div, _OPPONENT_LINK)
+    for segment in segments:
+        if next(segment.itersiblings(tag=etree.Element), None) is None:
+            link = _first(segment, _SEGMENT_LINK)
+            if link is not None:
+                return link
+    return None
+
+def parse_battle_data(div, player_tag: str, segments: list | None = None) -> dict:
+    """Estrae i dati di una singola battaglia da un div."""
+    battle_id = div.get("id").replace("battle_", "")
+    timestamp = int(float(div.get("data-timestamp")))
+    battle_type = div.get("data-battle-type")
+
+    gm = _first(div, _GAME_MODE)
+    game_mode = _text(gm) if gm is not None else None
+
+    ribbon = _first(div, _RIBBON)
+    win = 1 if ribbon is not None and "Victory" in _text(ribbon, strip=False) else 0
+
+    result = _first(div, _RESULT)
+    player_crowns, opponent_crowns = None, None
+    if result is not None:
+        nums = _text(result).replace(" ", "").split("-")
+        player_crowns = int(nums[0])
+        opponent_crowns = int(nums[1])
+
+    trophy_change = None
+    labels = div.xpath(_TROPHY_LABELS)
+    if labels:
+        tc_text = (labels[0].text or "").strip().replace("+", "")
+        try:
+            trophy_change = int(tc_text)
+        except ValueError:
+            trophy_change = None
+
+    # Fix per Arena Gate (vedi parsers.parse_battle_data)
+    if win == 0 and trophy_change is not None and trophy_change > 0:
+        trophy_change = 0
+
+    opponent_link = _find_opponent_link(div, segments)
+    opponent_tag = None
+    if opponent_link is not None and '/player/' in opponent_link.get("href", ""):
+        opponent_tag = opponent_link.get("href").split("/player/")[-1].split('/')[0]
+
+    elixir_leaked_player, elixir_leaked_opponent = None, None
+    for stat in div.xpath(_STAT_ITEMS):
+        label_tag = _first(stat, _STAT_NAME)
+        value_tag = _first(stat, _STAT_VALUE)
+        if label_tag is None or value_tag is None:
+            continue
+        label = _text(label_tag).lower()
+        val = _text(value_tag)
+
+        if label == "elixir leaked":
+            if elixir_leaked_player is None:
+                elixir_leaked_player = float(val.removeprefix("Elixir Leaked"))
+            else:
+                elixir_leaked_opponent = float(val.removeprefix("Elixir Leaked"))
+
+    level_diff = None
+    lvl = _first(div, _LEVEL_DIFF)
+    if lvl is not None and "Δ Lvl:" in _text(lvl, strip=False):
+        level_diff_text = _text(lvl).replace("Δ Lvl:", "").strip()
+        try:
+            level_diff = float(level_diff_text)
+        except ValueError:
+            level_diff = None
+
+    return {
+        "battle_id": battle_id, "battle_type": battle_type, "game_mode": game_mode,
+        "timestamp": timestamp, "player_tag": player_tag, "opponent_tag": opponent_tag,
+        "player_crowns": player_crowns, "opponent_crowns": opponent_crowns, "win": win,
+        "trophy_change": trophy_change, "elixir_leaked_player": elixir_leaked_player,
+        "elixir_leaked_opponent": elixir_leaked_opponent, "level_diff": level_diff
+    }
+
+def parse_deck_from_battle(div, is_opponent: bool = False, segments: list | None = None) -> list | None:
+    """Estrae le carte di un mazzo da un div di battaglia."""
+    if segments is None:
+        segments = div.xpath(_SEGMENTS)
+    if not segments:
+        return None
+
+    return _parse_deck_segment(segments[-1] if is_opponent else segments[0])
+
+def _parse_deck_segment(segment) -> list | None:
+    """Estrae le carte (8 + torre) da un singolo .team-segment."""
+    parsed_cards = []
+
+    for card_container in segment.xpath(_DECK_CARDS):
+        card_img = _first(card_container, _CARD_IMG)
+        if card_img is None:
+            continue
+
+        level = None
+        level_tag = _first(card_container, _CARD_LEVEL)
+        if level_tag is not None:
+            level_text = _text(level_tag).replace("Lvl", "").strip()
+            if level_text.isdigit():
+                level = int(level_text)
+
+        card_key = card_img.get("data-card-key", "")
+        parsed_cards.append({
+            "name": card_img.get("alt"),
+            "level": level,
+            "has_evolution": 1 if "-ev" in card_key else 0,
+            "has_hero": 1 if "-hero" in card_key else 0
+        })
+
+    tower_container = _first(segment, _TOWER)
+    if tower_container is not None:
+        tower_img = _first(tower_container, _CARD_IMG)
+        if tower_img is not None:
+            level = 16
+            level_divs = tower_container.xpath(_TOWER_LEVEL_DIVS)
+            if len(level_divs) > 1:
+                level_text = _text(level_divs[1]).replace("Lvl", "").strip()
+                if level_text.isdigit() and int(level_text) > 0:
+                    level = int(level_text)
+
+            parsed_cards.append({"name": tower_img.get("alt"), "level": level, "has_evolution": 0, "has_hero": 0})
+
+    return parsed_cards if parsed_cards else None
+
+@metrics.timed("parse_seconds", function="parse_battles_page", backend="lxml")
+def parse_battles_page(doc, player_tag: str, stop_ts: int | None = None) -> tuple[list, int | None, bool]:
+    """Estrae in un solo passaggio le battaglie di una pagina (vedi parsers.parse_battles_page)."""
+    battles = select_battles(doc)
+    if not battles:
+        return [], None, False
+
+    oldest_ts = int(float(battles[-1].get("data-timestamp")))
+    records = []
+    for div in battles:
+        if stop_ts and int(float(div.get("data-timestamp"))) <= stop_ts:
+            return records, oldest_ts, True
+
+        segments = div.xpath(_SEGMENTS)
+        battle = parse_battle_data(div, player_tag, segments)
+        player_deck = _parse_deck_segment(segments[0]) if segments else None
+        opponent_deck = _parse_deck_segment(segments[-1]) if segments and battle["opponent_tag"] else None
+        records.append((battle, player_deck, opponent_deck))
+
+    return records, oldest_ts, False
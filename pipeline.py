@@ -0,0 +1,120 @@
+"""
+Modalità pipeline per i grandi recuperi di cronologia battaglie.
+
+I thread di download mettono l'HTML grezzo in coda a un pool di processi
+che ne estrae battaglie e mazzi come record semplici; un unico writer (il
+thread principale, con l'unica connessione SQLite) salva le pagine tramite
+db_manager e fa avanzare il crawl di ogni giocatore (battle_updater.advance_crawl).
+Ogni giocatore ha al più una pagina in volo, perché l'indirizzo della pagina
+successiva dipende da quella appena letta: il parallelismo viene dai giocatori.
+
+Profili e statistiche dei mazzi restano al ciclo normale di main.py.
+
+Uso: python pipeline.py [TAG ...]   (senza tag: tutti i giocatori del DB)
+"""
+import os
+import sys
+import queue
+import logging
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from api_client import fetch_html
+from battle_updater import next_crawl, crawl_path, parse_crawl_page, advance_crawl, fail_crawl, crawl_stats
+from db_manager import warm_deck_cache
+from card_registry import load_card_registry
+from utils.connection import open_connection, close_connection
+from db.migrate import migrate_db
+
+DB_PATH = "db/clash.db"
+
+# Download contemporanei (il ritmo reale resta quello del budget di api_client)
+FETCH_WORKERS = 8
+# Processi di parsing
+PARSE_WORKERS = os.cpu_count() or 2
+# Giocatori con un crawl in corso contemporaneamente
+MAX_ACTIVE_TAGS = 32
+
+def _submit(crawl: dict, fetch_pool, parse_pool, results: queue.Queue):
+    """Download nel pool di thread, poi parsing nel pool di processi; il risultato va in coda al writer."""
+    def parsed(future):
+        results.put((crawl, future))
+
+    def fetched(future):
+        # Ogni pagina deve arrivare al writer, anche in caso di errore, altrimenti resterebbe in attesa
+        try:
+            html = future.result()
+            if html is not None:
+                parse_pool.submit(parse_crawl_page, html, crawl["tag"], crawl["stop_ts"]).add_done_callback(parsed)
+                return
+        except Exception as e:
+            logging.error(f"Errore durante il download di {crawl_path(crawl)}: {e}")
+        results.put((crawl, None))
+
+    fetch_pool.submit(fetch_html, crawl_path(crawl)).add_done_callback(fetched)
+
+def run_pipeline(tags: list, conn, cursor, fetch_workers: int = FETCH_WORKERS, parse_workers: int = PARSE_WORKERS) -> Counter:
+    """Recupera le battaglie dei giocatori indicati con download, parsing e scrittura in parallelo."""
+    waiting = deque(tags)
+    results = queue.Queue()
+    stats = Counter()
+    active, done, total = 0, 0, len(tags)
+
+    with ThreadPoolExecutor(max_workers=fetch_workers, thread_name_prefix="fetch") as fetch_pool, \
+         ProcessPoolExecutor(max_workers=parse_workers) as parse_pool:
+
+        while waiting or active:
+            while waiting and active < MAX_ACTIVE_TAGS:
+                crawl = next_crawl(cursor, waiting.popleft())
+                if crawl is not None:
+                    _submit(crawl, fetch_pool, parse_pool, results)
+                    active += 1
+
+            if not active:
+                break
+
+            crawl, future = results.get()
+            page = None
+            if future is not None:
+                try:
+                    page = future.result()
+                except Exception as e:
+                    logging.error(f"Errore nel parsing di {crawl_path(crawl)}: {e}")
+                    fail_crawl(crawl, conn, cursor)
+
+            if not crawl["done"]:
+                advance_crawl(crawl, page, conn, cursor)
+            if not crawl["done"]:
+                _submit(crawl, fetch_pool, parse_pool, results)
+                continue
+
+            stats.update(crawl_stats(crawl))
+            following = next_crawl(cursor, crawl["tag"], crawl)
+            if following is not None:
+                _submit(following, fetch_pool, parse_pool, results)
+                continue
+
+            active -= 1
+            done += 1
+            logging.info(f"Pipeline: {done}/{total} giocatori completati ({stats['pages']} pagine).")
+
+    logging.info(f"Pipeline completata: {stats['pages']} pagine battaglie, {stats['resumed']} crawl ripresi.")
+    return stats
+
+def main(tags: list | None = None):
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    migrate_db(DB_PATH)
+    conn, cursor, load_tags = open_connection(DB_PATH, profile="ingest")
+    if not conn:
+        logging.critical("Impossibile connettersi al database. Uscita.")
+        return
+
+    try:
+        load_card_registry(cursor)
+        warm_deck_cache(cursor)
+        run_pipeline(tags or load_tags(), conn, cursor)
+    finally:
+        close_connection(conn)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
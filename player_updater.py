@@ -1,4 +1,7 @@
+import json
+import hashlib
 import logging
+from datetime import datetime
 from api_client import fetch_page
 from parsers import (
     parse_player_data,
@@ -11,39 +14,82 @@ from db_manager import (
     update_player_towers,
     update_player_heroes,
     update_player_evolutions,
-    update_player_cards
+    update_player_cards,
+    get_profile_digests,
+    save_profile_digests
 )
+import metrics
+
+# Le carte possono salire di livello anche senza giocare: la pagina /cards viene
+# comunque riscaricata se l'ultimo download è più vecchio di così (ore)
+CARDS_MAX_AGE_HOURS = 24
+
+# Campi di parse_player_data che cambiano solo giocando o progredendo
+# (sono esclusi età dell'account, tempo di gioco e partite al giorno, che variano da soli)
+_PROGRESSION_FIELDS = slice(0, 10)
+
+def _digest(*parts) -> str:
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+def profile_digest(player_data: tuple | None, towers: list, heroes: list, evolutions: list) -> str:
+    """Impronta dei segnali di progressione della pagina profilo (statistiche, torri, eroi, evoluzioni)."""
+    progression = player_data[_PROGRESSION_FIELDS] if player_data else None
+    return _digest(progression, towers, heroes, evolutions)
+
+def _cards_are_fresh(stored: tuple | None, digest: str) -> bool:
+    """True se il profilo è identico all'ultimo aggiornamento completo e le carte sono abbastanza recenti."""
+    if not stored or stored[0] != digest or not stored[2]:
+        return False
+    age = datetime.now() - datetime.strptime(stored[2], '%Y-%m-%d %H:%M:%S')
+    return age.total_seconds() < CARDS_MAX_AGE_HOURS * 3600
 
 def update_player_profile(tag: str, conn, cursor):
     """
     Orchestra il recupero e l'aggiornamento completo del profilo di un giocatore.
+    Se il profilo non mostra progressi dall'ultimo passaggio, la pagina /cards
+    e le scritture su player_card vengono saltate.
     """
     logging.info(f"Inizio aggiornamento profilo per {tag}")
-    
+
     # 1. Fetch e Parse dati profilo principale
     profile_soup = fetch_page(f"/player/{tag}")
-    if not profile_soup: 
+    if not profile_soup:
         return
 
     player_data = parse_player_data(profile_soup)
     towers, heroes = parse_towers_and_heroes(profile_soup)
     evolutions = parse_evolutions(profile_soup)
 
+    stored = get_profile_digests(cursor, tag)
+    digest = profile_digest(player_data, towers, heroes, evolutions)
+
+    if player_data:
+        update_player_stats(cursor, tag, player_data)
+
+    if player_data and _cards_are_fresh(stored, digest):
+        conn.commit()
+        metrics.inc("profiles_total", result="unchanged")
+        logging.info(f"Profilo per {tag} invariato: carte non riscaricate.")
+        return
+
     # 2. Fetch e Parse dati carte
     cards_soup = fetch_page(f"/player/{tag}/cards")
     cards = parse_player_cards(cards_soup) if cards_soup else []
+    cards_digest = _digest(cards) if cards else None
 
     # 3. Aggiornamento del database
-    if player_data: 
-        update_player_stats(cursor, tag, player_data)
-    if towers: 
+    if towers:
         update_player_towers(cursor, tag, towers)
-    if heroes: 
+    if heroes:
         update_player_heroes(cursor, tag, heroes)
-    if evolutions: 
+    if evolutions:
         update_player_evolutions(cursor, tag, evolutions)
-    if cards: 
+    if cards and not (stored and stored[1] == cards_digest):
         update_player_cards(cursor, tag, cards)
-    
+    if player_data and cards:
+        # Solo dopo un aggiornamento completo: altrimenti il prossimo passaggio riprova
+        save_profile_digests(cursor, tag, digest, cards_digest)
+
     conn.commit()
-    logging.info(f"Profilo per {tag} aggiornato con successo.")
\ No newline at end of file
+    metrics.inc("profiles_total", result="updated")
+    logging.info(f"Profilo per {tag} aggiornato con successo.")
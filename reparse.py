@@ -0,0 +1,59 @@
+import sys
+import logging
+import archive
+from parsers import get_battle_parser
+from db_manager import insert_battles_and_decks, publish_new_decks
+from utils.connection import open_connection, close_connection
+from db.migrate import migrate_db
+
+DB_PATH = "db/clash.db"
+
+# Pagine rielaborate per ogni transazione
+COMMIT_EVERY = 200
+
+def reparse_battles(conn, cursor, since: str | None = None) -> tuple[int, int]:
+    """
+    Riesegue il parsing di tutte le pagine battaglie archiviate e riscrive
+    battaglie e mazzi nel DB. I matchup delle battaglie i cui mazzi sono
+    cambiati tornano NULL e vengono ricalcolati da matchup_worker.
+    Restituisce (pagine rielaborate, battaglie scritte).
+    """
+    parser = get_battle_parser()
+    pages, written = 0, 0
+
+    for path, _, html in archive.iter_pages("/player/%/battles%", since):
+        match = archive.ARCHIVED_PATHS.match(path)
+        if not match:
+            continue
+
+        records, _, _ = parser.parse_battles_page(parser.load_document(html), match.group(1))
+        written += insert_battles_and_decks(cursor, records, replace=True)
+        pages += 1
+        if pages % COMMIT_EVERY == 0:
+            conn.commit()
+            publish_new_decks()
+            logging.info(f"Rielaborate {pages} pagine ({written} battaglie).")
+
+    conn.commit()
+    publish_new_decks()
+    return pages, written
+
+def main(since: str | None = None):
+    """Uso: python reparse.py [AAAA-MM-GG] - rielabora le pagine archiviate da quella data in poi."""
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    migrate_db(DB_PATH)
+    conn, cursor, _ = open_connection(DB_PATH, profile="ingest")
+    if not conn:
+        logging.critical("Impossibile connettersi al database. Uscita.")
+        return
+
+    try:
+        pages, written = reparse_battles(conn, cursor, since)
+        logging.info(f"Reparse completato: {pages} pagine, {written} battaglie scritte.")
+    finally:
+        close_connection(conn)
+        archive.close_archive()
+
+if __name__ == "__main__":
+    main(*sys.argv[1:2])
@@ -0,0 +1,88 @@
+import time
+import logging
+from datetime import datetime
+
+# Intervallo tra due giri di pianificazione del ciclo principale (secondi)
+SWEEP_INTERVAL = 5 * 60
+# Richieste massime da spendere in un giro e costo medio di un aggiornamento
+# (profilo + carte + almeno una pagina battaglie + mazzi)
+REQUEST_BUDGET = 400
+REQUESTS_PER_REFRESH = 5
+# Un giocatore viene aggiornato quando si stimano almeno questo numero di battaglie non ancora viste...
+MIN_EXPECTED_BATTLES = 1.0
+# ...oppure, in ogni caso, se non è stato aggiornato da più di questo numero di ore
+MAX_STALENESS_HOURS = 24
+# Finestra su cui misurare la cadenza recente delle battaglie (giorni)
+LOOKBACK_DAYS = 14
+# Peso della cadenza recente rispetto a players.games_per_day
+RECENT_WEIGHT = 0.7
+
+def _hours_since(last_updated: str | None, now: datetime) -> float | None:
+    if not last_updated:
+        return None
+    try:
+        return (now - datetime.strptime(last_updated, '%Y-%m-%d %H:%M:%S')).total_seconds() / 3600
+    except ValueError:
+        return None
+
+def get_recent_battle_rates(cursor, lookback_days: int = LOOKBACK_DAYS) -> dict:
+    """
+    Battaglie all'ora per giocatore, misurate sulle battaglie degli ultimi `lookback_days` giorni.
+    Il conteggio è fatto per giocatore su idx_battles_player_ts, così legge solo le
+    battaglie recenti invece di scandire tutta la tabella battles.
+    """
+    since = int(time.time()) - lookback_days * 86400
+    cursor.execute("""
+        SELECT player_tag,
+               (SELECT COUNT(*) FROM battles b WHERE b.player_tag = players.player_tag AND b.timestamp >= ?)
+        FROM players
+    """, (since,))
+    return {tag: count / (lookback_days * 24) for tag, count in cursor.fetchall() if count}
+
+def estimate_player_priorities(cursor) -> list:
+    """
+    Stima per ogni giocatore quante battaglie nuove ci sono da quando è stato aggiornato.
+    Restituisce una lista di (tag, battaglie stimate, ore dall'ultimo aggiornamento),
+    dalla più urgente. I giocatori mai aggiornati hanno priorità infinita.
+    """
+    now = datetime.now()
+    recent_rates = get_recent_battle_rates(cursor)
+
+    cursor.execute("SELECT player_tag, games_per_day, last_updated FROM players")
+    priorities = []
+    for tag, games_per_day, last_updated in cursor.fetchall():
+        hours = _hours_since(last_updated, now)
+        if hours is None:
+            priorities.append((tag, float("inf"), None))
+            continue
+
+        profile_rate = (games_per_day or 0) / 24
+        if tag in recent_rates:
+            rate = RECENT_WEIGHT * recent_rates[tag] + (1 - RECENT_WEIGHT) * profile_rate
+        else:
+            rate = profile_rate
+        priorities.append((tag, rate * hours, hours))
+
+    priorities.sort(key=lambda p: p[1], reverse=True)
+    return priorities
+
+def plan_sweep(cursor, request_budget: int = REQUEST_BUDGET) -> list:
+    """
+    Sceglie i tag da aggiornare in questo giro: quelli con battaglie nuove
+    probabili (o troppo vecchi), in ordine di urgenza, entro il budget di richieste.
+    """
+    max_players = max(1, request_budget // REQUESTS_PER_REFRESH)
+    due = [
+        (tag, expected, hours) for tag, expected, hours in estimate_player_priorities(cursor)
+        if expected >= MIN_EXPECTED_BATTLES or hours is None or hours >= MAX_STALENESS_HOURS
+    ]
+    # I giocatori fermi da troppo tempo entrano comunque, subito dopo quelli più attivi
+    due.sort(key=lambda p: (p[1] >= MIN_EXPECTED_BATTLES, p[1]), reverse=True)
+
+    selected = due[:max_players]
+    never_updated = sum(1 for _, _, hours in selected if hours is None)
+    expected_total = sum(expected for _, expected, hours in selected if hours is not None)
+    logging.info(f"Pianificati {len(selected)} giocatori su {len(due)} da aggiornare "
+                 f"({never_updated} mai aggiornati, battaglie nuove stimate: {expected_total:.0f}, "
+                 f"budget: {request_budget} richieste).")
+    return [tag for tag, _, _ in selected]
@@ -0,0 +1,65 @@
+import asyncio
+import logging
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from utils.connection import new_connection, close_connection
+from player_updater import update_player_profile
+from battle_updater import fetch_all_battles
+from db_manager import discard_new_decks
+
+# Numero di giocatori aggiornati contemporaneamente.
+# Il ritmo reale è comunque deciso dal budget di richieste in api_client.
+MAX_CONCURRENT_TAGS = 8
+
+def _print_progress(done: int, total: int, tag: str):
+    progress_percent = (done / total) * 100
+    active_elements = round(progress_percent / 10)
+    progress_bar = '#' * active_elements + '-' * (10 - active_elements)
+    print(f"{'-'*30} Completati {done}/{total} - [{progress_bar}] {tag} {'-'*30}")
+
+def _update_tag(tag: str, db_path: str) -> Counter:
+    """
+    Aggiorna profilo e battaglie di un giocatore usando una connessione dedicata al thread.
+    Restituisce i contatori delle pagine battaglie (vedi battle_updater.fetch_all_battles), o errors=1 se fallisce.
+    """
+    conn, cursor = new_connection(db_path)
+    try:
+        update_player_profile(tag, conn, cursor)
+        return fetch_all_battles(tag, conn, cursor)
+    except Exception as e:
+        conn.rollback()
+        discard_new_decks()
+        logging.error(f"Errore durante l'aggiornamento di {tag}: {e}")
+        return Counter(errors=1)
+    finally:
+        close_connection(conn)
+
+async def run_sweep(tags: list, db_path: str, max_concurrent_tags: int = MAX_CONCURRENT_TAGS):
+    """
+    Aggiorna tutti i tag in parallelo: ogni giocatore è gestito da un worker
+    del pool, mentre api_client limita le richieste per host.
+    """
+    loop = asyncio.get_running_loop()
+    total = len(tags)
+    crawl_stats = Counter()
+
+    with ThreadPoolExecutor(max_workers=max_concurrent_tags, thread_name_prefix="sweep") as executor:
+        async def process(tag):
+            stats = await loop.run_in_executor(executor, _update_tag, tag, db_path)
+            return tag, stats
+
+        done = 0
+        for finished in asyncio.as_completed([process(tag) for tag in tags]):
+            tag, stats = await finished
+            crawl_stats.update(stats)
+            done += 1
+            _print_progress(done, total, tag)
+
+    saved = crawl_stats["saved_first_page"] + crawl_stats["saved_history"]
+    logging.info(f"Sweep completato: {crawl_stats['pages']} pagine battaglie scaricate, {saved} risparmiate "
+                 f"(prima pagina: {crawl_stats['saved_first_page']}, history: {crawl_stats['saved_history']}).")
+    return crawl_stats
+
+def sweep(tags: list, db_path: str, max_concurrent_tags: int = MAX_CONCURRENT_TAGS):
+    """Punto di ingresso sincrono per run_sweep."""
+    return asyncio.run(run_sweep(tags, db_path, max_concurrent_tags))
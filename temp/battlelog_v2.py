@@ -294,7 +294,7 @@ def load_battles(cursor, tag):
     query = """
             SELECT b.battle_id, b.battle_type, b.game_mode, b.timestamp, b.win, b.level_diff, b.matchup_win_rate, b.trophy_change, b.opponent_tag, b.player_crowns, b.opponent_crowns, b.player_deck_id, d.archetype_hash
             FROM battles b
-            LEFT JOIN decks d ON b.player_deck_id = d.deck_hash
+            LEFT JOIN decks d ON b.player_deck_id = d.deck_id
             WHERE b.player_tag = ?
             ORDER BY b.timestamp ASC;
         """
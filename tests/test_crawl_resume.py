@@ -0,0 +1,103 @@
+"""
+Ripresa dei crawl interrotti (crawl_state): un checkpoint la cui pagina non si
+scarica più non deve bloccare per sempre le battaglie nuove del giocatore.
+Dopo MAX_CRAWL_ATTEMPTS giri falliti il checkpoint viene abbandonato e parte
+un crawl nuovo fino all'ultima battaglia salvata.
+
+Usa un DB in memoria creato dalle migrazioni e le pagine di tests/fixtures/battles
+al posto delle richieste a royaleapi.
+
+Uso (dalla root del progetto): python -m pytest tests   |   python -m unittest discover tests
+"""
+import os
+import sys
+import sqlite3
+import unittest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import battle_updater
+import db_manager
+from db.migrate import migrate
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "battles")
+PLAYER_TAG = "PLAYER001"
+STUCK_CURSOR = 5000
+
+def _stuck_path() -> str:
+    return battle_updater.crawl_path(battle_updater.new_crawl(PLAYER_TAG, battle_updater.HISTORY, STUCK_CURSOR))
+
+class StuckCrawlTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        with open(os.path.join(FIXTURES_DIR, "battles_first_page.html"), encoding="utf-8") as f:
+            cls.first_page = f.read()
+
+    def setUp(self):
+        self.conn = sqlite3.connect(":memory:")
+        migrate(self.conn)
+        self.cursor = self.conn.cursor()
+        self.cursor.execute("INSERT INTO players (player_tag) VALUES (?)", (PLAYER_TAG,))
+        db_manager.save_crawl_state(self.cursor, PLAYER_TAG, battle_updater.HISTORY, STUCK_CURSOR, None)
+        self.conn.commit()
+        db_manager._deck_cache.clear()
+
+        self.requested = []
+        self.stuck_page = None
+        self.saved = (battle_updater.fetch_html, battle_updater.fetch_page)
+        battle_updater.fetch_html = self._fetch_html
+        battle_updater.fetch_page = lambda path: None
+
+    def tearDown(self):
+        battle_updater.fetch_html, battle_updater.fetch_page = self.saved
+        db_manager._deck_cache.clear()
+        self.conn.close()
+
+    def _fetch_html(self, path: str) -> str | None:
+        self.requested.append(path)
+        if path == _stuck_path():
+            return self.stuck_page
+        if path == f"/player/{PLAYER_TAG}/battles":
+            return self.first_page
+        return "<html></html>"  # fine dello scroll e della cronologia
+
+    def _attempts(self) -> int:
+        self.cursor.execute("SELECT attempts FROM crawl_state WHERE player_tag = ? AND phase = ?",
+                            (PLAYER_TAG, battle_updater.HISTORY))
+        return self.cursor.fetchone()[0]
+
+    def _battles(self) -> int:
+        self.cursor.execute("SELECT COUNT(*) FROM battles WHERE player_tag = ?", (PLAYER_TAG,))
+        return self.cursor.fetchone()[0]
+
+    def test_stuck_checkpoint_is_abandoned(self):
+        for sweep in range(1, battle_updater.MAX_CRAWL_ATTEMPTS):
+            with self.assertLogs(level="WARNING"):
+                stats = battle_updater.fetch_all_battles(PLAYER_TAG, self.conn, self.cursor)
+            self.assertEqual(self._attempts(), sweep)
+            self.assertEqual(self._battles(), 0)
+            self.assertEqual(stats["abandoned"], 0)
+            self.assertTrue(db_manager.get_pending_crawls(self.cursor, PLAYER_TAG))
+
+        with self.assertLogs(level="WARNING") as logs:
+            stats = battle_updater.fetch_all_battles(PLAYER_TAG, self.conn, self.cursor)
+        self.assertTrue(any("abbandonato" in line for line in logs.output))
+        self.assertEqual(stats["abandoned"], 1)
+        # Il crawl nuovo parte nello stesso giro e arriva fino in fondo
+        self.assertIn(f"/player/{PLAYER_TAG}/battles", self.requested)
+        self.assertGreater(self._battles(), 0)
+        self.assertFalse(db_manager.get_pending_crawls(self.cursor, PLAYER_TAG))
+
+    def test_saved_page_resets_attempts(self):
+        with self.assertLogs(level="WARNING"):
+            battle_updater.fetch_all_battles(PLAYER_TAG, self.conn, self.cursor)
+        self.assertEqual(self._attempts(), 1)
+
+        self.stuck_page = self.first_page
+        battle_updater.fetch_all_battles(PLAYER_TAG, self.conn, self.cursor)
+        self.assertEqual(self._attempts(), 0)
+        self.assertGreater(self._battles(), 0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,109 @@
+"""
+Parità tra i due backend delle pagine battaglie: parsers (BeautifulSoup con
+html.parser) e parsers_lxml (XPath) devono estrarre gli stessi dizionari da
+ogni pagina salvata in tests/fixtures/battles.
+
+Le fixture sono pagine in stile royaleapi con tag e nomi anonimizzati; per
+aggiungere un caso basta salvare un'altra pagina .html nella cartella.
+
+Uso (dalla root del progetto): python -m pytest tests   |   python -m unittest discover tests
+"""
+import os
+import sys
+import unittest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import parsers
+
+try:
+    import parsers_lxml
+except ImportError:
+    parsers_lxml = None
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "battles")
+PLAYER_TAG = "PLAYER001"
+
+def _load_fixtures() -> dict:
+    pages = {}
+    for name in sorted(os.listdir(FIXTURES_DIR)):
+        if name.endswith(".html"):
+            with open(os.path.join(FIXTURES_DIR, name), encoding="utf-8") as f:
+                pages[name] = f.read()
+    return pages
+
+def _extract(backend, html: str) -> tuple:
+    """Battaglie e mazzi con le funzioni per-battaglia, più il timestamp più vecchio."""
+    doc = backend.load_document(html)
+    records = [
+        (backend.parse_battle_data(div, PLAYER_TAG),
+         backend.parse_deck_from_battle(div, is_opponent=False),
+         backend.parse_deck_from_battle(div, is_opponent=True))
+        for div in backend.select_battles(doc)
+    ]
+    return records, backend.parse_oldest_timestamp_from_page(doc)
+
+def _single_pass(backend, html: str, stop_ts: int | None = None) -> tuple:
+    return backend.parse_battles_page(backend.load_document(html), PLAYER_TAG, stop_ts)
+
+@unittest.skipIf(parsers_lxml is None, "lxml non installato")
+class ParserParityTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.pages = _load_fixtures()
+        cls.html_parser = parsers.HTML_PARSER
+        parsers.set_parser_backend(html_parser="html.parser")
+
+    @classmethod
+    def tearDownClass(cls):
+        parsers.set_parser_backend(html_parser=cls.html_parser)
+
+    def test_fixtures_present(self):
+        self.assertTrue(self.pages, f"Nessuna pagina .html in {FIXTURES_DIR}")
+
+    def test_per_battle_functions_match(self):
+        for name, html in self.pages.items():
+            with self.subTest(page=name):
+                expected_records, expected_ts = _extract(parsers, html)
+                actual_records, actual_ts = _extract(parsers_lxml, html)
+                self.assertEqual(len(expected_records), len(actual_records))
+                for i, (expected, actual) in enumerate(zip(expected_records, actual_records)):
+                    self.assertEqual(expected, actual, f"battaglia {i}")
+                self.assertEqual(expected_ts, actual_ts)
+
+    def test_single_pass_matches(self):
+        for name, html in self.pages.items():
+            records, oldest_ts = _extract(parsers, html)
+            # Il mazzo avversario viene letto solo se c'è il tag dell'avversario
+            records = [(b, p, o if b["opponent_tag"] else None) for b, p, o in records]
+            for backend in (parsers, parsers_lxml):
+                with self.subTest(page=name, backend=backend.__name__):
+                    self.assertEqual(_single_pass(backend, html), (records, oldest_ts, False))
+
+    def test_single_pass_stops_at_known_battle(self):
+        for name, html in self.pages.items():
+            records, _ = _extract(parsers, html)
+            if len(records) < 2:
+                continue
+            stop_ts = records[1][0]["timestamp"]
+            with self.subTest(page=name):
+                expected = _single_pass(parsers, html, stop_ts)
+                self.assertEqual(len(expected[0]), 1)
+                self.assertTrue(expected[2])
+                self.assertEqual(expected, _single_pass(parsers_lxml, html, stop_ts))
+
+    def test_trophy_change(self):
+        # Etichetta trofei: solo il testo prima del primo elemento figlio conta
+        # (contents[0] in bs4, .text in lxml)
+        html = self.pages["battles_edge_cases.html"]
+        for backend in (parsers, parsers_lxml):
+            with self.subTest(backend=backend.__name__):
+                records, _ = _extract(backend, html)
+                changes = [battle["trophy_change"] for battle, _, _ in records]
+                # sconfitta al limite dell'arena, pareggio, immagine iniziale, etichetta vuota,
+                # commento iniziale, amichevole e 2v2 senza trofei
+                self.assertEqual(changes, [0, 0, None, None, None, None, None])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,130 @@
+"""
+Regressione sui piani di esecuzione: su un DB nuovo creato dalle migrazioni,
+le query più frequenti di scraper e analisi devono usare un indice (EXPLAIN
+QUERY PLAN) invece di una scansione completa di battles, decks o deck_cards.
+
+Per controllare un DB esistente: TESI_QUERY_PLAN_DB=db/clash.db python -m pytest tests/test_query_plans.py
+"""
+import os
+import re
+import sys
+import sqlite3
+import unittest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from db.migrate import migrate
+
+# Tabelle grandi che non devono mai essere scandite per intero
+BIG_TABLES = ("battles", "decks", "deck_cards")
+
+# (nome, query, parametri, tabelle o indici ammessi per una SCAN)
+HOT_QUERIES = [
+    ("get_last_battle_timestamp",
+     "SELECT MAX(timestamp) FROM battles WHERE player_tag = ?", ("TAG",), ()),
+    ("load_battles",
+     """SELECT b.battle_id, b.timestamp, b.player_deck_id, d.archetype_hash
+        FROM battles b LEFT JOIN decks d ON b.player_deck_id = d.deck_id
+        WHERE b.player_tag = ? ORDER BY b.timestamp ASC""", ("TAG",), ()),
+    ("load_battles_ladder",
+     """SELECT b.battle_id, b.timestamp, d.archetype_hash, od.archetype_hash,
+               (SELECT MAX(card_level) FROM deck_cards WHERE deck_id = b.player_deck_id AND card_name IN (SELECT card_name FROM cards WHERE type = 'Tower'))
+        FROM battles b
+        LEFT JOIN decks d ON b.player_deck_id = d.deck_id
+        LEFT JOIN decks od ON b.opponent_deck_id = od.deck_id
+        WHERE b.player_tag = ? AND b.game_mode = 'Ladder'
+        ORDER BY b.timestamp ASC""", ("TAG",), ("cards",)),
+    ("player_decks_by_archetype",
+     "SELECT archetype_hash, deck_id FROM player_decks WHERE player_tag = ?", ("TAG",), ()),
+    ("recent_battle_rates",
+     """SELECT player_tag, (SELECT COUNT(*) FROM battles b WHERE b.player_tag = players.player_tag AND b.timestamp >= ?)
+        FROM players""", (0,), ("players",)),
+    ("battles_since",
+     "SELECT COUNT(*) FROM battles WHERE player_tag = ? AND timestamp > ?", ("TAG", 0), ()),
+    ("decks_by_archetype",
+     "SELECT deck_id FROM decks WHERE archetype_hash = ?", ("H",), ()),
+    ("deck_cards_batch",
+     "SELECT deck_id, card_name, card_level FROM deck_cards WHERE deck_id IN (?, ?)", (1, 2), ()),
+    ("deck_id_by_hash",
+     "SELECT deck_id FROM decks WHERE deck_hash = ?", ("H",), ()),
+    ("battles_vs_deck",
+     "SELECT battle_id FROM battles WHERE opponent_deck_id = ?", (1,), ()),
+    ("pending_matchups",
+     """SELECT p.player_deck_id, p.opponent_deck_id, p.needs_lvl, p.needs_no_lvl
+        FROM (SELECT player_deck_id, opponent_deck_id, MAX(matchup_win_rate IS NULL) AS needs_lvl, MAX(matchup_no_lvl IS NULL) AS needs_no_lvl
+              FROM battles
+              WHERE player_deck_id IS NOT NULL AND opponent_deck_id IS NOT NULL
+                AND (matchup_win_rate IS NULL OR matchup_no_lvl IS NULL)
+              GROUP BY player_deck_id, opponent_deck_id) p
+        LEFT JOIN matchup_attempts a ON a.player_deck_id = p.player_deck_id AND a.opponent_deck_id = p.opponent_deck_id
+        WHERE a.player_deck_id IS NULL OR (a.unevaluable = 0 AND a.attempts < ? AND a.next_try <= ?)""",
+     (5, "2000-01-01 00:00:00"), ("idx_battles_pending_matchup", "p")),
+    ("matchup_backfill",
+     """UPDATE battles SET matchup_win_rate = COALESCE(matchup_win_rate, ?), matchup_no_lvl = COALESCE(matchup_no_lvl, ?)
+        WHERE player_deck_id = ? AND opponent_deck_id = ?""", (0.5, 0.5, 1, 2), ()),
+    ("frontier_new_opponents",
+     """SELECT b.opponent_tag, COUNT(*), AVG(p.trophies)
+        FROM battles b JOIN players p ON p.player_tag = b.player_tag
+        WHERE b.rowid > ? AND b.rowid <= ? AND b.opponent_tag IS NOT NULL
+          AND b.opponent_tag NOT IN (SELECT player_tag FROM players)
+        GROUP BY b.opponent_tag""", (0, 100), ()),
+    ("frontier_candidates",
+     "SELECT player_tag, est_trophies, est_arena FROM discovery_frontier WHERE status = 'pending' ORDER BY times_seen DESC LIMIT ?", (10,), ()),
+    ("matchup_cache_lookup",
+     "SELECT win_rate FROM matchup_cache WHERE player_key = ? AND opponent_key = ? AND equal_levels = ?", ("A", "B", 0), ()),
+]
+
+
+_SCAN = re.compile(r"^SCAN (\w+)(?: AS \w+)?(?: USING (?:COVERING )?INDEX (\w+))?")
+_TABLE_REF = re.compile(r"\b(?:FROM|JOIN)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?", re.IGNORECASE)
+_NOT_ALIAS = {"where", "on", "left", "inner", "join", "group", "order", "limit", "set", "using"}
+
+def _aliases(query: str) -> dict:
+    """Alias -> tabella per le tabelle in FROM/JOIN (EXPLAIN mostra l'alias al posto del nome)."""
+    aliases = {}
+    for table, alias in _TABLE_REF.findall(query):
+        aliases[table] = table
+        if alias and alias.lower() not in _NOT_ALIAS:
+            aliases[alias] = table
+    return aliases
+
+def _scans(cursor, query: str, params: tuple) -> list:
+    """Restituisce i passi SCAN del piano come (tabella, indice, passo)."""
+    cursor.execute(f"EXPLAIN QUERY PLAN {query}", params)
+    aliases = _aliases(query)
+    scans = []
+    for row in cursor.fetchall():
+        match = _SCAN.match(row[3])
+        if match:
+            scans.append((aliases.get(match.group(1), match.group(1)), match.group(2), row[3]))
+    return scans
+
+class QueryPlanTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        db_path = os.environ.get("TESI_QUERY_PLAN_DB")
+        cls.connection = sqlite3.connect(db_path or ":memory:")
+        if not db_path:
+            migrate(cls.connection)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.connection.close()
+
+    def test_no_scan_on_big_tables(self):
+        cursor = self.connection.cursor()
+        for name, query, params, _ in HOT_QUERIES:
+            with self.subTest(query=name):
+                for table, _, step in _scans(cursor, query, params):
+                    self.assertNotIn(table, BIG_TABLES, f"{name}: {step}")
+
+    def test_only_allowed_scans(self):
+        cursor = self.connection.cursor()
+        for name, query, params, allowed in HOT_QUERIES:
+            with self.subTest(query=name):
+                for table, index, step in _scans(cursor, query, params):
+                    self.assertTrue(table in allowed or index in allowed, f"{name}: {step}")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+"""
+Gestione di 429 e 5xx in api_client._request: le risposte devono arrivare a
+_request (non essere ritentate dentro la sessione di urllib3) e un Retry-After
+deve ridurre il ritmo del limiter condiviso dell'host.
+
+Usa un piccolo server HTTP locale che restituisce una sequenza di status.
+
+Uso (dalla root del progetto): python -m pytest tests   |   python -m unittest discover tests
+"""
+import os
+import sys
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import api_client
+
+HOST = "127.0.0.1"
+RATE = 4.0
+
+class _SequenceHandler(BaseHTTPRequestHandler):
+    """Risponde con gli status di server.responses, uno per richiesta, poi 200."""
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.hits += 1
+            status, retry_after = server.responses.pop(0) if server.responses else (200, None)
+        body = b"ok"
+        self.send_response(status)
+        if retry_after is not None:
+            self.send_header("Retry-After", retry_after)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class RequestRetryTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer((HOST, 0), _SequenceHandler)
+        cls.server.lock = threading.Lock()
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+        cls.url = f"http://{HOST}:{cls.server.server_port}/player/TEST/battles"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.server.hits = 0
+        self.server.responses = []
+        self.saved = (dict(api_client.REQUESTS_PER_SECOND), dict(api_client.MIN_REQUESTS_PER_SECOND),
+                      dict(api_client.MAX_REQUESTS_PER_SECOND), api_client.BACKOFF_FACTOR)
+        api_client.REQUESTS_PER_SECOND[HOST] = RATE
+        api_client.MIN_REQUESTS_PER_SECOND[HOST] = 0.5
+        api_client.MAX_REQUESTS_PER_SECOND[HOST] = 8.0
+        api_client.BACKOFF_FACTOR = 0.01
+        api_client._limiters.pop(HOST, None)
+
+    def tearDown(self):
+        (api_client.REQUESTS_PER_SECOND, api_client.MIN_REQUESTS_PER_SECOND,
+         api_client.MAX_REQUESTS_PER_SECOND, api_client.BACKOFF_FACTOR) = self.saved
+        api_client._limiters.pop(HOST, None)
+
+    def test_429_with_retry_after_slows_limiter(self):
+        self.server.responses = [(429, "1"), (429, "1")]
+        with self.assertLogs(level="WARNING"):
+            response = api_client._request("GET", self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.server.hits, 3)
+        self.assertLess(api_client._limiters[HOST].rate, RATE)
+
+    def test_503_with_retry_after_slows_limiter(self):
+        self.server.responses = [(503, "0")]
+        with self.assertLogs(level="WARNING"):
+            response = api_client._request("GET", self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.server.hits, 2)
+        self.assertLess(api_client._limiters[HOST].rate, RATE)
+
+    def test_5xx_retried_through_limiter(self):
+        self.server.responses = [(502, None), (500, None)]
+        response = api_client._request("GET", self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.server.hits, 3)
+        # Senza Retry-After il ritmo non viene ridotto: solo backoff del thread
+        self.assertGreaterEqual(api_client._limiters[HOST].rate, RATE)
+
+    def test_gives_up_after_max_retries(self):
+        self.server.responses = [(503, None)] * (api_client.MAX_RETRIES + 1)
+        response = api_client._request("GET", self.url)
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(self.server.hits, api_client.MAX_RETRIES + 1)
+
+if __name__ == "__main__":
+    unittest.main()
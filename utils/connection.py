@@ -1,16 +1,67 @@
 from json import load
+import os
 import sqlite3
 import logging
+from urllib.request import pathname2url
 
 CONNECTION = None
 CURSOR = None
 
+# Profili di prestazioni per le connessioni SQLite.
+#   ingest:   scraper e worker che scrivono; WAL permette ai lettori di non bloccare (né essere bloccati da) chi scrive
+#   analysis: script di analisi in sola lettura, con mmap e cache ampia
+#   snapshot: come analysis ma con immutable=1 (nessun lock); SOLO su copie del DB che nessuno sta scrivendo
+PROFILES = {
+    "default": {},
+    "ingest": {
+        "pragmas": {
+            "journal_mode": "WAL",
+            "synchronous": "NORMAL",
+            "cache_size": -65536,        # 64 MiB
+            "temp_store": "MEMORY",
+            "busy_timeout": 30000,
+        },
+    },
+    "analysis": {
+        "read_only": True,
+        "pragmas": {
+            "mmap_size": 1073741824,     # 1 GiB
+            "cache_size": -131072,       # 128 MiB
+            "temp_store": "MEMORY",
+            "query_only": 1,
+        },
+    },
+    "snapshot": {
+        "read_only": True,
+        "immutable": True,
+        "pragmas": {
+            "mmap_size": 1073741824,
+            "cache_size": -131072,
+            "temp_store": "MEMORY",
+        },
+    },
+}
 
+def connect(db_path, profile: str = "default", timeout: float = 30.0) -> sqlite3.Connection:
+    """Apre una connessione SQLite applicando il profilo di prestazioni indicato."""
+    settings = PROFILES[profile]
 
-def open_connection(db_path):
+    if settings.get("read_only"):
+        uri = f"file:{pathname2url(os.path.abspath(db_path))}?mode=ro"
+        if settings.get("immutable"):
+            uri += "&immutable=1"
+        connection = sqlite3.connect(uri, uri=True, timeout=timeout)
+    else:
+        connection = sqlite3.connect(db_path, timeout=timeout)
+
+    for pragma, value in settings.get("pragmas", {}).items():
+        connection.execute(f"PRAGMA {pragma} = {value}")
+    return connection
+
+def open_connection(db_path, profile: str = "default"):
     global CONNECTION, CURSOR
     try: 
-        CONNECTION = sqlite3.connect(db_path)
+        CONNECTION = connect(db_path, profile)
         CURSOR = CONNECTION.cursor()
         logging.info(f"Connessione al database {db_path} aperta con successo.")
         return CONNECTION, CURSOR, load_tags
@@ -18,6 +69,14 @@ def open_connection(db_path):
         logging.error(f"Errore di connessione al database: {e}")
         return None, None, None
 
+def new_connection(db_path, profile: str = "ingest", timeout: float = 30.0):
+    """
+    Apre una connessione indipendente (senza toccare quella globale),
+    da usare nei thread che lavorano in parallelo sullo stesso database.
+    """
+    connection = connect(db_path, profile, timeout)
+    return connection, connection.cursor()
+
 def close_connection(connection):
     if connection:
         connection.close()
@@ -0,0 +1,87 @@
+import threading
+import time
+
+
+class RateLimiter:
+    """
+    Token bucket thread-safe: concede al massimo `rate` richieste al secondo,
+    condivise tra tutti i thread che usano la stessa istanza.
+
+    Se max_rate > rate il ritmo è adattivo (AIMD): cresce di `increase` req/s
+    per ogni risposta più veloce di target_latency e viene moltiplicato per
+    `decrease` quando il server rallenta o risponde 429, senza mai scendere
+    sotto min_rate. Un Retry-After sospende tutte le richieste per il tempo indicato.
+    """
+
+    # Intervallo minimo tra due riduzioni: le risposte lente o 429 di richieste
+    # partite insieme contano come un solo segnale
+    DECREASE_COOLDOWN = 2.0
+    # Peso dell'ultima risposta nella media mobile della latenza
+    LATENCY_ALPHA = 0.2
+
+    def __init__(self, rate: float, burst: int = 1, min_rate: float | None = None, max_rate: float | None = None,
+                 increase: float = 0.05, decrease: float = 0.5, target_latency: float | None = None):
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate if min_rate is not None else rate
+        self.max_rate = max_rate if max_rate is not None else rate
+        self.increase = increase
+        self.decrease = decrease
+        self.target_latency = target_latency
+        self.latency = None  # media mobile esponenziale delle latenze osservate
+        self._tokens = float(burst)
+        self._last = time.monotonic()
+        self._blocked_until = 0.0
+        self._last_decrease = float("-inf")
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        if now <= self._last:
+            return
+        self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def acquire(self):
+        """Blocca finché non è disponibile un token."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self._blocked_until:
+                    wait = self._blocked_until - now
+                else:
+                    self._refill(now)
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def _decrease(self, now: float) -> bool:
+        if now - self._last_decrease < self.DECREASE_COOLDOWN:
+            return False
+        self._refill(now)
+        self.rate = max(self.min_rate, self.rate * self.decrease)
+        self._last_decrease = now
+        return True
+
+    def on_success(self, latency: float):
+        """Registra una risposta riuscita: aumento additivo se il server è veloce, riduzione se rallenta."""
+        with self._lock:
+            self.latency = latency if self.latency is None else \
+                self.LATENCY_ALPHA * latency + (1 - self.LATENCY_ALPHA) * self.latency
+            now = time.monotonic()
+            if self.target_latency is not None and self.latency > self.target_latency:
+                self._decrease(now)
+            elif self.rate < self.max_rate:
+                self._refill(now)
+                self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def on_throttle(self, retry_after: float | None = None):
+        """Registra un 429: riduzione moltiplicativa e, con Retry-After, pausa per tutti i thread."""
+        with self._lock:
+            now = time.monotonic()
+            self._decrease(now)
+            if retry_after:
+                self._blocked_until = max(self._blocked_until, now + retry_after)
+                self._tokens = 0.0
+                self._last = self._blocked_until
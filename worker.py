@@ -0,0 +1,141 @@
+"""
+Worker per lo scraping su più processi o più host con un unico DB.
+
+Ogni worker ripete il ciclo di main.py su un blocco di giocatori preso in
+lease (vedi leases.py): più worker avviati insieme si dividono i giocatori
+senza scaricarli due volte. Il calcolo dei matchup e la discovery girano su
+un solo worker alla volta. Un thread di heartbeat rinnova i lease mentre il
+worker lavora; se il worker cade, i suoi giocatori tornano agli altri alla
+scadenza dei lease.
+
+Uso: python worker.py [ID_WORKER]   |   python worker.py status
+"""
+import os
+import sys
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from utils.connection import open_connection, close_connection, new_connection
+from scrape_engine import sweep, MAX_CONCURRENT_TAGS
+from matchup_worker import drain_pending_matchups
+from db.migrate import migrate_db
+from scheduler import plan_sweep, REQUESTS_PER_REFRESH
+from archive import configure_archive
+from db_manager import warm_deck_cache
+from card_registry import load_card_registry
+from discovery import discover_players
+from leases import (LEASE_SECONDS, new_worker_id, register_worker, claim, claim_job, release_job,
+                    renew, release, report_progress, worker_status)
+import metrics
+
+DB_PATH = "db/clash.db"
+# Salva una copia compressa delle pagine battaglie scaricate (vedi archive.py e reparse.py)
+ARCHIVE_PAGES = False
+DISCOVER_PLAYERS = True
+
+# Giocatori presi in lease a ogni giro
+BATCH_SIZE = 20
+# Giocatori da aggiornare considerati a ogni giro (quelli in lease ad altri worker vengono saltati)
+PLAN_SIZE = 500
+# Attesa quando non ci sono giocatori liberi da aggiornare (secondi)
+IDLE_SLEEP = 60
+# Intervallo tra due rinnovi dei lease
+HEARTBEAT_SECONDS = LEASE_SECONDS / 3
+
+@contextmanager
+def _heartbeat(worker_id: str):
+    """Rinnova periodicamente i lease del worker in un thread con una connessione propria."""
+    stop = threading.Event()
+
+    def beat():
+        conn, _ = new_connection(DB_PATH)
+        try:
+            while not stop.wait(HEARTBEAT_SECONDS):
+                try:
+                    renew(conn, worker_id)
+                except Exception as e:
+                    logging.error(f"Rinnovo dei lease fallito per {worker_id}: {e}")
+        finally:
+            conn.close()
+
+    thread = threading.Thread(target=beat, name="heartbeat", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+def _run_jobs(conn, cursor, worker_id: str):
+    """Matchup e discovery: girano sul primo worker che ne prende il lease."""
+    if claim_job(conn, worker_id, "matchups"):
+        try:
+            drain_pending_matchups(conn, cursor)
+        finally:
+            release_job(conn, worker_id, "matchups")
+
+    if DISCOVER_PLAYERS and claim_job(conn, worker_id, "discovery"):
+        try:
+            discover_players(conn, cursor)
+        finally:
+            release_job(conn, worker_id, "discovery")
+
+def run_worker(worker_id: str | None = None, batch_size: int = BATCH_SIZE):
+    """Ciclo del worker: prende un blocco di giocatori, li aggiorna, rilascia i lease e ricomincia."""
+    worker_id = worker_id or new_worker_id()
+    logging.basicConfig(level=logging.INFO, format=f'%(asctime)s - %(levelname)s - [{worker_id}] %(message)s')
+
+    migrate_db(DB_PATH)
+    configure_archive(ARCHIVE_PAGES)
+
+    conn, cursor, _ = open_connection(DB_PATH, profile="ingest")
+    if not conn:
+        logging.critical("Impossibile connettersi al database. Uscita.")
+        return
+
+    try:
+        register_worker(conn, worker_id)
+        load_card_registry(cursor)
+        logging.info(f"Cache mazzi caricata: {warm_deck_cache(cursor)} mazzi.")
+
+        while True:
+            with _heartbeat(worker_id):
+                tags = claim(conn, worker_id, plan_sweep(cursor, PLAN_SIZE * REQUESTS_PER_REFRESH), batch_size)
+                if tags:
+                    report_progress(conn, worker_id, "running")
+                    logging.info(f"Presi in lease {len(tags)} giocatori.")
+                    try:
+                        stats = sweep(tags, DB_PATH, MAX_CONCURRENT_TAGS)
+                    finally:
+                        release(conn, worker_id, tags)
+                    report_progress(conn, worker_id, "running", len(tags) - stats["errors"], stats["pages"], stats["errors"])
+
+                _run_jobs(conn, cursor, worker_id)
+
+            metrics.write_prometheus(os.path.join(metrics.METRICS_DIR, f"tesi_{worker_id}.prom"))
+            if not tags:
+                report_progress(conn, worker_id, "idle")
+                time.sleep(IDLE_SLEEP)
+    finally:
+        release(conn, worker_id)
+        report_progress(conn, worker_id, "stopped")
+        close_connection(conn)
+
+def print_status():
+    """Stampa lo stato di tutti i worker registrati."""
+    conn, cursor, _ = open_connection(DB_PATH, profile="ingest")
+    if not conn:
+        return
+    try:
+        for worker_id, status, heartbeat, players, pages, errors, leases in worker_status(cursor):
+            print(f"{worker_id:<30} {status or '-':<8} heartbeat {heartbeat}  giocatori {players}  "
+                  f"pagine {pages}  errori {errors}  lease attivi {leases}")
+    finally:
+        close_connection(conn)
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["status"]:
+        print_status()
+    else:
+        run_worker(*sys.argv[1:2])